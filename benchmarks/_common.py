@@ -0,0 +1,33 @@
+"""Helpers shared by the benchmarks
+
+Benchmarks are run as scripts from the root of the repository, for example
+'python benchmarks/emit_svg.py', which puts this directory first in sys.path.
+"""
+import os
+import tempfile
+import timeit
+from contextlib import contextmanager
+
+CASTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'casts')
+
+
+def cast_filenames(args, default_names):
+    """Return the recordings given on the command line, or the example recordings named
+    'default_names' if there is none"""
+    return args or [os.path.join(CASTS_DIR, name) for name in default_names]
+
+
+def best_time(function, repeat=5, number=1):
+    """Return the shortest time taken by 'number' calls to function, in seconds per call"""
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+@contextmanager
+def temporary_filename(suffix='.cast'):
+    """Yield the name of a temporary file which is removed afterwards"""
+    fd, filename = tempfile.mkstemp(prefix='termtosvg_', suffix=suffix)
+    os.close(fd)
+    try:
+        yield filename
+    finally:
+        os.remove(filename)
@@ -0,0 +1,74 @@
+"""Benchmark of the relay of data between a recorded program and the terminal
+
+A program writing a large amount of data to its standard output is run twice: directly, with
+its output sent to /dev/null, and through termtosvg.recorder.record, with the output relayed to
+/dev/null. The throughput of the relay, the time it adds to the execution of the program and
+the CPU time used by the recorder itself are reported. Keep in mind that the throughput of a
+pseudo-terminal is limited by the kernel so the CPU time of the recorder is the best
+indicator of its overhead.
+
+Usage: python benchmarks/capture.py [size_in_MB ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from termtosvg import recorder
+
+DEFAULT_SIZES = [10, 100]
+
+
+def command(size):
+    return ['sh', '-c', 'yes | head -c {}'.format(size * 10**6)]
+
+
+def run_directly(size):
+    start = time.perf_counter()
+    subprocess.run(command(size), stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_recorded(size):
+    """Return the time needed to record the program, the CPU time used by the recorder and the
+    number of bytes relayed"""
+    # The input of the recorder is a pipe which stays empty during the whole recording
+    input_read_fd, input_write_fd = os.pipe()
+    output_fd = os.open(os.devnull, os.O_WRONLY)
+    relayed = 0
+    try:
+        start, start_cpu = time.perf_counter(), cpu_time()
+        records = recorder.record(command(size), 80, 24, input_read_fd, output_fd)
+        for record in records:
+            if hasattr(record, 'event_data'):
+                relayed += len(record.event_data)
+        duration, duration_cpu = time.perf_counter() - start, cpu_time() - start_cpu
+    finally:
+        for fd in input_read_fd, input_write_fd, output_fd:
+            os.close(fd)
+    return duration, duration_cpu, relayed
+
+
+def benchmark(size):
+    direct = run_directly(size)
+    recorded, recorder_cpu, relayed = run_recorded(size)
+    print('{:>5} MB: direct {:7.3f}s, recorded {:7.3f}s ({:7.1f} MB/s relayed), '
+          'added time {:7.3f}s, recorder CPU time {:7.3f}s'
+          .format(size, direct, recorded, relayed / recorded / 10**6, recorded - direct,
+                  recorder_cpu))
+
+
+def main(args):
+    sizes = [int(arg) for arg in args] or DEFAULT_SIZES
+    for size in sizes:
+        benchmark(size)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
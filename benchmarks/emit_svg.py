@@ -0,0 +1,65 @@
+"""Benchmark of the serialization of the animated elements of the screen
+
+Recordings are replayed once beforehand so that only the production of the markup of the
+animated elements is measured. The markup written directly by anim._render_markup is compared
+to the elements built with lxml by anim._render_frames and serialized by a ChildSerializer.
+Both must produce the same bytes.
+
+Usage: python benchmarks/emit_svg.py [cast_file ...]
+"""
+import os
+import sys
+
+from _common import best_time, cast_filenames
+from termtosvg import anim, asciicast, config, term
+
+DEFAULT_CASTS = ['htop.cast', 'colors.cast', 'unittest.cast']
+CELL_WIDTH, CELL_HEIGHT = config.DEFAULT_CELL_WIDTH, config.DEFAULT_CELL_HEIGHT
+
+
+def replayed_records(cast_filename):
+    records = asciicast.read_records(cast_filename)
+    return list(term.replay(records, anim.CharacterCell.from_pyte, min_frame_duration=1,
+                            max_frame_duration=None,
+                            from_pyte_line=anim.CharacterCellLine.converter()))
+
+
+def lxml_markup(records, compiled_template):
+    frames = anim._render_frames(iter(records[1:]), CELL_WIDTH, CELL_HEIGHT)
+    serialize = compiled_template.serializer()
+    return b''.join(definition + markup
+                    for new_defs, markup, _ in anim._serialize_frames(frames, serialize)
+                    for definition in [b''.join(data for _, _, data in new_defs)])
+
+
+def direct_markup(records, compiled_template):
+    frames = anim._render_markup(iter(records[1:]), CELL_WIDTH, CELL_HEIGHT,
+                                 compiled_template.href_attribute())
+    return b''.join(definition + markup
+                    for new_defs, markup, _ in frames
+                    for definition in [b''.join(data for _, _, data in new_defs)])
+
+
+def benchmark(cast_filename, repeat=5):
+    records = replayed_records(cast_filename)
+    header = records[0]
+    template = config.default_templates()['gjm8']
+    compiled_template = anim.compile_template(template, header.width, header.height,
+                                              CELL_WIDTH, CELL_HEIGHT)
+    assert lxml_markup(records, compiled_template) == direct_markup(records, compiled_template)
+
+    size = len(direct_markup(records, compiled_template))
+    for name, function in [('lxml', lxml_markup), ('markup', direct_markup)]:
+        best = best_time(lambda: function(records, compiled_template), repeat)
+        print('{:<14} {:>6} {:>6} records: {:7.1f} ms ({:5.1f} MB/s)'
+              .format(os.path.basename(cast_filename), name, len(records), best * 1000,
+                      size / best / 1e6))
+
+
+def main(args):
+    for cast_filename in cast_filenames(args, DEFAULT_CASTS):
+        benchmark(cast_filename)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
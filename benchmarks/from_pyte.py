@@ -0,0 +1,58 @@
+"""Benchmark of the conversion of pyte characters to CharacterCells
+
+The characters converted are the ones termtosvg.term.replay hands over to
+CharacterCell.from_pyte when rendering full-screen, colorful recordings. The cached
+conversion is compared to the resolution of the colors of every character from scratch.
+
+Usage: python benchmarks/from_pyte.py [cast_file ...]
+"""
+import os
+import sys
+
+from _common import best_time, cast_filenames
+from termtosvg import anim, asciicast, term
+
+DEFAULT_CASTS = ['htop.cast', 'colors.cast']
+
+
+def uncached_from_pyte(char):
+    """Conversion of a pyte character without the style cache and color tables"""
+    text_color = anim._foreground_color(char.fg, char.bold)
+    background_color = anim._background_color(char.bg)
+    if char.reverse:
+        text_color, background_color = background_color, text_color
+    return anim.CharacterCell(char.data, text_color, background_color, char.bold,
+                              char.italics, char.underscore, char.strikethrough)
+
+
+def captured_chars(cast_filename):
+    """Return the pyte characters converted during the replay of the recording"""
+    chars = []
+
+    def capture(char):
+        chars.append(char)
+        return anim.CharacterCell.from_pyte(char)
+
+    records = asciicast.read_records(cast_filename)
+    for _ in term.replay(records, capture, min_frame_duration=1, max_frame_duration=None):
+        pass
+    return chars
+
+
+def benchmark(cast_filename, repeat=5):
+    chars = captured_chars(cast_filename)
+    for name, function in [('uncached', uncached_from_pyte),
+                           ('cached', anim.CharacterCell.from_pyte)]:
+        best = best_time(lambda: [function(char) for char in chars], repeat)
+        print('{:<12} {:>8} {:>8} chars: {:7.1f} ms ({:5.2f} Mchars/s)'
+              .format(os.path.basename(cast_filename), name, len(chars), best * 1000,
+                      len(chars) / best / 1e6))
+
+
+def main(args):
+    for cast_filename in cast_filenames(args, DEFAULT_CASTS):
+        benchmark(cast_filename)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
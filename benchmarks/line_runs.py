@@ -0,0 +1,81 @@
+"""Benchmark of the encoding of lines of the screen into background runs and text runs
+
+Wide lines (300 columns by default) are encoded by anim._line_runs in a single pass. This is
+compared to two passes, one for the background and one for the text, each grouping cells with
+itertools.groupby and a key building a dictionary of the attributes of every cell. Both must
+produce the same runs.
+
+Usage: python benchmarks/line_runs.py [columns]
+"""
+import random
+import sys
+from itertools import groupby
+
+from _common import best_time
+from termtosvg import anim
+
+DEFAULT_COLUMNS = 300
+
+
+class ConsecutiveWithSameAttributes:
+    """Key for itertools.groupby grouping consecutive cells with the same attributes"""
+    def __init__(self, attributes):
+        self.group_index = None
+        self.last_index = None
+        self.attributes = attributes
+        self.last_key_attributes = None
+
+    def __call__(self, arg):
+        index, obj = arg
+        key_attributes = {name: getattr(obj, name) for name in self.attributes}
+        if self.last_index != index - 1 or self.last_key_attributes != key_attributes:
+            self.group_index = index
+        self.last_index = index
+        self.last_key_attributes = key_attributes
+        return self.group_index, key_attributes
+
+
+def groupby_line_runs(screen_line):
+    non_default_bg_cells = [(column, cell) for (column, cell) in sorted(screen_line.items())
+                            if cell.background_color != 'background']
+    key = ConsecutiveWithSameAttributes(['background_color'])
+    background_runs = [(column, len(list(group)), attributes['background_color'])
+                       for (column, attributes), group in groupby(non_default_bg_cells, key)]
+
+    key = ConsecutiveWithSameAttributes(anim._TEXT_ATTRIBUTES)
+    text_runs = tuple((column, ''.join(c.text for _, c in group),
+                       tuple(attributes[name] for name in anim._TEXT_ATTRIBUTES))
+                      for (column, attributes), group in groupby(sorted(screen_line.items()),
+                                                                 key))
+    return background_runs, text_runs
+
+
+def make_lines(columns):
+    """Return lines typical of plain shells, colorful prompts and full screen applications"""
+    rng = random.Random(42)
+    plain = {column: anim.CharacterCell('x', 'foreground', 'background')
+             for column in range(columns)}
+    prompt = {column: anim.CharacterCell('x', 'color{}'.format(column // 20 % 8),
+                                         'background' if column > 60 else 'color4',
+                                         bold=column < 20)
+              for column in range(columns)}
+    full_screen = {column: anim.CharacterCell('x', rng.choice(['color1', 'color2', '#abcdef']),
+                                              rng.choice(['background', 'color0']),
+                                              bold=rng.random() < 0.2)
+                   for column in range(columns)}
+    return [('plain', plain), ('prompt', prompt), ('full screen', full_screen)]
+
+
+def main(args):
+    columns = int(args[0]) if args else DEFAULT_COLUMNS
+    for name, line in make_lines(columns):
+        assert anim._line_runs(line) == groupby_line_runs(line)
+        for implementation, function in [('groupby', groupby_line_runs),
+                                          ('single pass', anim._line_runs)]:
+            best = best_time(lambda: function(line), number=200)
+            print('{:<12} {:>4} columns {:>12}: {:7.1f} us/line'
+                  .format(name, columns, implementation, best * 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
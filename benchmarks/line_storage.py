@@ -0,0 +1,73 @@
+"""Benchmark of the storage of the lines of the screen held by term.replay
+
+A full screen of wide lines (300x100 by default) is converted from pyte characters either to
+dictionaries mapping columns to CharacterCells or to CharacterCellLines made of the text of
+the line and of an array of interned style ids. The memory held by the lines, the time needed
+to convert them and the time needed to encode them into runs (anim._line_runs) are compared.
+Both representations must produce the same runs.
+
+Usage: python benchmarks/line_storage.py [columns [rows]]
+"""
+import random
+import sys
+import tracemalloc
+
+import pyte.screens
+
+from _common import best_time
+from termtosvg import anim
+
+DEFAULT_COLUMNS = 300
+DEFAULT_ROWS = 100
+
+
+def make_screen(columns, rows):
+    """Return lines of pyte characters typical of colorful full screen applications"""
+    rng = random.Random(42)
+    colors = ['default', 'red', 'green', 'blue', '008700']
+    screen = []
+    for _ in range(rows):
+        fg, bg = rng.choice(colors), rng.choice(colors)
+        line = {}
+        for column in range(columns):
+            if rng.random() < 0.05:
+                fg, bg = rng.choice(colors), rng.choice(colors)
+            line[column] = pyte.screens.Char(rng.choice('abcdef '), fg, bg,
+                                             bold=column % 40 < 10)
+        screen.append(line)
+    return screen
+
+
+def dict_line(chars):
+    return {column: anim.CharacterCell.from_pyte(char) for column, char in chars.items()}
+
+
+def held_memory(function, screen):
+    """Return the memory allocated by the lines converted by function, in bytes"""
+    tracemalloc.start()
+    lines = [function(chars) for chars in screen]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del lines
+    return size
+
+
+def main(args):
+    columns = int(args[0]) if args else DEFAULT_COLUMNS
+    rows = int(args[1]) if len(args) > 1 else DEFAULT_ROWS
+    screen = make_screen(columns, rows)
+    for chars in screen:
+        assert anim._line_runs(dict_line(chars)) == \
+            anim._line_runs(anim.CharacterCellLine.from_pyte(chars))
+
+    for name, function in [('dict', dict_line), ('compact', anim.CharacterCellLine.converter())]:
+        memory = held_memory(function, screen)
+        lines = [function(chars) for chars in screen]
+        convert = best_time(lambda: [function(chars) for chars in screen])
+        runs = best_time(lambda: [anim._line_runs(line) for line in lines])
+        print('{:>8} {}x{}: {:8.1f} kB held, {:6.1f} ms conversion, {:6.1f} ms runs'
+              .format(name, columns, rows, memory / 1000, convert * 1000, runs * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+"""Benchmark of the decoding of asciicast v2 recordings
+
+A recording made of a large number of tiny events, which is what termtosvg.recorder.record
+produces for programs printing their output character by character, is decoded line by line
+with AsciiCastV2Record.from_json_line and with termtosvg.asciicast.read_records, reading the
+file or mapping it in memory. Random access to the events of the recording mapped in memory
+is measured last.
+
+Usage: python benchmarks/read_records.py [event_count ...]
+"""
+import random
+import sys
+import time
+from functools import partial
+
+from _common import temporary_filename
+from termtosvg import asciicast
+
+DEFAULT_EVENT_COUNTS = [10**5, 10**6]
+
+
+def write_cast(cast_file, event_count):
+    header = asciicast.AsciiCastV2Header(2, 80, 24, None)
+    print(header.to_json_line(), file=cast_file)
+    for index in range(event_count):
+        data = 'x' if index % 80 else '\r\n'
+        event = asciicast.AsciiCastV2Event(index * 0.001, 'o', data.encode('utf-8'), None)
+        print(event.to_json_line(), file=cast_file)
+
+
+def read_line_by_line(cast_filename):
+    with open(cast_filename, 'r') as cast_file:
+        for line in cast_file:
+            yield asciicast.AsciiCastV2Record.from_json_line(line)
+
+
+def benchmark(event_count):
+    with temporary_filename() as cast_filename:
+        with open(cast_filename, 'w') as cast_file:
+            write_cast(cast_file, event_count)
+        for name, function in [('from_json_line', read_line_by_line),
+                               ('read_records', asciicast.read_records),
+                               ('read_records mmap', partial(asciicast.read_records,
+                                                             use_mmap=True))]:
+            start = time.perf_counter()
+            record_count = sum(1 for _ in function(cast_filename))
+            duration = time.perf_counter() - start
+            print('{:>8} events {:>17}: {:7.3f}s ({:6.3f} Mevents/s)'
+                  .format(event_count, name, duration, record_count / duration / 10**6))
+
+        start = time.perf_counter()
+        with asciicast.MappedCast(cast_filename) as cast:
+            opening = time.perf_counter() - start
+            indexes = random.sample(range(len(cast)), min(len(cast), 10000))
+            start = time.perf_counter()
+            for index in indexes:
+                cast[index]
+            duration = time.perf_counter() - start
+        print('{:>8} events {:>17}: {:7.3f}s to map and scan the file, {:7.1f} us per '
+              'random access'.format(event_count, 'MappedCast', opening,
+                                     duration / len(indexes) * 10**6))
+
+
+def main(args):
+    event_counts = [int(arg) for arg in args] or DEFAULT_EVENT_COUNTS
+    for event_count in event_counts:
+        benchmark(event_count)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
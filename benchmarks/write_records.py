@@ -0,0 +1,56 @@
+"""Benchmark of the encoding of asciicast v2 recordings
+
+The events produced when recording a program printing its output character by character are
+written to a file twice: with one print call per record and through
+termtosvg.asciicast.AsciiCastWriter.
+
+Usage: python benchmarks/write_records.py [event_count ...]
+"""
+import sys
+import time
+
+from _common import temporary_filename
+from termtosvg import asciicast
+
+DEFAULT_EVENT_COUNTS = [10**5, 10**6]
+
+
+def records(event_count):
+    yield asciicast.AsciiCastV2Header(2, 80, 24, None)
+    for index in range(event_count):
+        data = b'x' if index % 80 else b'\r\n'
+        yield asciicast.AsciiCastV2Event(index * 0.001, 'o', data, None)
+
+
+def write_with_print(cast_file, records):
+    for record in records:
+        print(record.to_json_line(), file=cast_file)
+
+
+def write_with_writer(cast_file, records):
+    with asciicast.AsciiCastWriter(cast_file) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def benchmark(event_count):
+    all_records = list(records(event_count))
+    with temporary_filename() as cast_filename:
+        for name, function in [('print', write_with_print),
+                               ('AsciiCastWriter', write_with_writer)]:
+            start = time.perf_counter()
+            with open(cast_filename, 'w') as cast_file:
+                function(cast_file, all_records)
+            duration = time.perf_counter() - start
+            print('{:>8} events {:>15}: {:7.3f}s ({:6.3f} Mevents/s)'
+                  .format(event_count, name, duration, len(all_records) / duration / 10**6))
+
+
+def main(args):
+    event_counts = [int(arg) for arg in args] or DEFAULT_EVENT_COUNTS
+    for event_count in event_counts:
+        benchmark(event_count)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -36,7 +36,8 @@ setup(
     include_package_data=True,
     install_requires=[
         'lxml',
-        'pyte',
+        # termtosvg.term._is_idle relies on the state of the parser of pyte 0.8
+        'pyte>=0.8.0,<0.9',
     ],
     extras_require={
         'dev': [
@@ -1,12 +1,28 @@
+import gzip
+import hashlib
 import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from array import array
 from collections import namedtuple
-from itertools import groupby
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from copy import deepcopy
+from functools import partial
+from itertools import groupby, tee
+from operator import itemgetter
 from typing import Iterator
 
 import pyte.graphics
 import pyte.screens
 from lxml import etree
 
+from termtosvg.config import DEFAULT_CELL_HEIGHT, DEFAULT_CELL_WIDTH, DEFAULT_COMPRESSION_LEVEL
+
 # Ugliest hack: Replace the first 16 colors rgb values by their names so that termtosvg can
 # distinguish FG_BG_256[0] (which defaults to black #000000 but can be styled with themes)
 # from FG_BG_256[16] (which is also black #000000 but should be displayed as is).
@@ -19,6 +35,9 @@ pyte.graphics.FG_BG_256 = NAMED_COLORS + pyte.graphics.FG_BG_256[16:]
 # last one ends (animation looping)
 LAST_ANIMATION_ID = 'anim_last'
 
+# Tag of the animations scrolling the content of the screen
+_SCROLL_ANIMATION_TAG = 'animateTransform'
+
 # XML namespaces
 SVG_NS = 'http://www.w3.org/2000/svg'
 XLINK_NS = 'http://www.w3.org/1999/xlink'
@@ -44,69 +63,357 @@ _CharacterCell.color.__doc__ = 'Color of the text'
 _CharacterCell.background_color.__doc__ = 'Background color of the cell'
 
 
+def _foreground_color(color, bold):
+    """Return the class name (or hexadecimal value) of a pyte foreground color"""
+    if color == 'default':
+        return 'foreground'
+
+    if bold and not str(color).startswith('bright'):
+        named_color = 'bright{}'.format(color)
+    else:
+        named_color = color
+
+    if named_color in NAMED_COLORS:
+        return 'color{}'.format(NAMED_COLORS.index(named_color))
+    if len(color) == 6:
+        # HEXADECIMAL COLORS
+        # raise ValueError if color is not an hexadecimal number
+        int(color, 16)
+        return '#{}'.format(color)
+    raise ValueError('Invalid foreground color: {}'.format(color))
+
+
+def _background_color(color):
+    """Return the class name (or hexadecimal value) of a pyte background color"""
+    if color == 'default':
+        return 'background'
+    if color in NAMED_COLORS:
+        return 'color{}'.format(NAMED_COLORS.index(color))
+    if len(color) == 6:
+        # Hexadecimal colors
+        # raise ValueError if color is not an hexadecimal number
+        int(color, 16)
+        return '#{}'.format(color)
+    raise ValueError('Invalid background color')
+
+
+# Colors of the 256 color palette are resolved once and for all. Other colors (24-bit colors)
+# are resolved on demand
+_PALETTE = ['default'] + pyte.graphics.FG_BG_256
+_FOREGROUND_COLORS = {(color, bold): _foreground_color(color, bold)
+                      for color in _PALETTE for bold in (False, True)}
+_BACKGROUND_COLORS = {color: _background_color(color) for color in _PALETTE}
+
+
+def _cell_style(fg, bg, bold, italics, underscore, strikethrough, reverse):
+    """Return the attributes of a CharacterCell, apart from its text, for the given pyte
+    character style"""
+    try:
+        text_color = _FOREGROUND_COLORS[fg, bold]
+    except KeyError:
+        text_color = _foreground_color(fg, bold)
+
+    try:
+        background_color = _BACKGROUND_COLORS[bg]
+    except KeyError:
+        background_color = _background_color(bg)
+
+    if reverse:
+        text_color, background_color = background_color, text_color
+
+    return text_color, background_color, bold, italics, underscore, strikethrough
+
+
+# Cache mapping pyte character styles to the attributes of CharacterCells. Terminal sessions
+# only use a handful of styles so the cache is simply emptied if it ever gets full.
+_STYLE_CACHE = {}
+_STYLE_CACHE_MAX_SIZE = 4096
+
+
 class CharacterCell(_CharacterCell):
     @classmethod
     def from_pyte(cls, char):
         """Create a CharacterCell from a pyte character"""
-        if char.fg == 'default':
-            text_color = 'foreground'
-        else:
-            if char.bold and not str(char.fg).startswith('bright'):
-                named_color = 'bright{}'.format(char.fg)
-            else:
-                named_color = char.fg
-
-            if named_color in NAMED_COLORS:
-                text_color = 'color{}'.format(NAMED_COLORS.index(named_color))
-            elif len(char.fg) == 6:
-                # HEXADECIMAL COLORS
-                # raise ValueError if char.fg is not an hexadecimal number
-                int(char.fg, 16)
-                text_color = '#{}'.format(char.fg)
-            else:
-                raise ValueError('Invalid foreground color: {}'.format(char.fg))
-
-        if char.bg == 'default':
-            background_color = 'background'
-        elif char.bg in NAMED_COLORS:
-            background_color = 'color{}'.format(NAMED_COLORS.index(char.bg))
-        elif len(char.bg) == 6:
-            # Hexadecimal colors
-            # raise ValueError if char.bg is not an hexadecimal number
-            int(char.bg, 16)
-            background_color = '#{}'.format(char.bg)
-        else:
-            raise ValueError('Invalid background color')
-
-        if char.reverse:
-            text_color, background_color = background_color, text_color
+        # Style attributes of the character: fg, bg, bold, italics, underscore, strikethrough
+        # and reverse
+        style = char[1:8]
+        try:
+            attributes = _STYLE_CACHE[style]
+        except KeyError:
+            attributes = _cell_style(*style)
+            if len(_STYLE_CACHE) >= _STYLE_CACHE_MAX_SIZE:
+                _STYLE_CACHE.clear()
+            _STYLE_CACHE[style] = attributes
 
-        return CharacterCell(char.data, text_color, background_color,
-                             char.bold, char.italics, char.underscore,
-                             char.strikethrough)
+        # Calling tuple.__new__ directly is faster than going through the constructor of the
+        # namedtuple
+        return tuple.__new__(cls, (char.data,) + attributes)
 
 
 CharacterCellConfig = namedtuple('CharacterCellConfig', ['width', 'height'])
 CharacterCellLineEvent = namedtuple('CharacterCellLineEvent', ['row', 'line', 'time', 'duration'])
+CharacterCellScrollEvent = namedtuple('CharacterCellScrollEvent', ['offset', 'time', 'duration'])
+CharacterCellScrollEvent.__doc__ = """Scrolling of the whole screen
 
+The content of the screen is moved up by 'offset' lines from 'time' and for 'duration'
+milliseconds. Rows of CharacterCellLineEvents are relative to the screen before any scrolling.
+"""
 
-class ConsecutiveWithSameAttributes:
-    """Callable to be used as a key for itertools.groupby to group together consecutive elements
-    of a list with the same attributes"""
-    def __init__(self, attributes):
-        self.group_index = None
-        self.last_index = None
-        self.attributes = attributes
-        self.last_key_attributes = None
 
-    def __call__(self, arg):
-        index, obj = arg
-        key_attributes = {name: getattr(obj, name) for name in self.attributes}
-        if self.last_index != index - 1 or self.last_key_attributes != key_attributes:
-            self.group_index = index
-        self.last_index = index
-        self.last_key_attributes = key_attributes
-        return self.group_index, key_attributes
+# Attributes of a CharacterCell that are rendered by a 'text' element
+_TEXT_ATTRIBUTES = ['color', 'bold', 'italics', 'underscore', 'strikethrough']
+_text_style = itemgetter(*(CharacterCell._fields.index(name) for name in _TEXT_ATTRIBUTES))
+_BACKGROUND_COLOR_INDEX = CharacterCell._fields.index('background_color')
+
+class _StyleTable:
+    """Interned styles of the character cells of the lines of a single replay
+
+    cell_styles[style_id] is the tuple of the attributes of a CharacterCell apart from its text
+    and run_keys[style_id] holds what _line_runs needs to know about the style: the id of the
+    text style, the text style itself and the background color. Style id 0 marks the columns of
+    a line that do not hold any cell. Ids are never reused, so a table only grows for as long as
+    the lines of the replay it was created for, which hold a reference to it, are alive.
+    """
+    __slots__ = ('cell_styles', 'run_keys', 'cell_style_ids', 'text_style_ids',
+                 'pyte_style_ids')
+
+    def __init__(self):
+        self.cell_styles = [None]
+        self.run_keys = [(None, None, None)]
+        self.cell_style_ids = {}
+        self.text_style_ids = {}
+        # Cache mapping pyte character styles to style ids, emptied if it ever gets full like
+        # _STYLE_CACHE
+        self.pyte_style_ids = {}
+
+    def style_id(self, attributes):
+        """Return the id of the interned style made of the attributes of a CharacterCell apart
+        from its text"""
+        try:
+            return self.cell_style_ids[attributes]
+        except KeyError:
+            pass
+
+        text_style = _text_style((None,) + attributes)
+        text_style_id = self.text_style_ids.setdefault(text_style, len(self.text_style_ids) + 1)
+        style_id = len(self.cell_styles)
+        self.cell_styles.append(attributes)
+        self.run_keys.append((text_style_id, text_style, attributes[_BACKGROUND_COLOR_INDEX - 1]))
+        self.cell_style_ids[attributes] = style_id
+        return style_id
+
+
+class CharacterCellLine(Mapping):
+    """Line of the screen stored as the text of its cells and the ids of their styles
+
+    'text' is a string holding the text of the cell of each column, or a tuple of these texts if
+    the text of some cell is not exactly one character long (empty cell following a wide
+    character, combining characters...). 'styles' is an array of the ids of the interned styles
+    of the cells. Columns without a cell have style id 0 and the last column always holds a
+    cell. Style ids refer to the _StyleTable 'table'.
+
+    Lines behave as read-only mappings between column numbers and CharacterCells, but cells
+    sharing a style share a single tuple of attributes and lines are compared and hashed
+    without building any cell.
+    """
+    __slots__ = ('text', 'styles', 'table')
+
+    def __init__(self, text, styles, table):
+        self.text = text
+        self.styles = styles
+        self.table = table
+
+    @classmethod
+    def converter(cls):
+        """Return a conversion function from lines of pyte characters to CharacterCellLines,
+        to be used as the from_pyte_line argument of a single replay
+
+        The lines returned by the function share a new table of interned styles, which is
+        released along with them once the replay is over.
+        """
+        return partial(cls.from_pyte, table=_StyleTable())
+
+    @classmethod
+    def from_pyte(cls, chars, table=None):
+        """Create a line from a mapping between column numbers and pyte characters
+
+        The styles of the cells are interned in 'table', or in a new table if None.
+        """
+        if table is None:
+            table = _StyleTable()
+        pyte_style_ids = table.pyte_style_ids
+        width = max(chars) + 1 if chars else 0
+        texts = [' '] * width
+        styles = array('I', [0]) * width
+        regular = True
+        for column, char in chars.items():
+            data = char[0]
+            texts[column] = data
+            if len(data) != 1:
+                regular = False
+
+            # Same style attributes as in CharacterCell.from_pyte
+            style = char[1:8]
+            try:
+                styles[column] = pyte_style_ids[style]
+            except KeyError:
+                if len(pyte_style_ids) >= _STYLE_CACHE_MAX_SIZE:
+                    pyte_style_ids.clear()
+                style_id = table.style_id(_cell_style(*style))
+                pyte_style_ids[style] = styles[column] = style_id
+
+        return cls(''.join(texts) if regular else tuple(texts), styles, table)
+
+    @classmethod
+    def from_cells(cls, cells, table=None):
+        """Create a line from a mapping between column numbers and CharacterCells
+
+        The styles of the cells are interned in 'table', or in a new table if None.
+        """
+        if table is None:
+            table = _StyleTable()
+        width = max(cells) + 1 if cells else 0
+        texts = [' '] * width
+        styles = array('I', [0]) * width
+        for column, cell in cells.items():
+            texts[column] = cell[0]
+            styles[column] = table.style_id(tuple(cell[1:]))
+
+        if all(len(text) == 1 for text in texts):
+            return cls(''.join(texts), styles, table)
+        return cls(tuple(texts), styles, table)
+
+    def __getitem__(self, column):
+        style_id = 0
+        if isinstance(column, int) and 0 <= column < len(self.styles):
+            style_id = self.styles[column]
+        if not style_id:
+            raise KeyError(column)
+        return tuple.__new__(CharacterCell, (self.text[column],) + self.table.cell_styles[style_id])
+
+    def __iter__(self):
+        return (column for column, style_id in enumerate(self.styles) if style_id)
+
+    def __len__(self):
+        return len(self.styles) - self.styles.count(0)
+
+    def __eq__(self, other):
+        if isinstance(other, CharacterCellLine):
+            if self.text != other.text:
+                return False
+            if self.table is other.table:
+                return self.styles == other.styles
+            cell_styles, other_cell_styles = self.table.cell_styles, other.table.cell_styles
+            return ([cell_styles[style_id] for style_id in self.styles] ==
+                    [other_cell_styles[style_id] for style_id in other.styles])
+        return super().__eq__(other)
+
+    def __hash__(self):
+        # Style ids depend on the table of the line so only the text is hashed
+        return hash(self.text)
+
+    def __reduce__(self):
+        # Style ids are specific to the table of the line
+        return CharacterCellLine.from_cells, (dict(self.items()),)
+
+    def __repr__(self):
+        return 'CharacterCellLine({!r})'.format(dict(self.items()))
+
+
+def _compact_line_runs(line):
+    """Return the background runs and the text runs of a CharacterCellLine (see _line_runs)
+
+    Runs only end where the style id of a column differs from the style id of the previous
+    column, so most columns are handled with a single comparison of integers.
+    """
+    text, styles, run_keys = line.text, line.styles, line.table.run_keys
+    if isinstance(text, str):
+        def run_text(start, end):
+            return text[start:end]
+    else:
+        def run_text(start, end):
+            return ''.join(text[start:end])
+
+    background_runs = []
+    text_runs = []
+    text_column = background_column = 0
+    text_style_id = text_style = background_color = None
+    last_style_id = 0
+    for column, style_id in enumerate(styles):
+        if style_id == last_style_id:
+            continue
+        last_style_id = style_id
+
+        cell_text_style_id, cell_text_style, cell_background_color = run_keys[style_id]
+        if cell_text_style_id != text_style_id:
+            if text_style_id is not None:
+                text_runs.append((text_column, run_text(text_column, column), text_style))
+            text_column, text_style_id, text_style = column, cell_text_style_id, cell_text_style
+
+        if cell_background_color != background_color:
+            if background_color is not None and background_color != 'background':
+                background_runs.append((background_column, column - background_column,
+                                        background_color))
+            background_column, background_color = column, cell_background_color
+
+    column = len(styles)
+    if text_style_id is not None:
+        text_runs.append((text_column, run_text(text_column, column), text_style))
+    if background_color is not None and background_color != 'background':
+        background_runs.append((background_column, column - background_column,
+                                background_color))
+    return background_runs, tuple(text_runs)
+
+
+def _line_runs(screen_line):
+    """Return the background runs and the text runs of a line of the screen
+
+    Both kinds of runs are made of consecutive cells and are computed in a single pass over the
+    line. Background runs are tuples (column, length, background_color) grouping cells with the
+    same background color, apart from the default background which is not rendered. Text runs
+    are tuples (column, text, style) grouping cells with the same style, 'style' being the
+    tuple of the values of _TEXT_ATTRIBUTES. Text runs are returned as a tuple which is hashable
+    and cheap to build compared to the 'text' elements it describes, which makes it suitable as
+    a key for finding identical lines.
+
+    :param screen_line: Mapping between column numbers and CharacterCells
+    :return: Tuple made of the list of background runs and the tuple of text runs
+    """
+    if isinstance(screen_line, CharacterCellLine):
+        return _compact_line_runs(screen_line)
+
+    background_runs = []
+    text_runs = []
+    next_column = None
+    background_column = background_color = None
+    text_column = style = None
+    text = []
+    for column, cell in sorted(screen_line.items()):
+        consecutive = column == next_column
+
+        cell_style = _text_style(cell)
+        if consecutive and cell_style == style:
+            text.append(cell[0])
+        else:
+            if text:
+                text_runs.append((text_column, ''.join(text), style))
+            text_column, style, text = column, cell_style, [cell[0]]
+
+        cell_background_color = cell[_BACKGROUND_COLOR_INDEX]
+        if not consecutive or cell_background_color != background_color:
+            if background_color is not None and background_color != 'background':
+                background_runs.append((background_column, next_column - background_column,
+                                        background_color))
+            background_column, background_color = column, cell_background_color
+
+        next_column = column + 1
+
+    if text:
+        text_runs.append((text_column, ''.join(text), style))
+    if background_color is not None and background_color != 'background':
+        background_runs.append((background_column, next_column - background_column,
+                                background_color))
+    return background_runs, tuple(text_runs)
 
 
 def make_rect_tag(column, length, height, cell_width, cell_height, background_color):
@@ -138,15 +445,15 @@ def _render_line_bg_colors(screen_line, height, cell_height, cell_width):
     :param cell_height: Height of the a character cell in pixels
     :param cell_width: Width of a character cell in pixels
     """
-    non_default_bg_cells = [(column, cell) for (column, cell) in sorted(screen_line.items())
-                            if cell.background_color != 'background']
+    background_runs, _ = _line_runs(screen_line)
+    return _make_rect_tags(background_runs, height, cell_width, cell_height)
 
-    key = ConsecutiveWithSameAttributes(['background_color'])
-    rect_tags = [make_rect_tag(column, len(list(group)), height, cell_width, cell_height,
-                               attributes['background_color'])
-                 for (column, attributes), group in groupby(non_default_bg_cells, key)]
 
-    return rect_tags
+def _make_rect_tags(background_runs, height, cell_width, cell_height):
+    """Return a list of 'rect' elements built from the background runs of a line (see
+    _line_runs)"""
+    return [make_rect_tag(column, length, height, cell_width, cell_height, background_color)
+            for column, length, background_color in background_runs]
 
 
 def make_text_tag(column, attributes, text, cell_width):
@@ -179,6 +486,12 @@ def make_text_tag(column, attributes, text, cell_width):
     return text_tag
 
 
+def _make_text_tags(text_runs, cell_width):
+    """Return a list of 'text' elements built from the text runs of a line (see _line_runs)"""
+    return [make_text_tag(column, dict(zip(_TEXT_ATTRIBUTES, attributes)), text, cell_width)
+            for column, text, attributes in text_runs]
+
+
 def _render_characters(screen_line, cell_width):
     """Return a list of 'text' elements representing the line of the screen
 
@@ -188,12 +501,8 @@ def _render_characters(screen_line, cell_width):
     :param screen_line: Mapping between column numbers and characters
     :param cell_width: Width of a character cell in pixels
     """
-    line = sorted(screen_line.items())
-    key = ConsecutiveWithSameAttributes(['color', 'bold', 'italics', 'underscore', 'strikethrough'])
-    text_tags = [make_text_tag(column, attributes, ''.join(c.text for _, c in group), cell_width)
-                 for (column, attributes), group in groupby(line, key)]
-
-    return text_tags
+    _, text_runs = _line_runs(screen_line)
+    return _make_text_tags(text_runs, cell_width)
 
 
 _BG_RECT_TAG_ATTRIBUTES = {
@@ -215,37 +524,34 @@ def make_animated_group(records, time, duration, cell_height, cell_width, defs):
     :param duration: Duration of the appearance on the screen (milliseconds)
     :param cell_height: Height of a character cell in pixels
     :param cell_width: Width of a character cell in pixels
-    :param defs: Existing definitions
-    :return: A tuple consisting of the animated group and the new definitions
+    :param defs: Mapping between the text runs of the lines already defined (see _line_runs) and
+    the id of their definition
+    :return: A tuple consisting of the animated group and the new definitions (mapping between
+    text runs and 'g' elements)
     """
     animation_group_tag = etree.Element('g', attrib={'display': 'none'})
     new_definitions = {}
     for event_record in records:
         # Background elements
-        rect_tags = _render_line_bg_colors(screen_line=event_record.line,
-                                           height=event_record.row * cell_height,
-                                           cell_height=cell_height,
-                                           cell_width=cell_width)
+        background_runs, text_runs = _line_runs(event_record.line)
+        rect_tags = _make_rect_tags(background_runs, event_record.row * cell_height, cell_width,
+                                    cell_height)
         for tag in rect_tags:
             animation_group_tag.append(tag)
 
-        # Group text elements for the current line into text_group_tag
-        text_group_tag = etree.Element('g')
-        text_tags = _render_characters(event_record.line, cell_width)
-        for tag in text_tags:
-            text_group_tag.append(tag)
-
-        # Find or create a definition for text_group_tag
-        text_group_tag_str = etree.tostring(text_group_tag)
-        if text_group_tag_str in defs:
-            group_id = defs[text_group_tag_str].attrib['id']
-        elif text_group_tag_str in new_definitions:
-            group_id = new_definitions[text_group_tag_str].attrib['id']
+        # Find or create a definition for the text of the line. The definition is looked up
+        # using the text runs of the line so that the corresponding elements only get built
+        # for lines not seen before
+        if text_runs in defs:
+            group_id = defs[text_runs]
+        elif text_runs in new_definitions:
+            group_id = new_definitions[text_runs].attrib['id']
         else:
             group_id = 'g{}'.format(len(defs) + len(new_definitions) + 1)
-            assert group_id not in defs.values() and group_id not in new_definitions.values()
-            text_group_tag.attrib['id'] = group_id
-            new_definitions[text_group_tag_str] = text_group_tag
+            text_group_tag = etree.Element('g', attrib={'id': group_id})
+            for tag in _make_text_tags(text_runs, cell_width):
+                text_group_tag.append(tag)
+            new_definitions[text_runs] = text_group_tag
 
         # Add a reference to the definition of text_group_tag with a 'use' tag
         use_attributes = {
@@ -257,16 +563,11 @@ def make_animated_group(records, time, duration, cell_height, cell_width, defs):
 
     # Finally, add an animation tag so that the whole group goes from 'display: none' to
     # 'display: inline' at the time the line should appear on the screen
-    if time == 0:
-        # Animations starting at 0ms should also start when the last animation ends (looping)
-        begin_time = '0ms; {id}.end'.format(id=LAST_ANIMATION_ID)
-    else:
-        begin_time = '{time}ms; {id}.end+{time}ms'.format(time=time, id=LAST_ANIMATION_ID)
     attributes = {
         'attributeName': 'display',
         'from': 'inline',
         'to': 'inline',
-        'begin': begin_time,
+        'begin': _begin_time(time),
         'dur': '{}ms'.format(duration)
     }
 
@@ -276,10 +577,80 @@ def make_animated_group(records, time, duration, cell_height, cell_width, defs):
     return animation_group_tag, new_definitions
 
 
-def render_animation(records, filename, template, cell_width=8, cell_height=17):
-    root = _render_animation(records, template, cell_width, cell_height)
-    with open(filename, 'wb') as output_file:
-        output_file.write(etree.tostring(root))
+def _begin_time(time):
+    """Return the value of the 'begin' attribute of an animation starting at 'time'"""
+    if time == 0:
+        # Animations starting at 0ms should also start when the last animation ends (looping)
+        return '0ms; {id}.end'.format(id=LAST_ANIMATION_ID)
+    return '{time}ms; {id}.end+{time}ms'.format(time=time, id=LAST_ANIMATION_ID)
+
+
+def make_scroll_animation(offset, time, duration, cell_height):
+    """Return an animation moving the content of the screen up by 'offset' lines
+
+    The animation is meant to be a child of the element containing all animated groups of the
+    screen so that lines already on the screen can be scrolled instead of being drawn again.
+
+    :param offset: Number of lines the content of the screen is scrolled by
+    :param time: Time the content of the screen should be scrolled (milliseconds)
+    :param duration: Duration of the scrolling (milliseconds)
+    :param cell_height: Height of a character cell in pixels
+    """
+    translation = '0,{}'.format(-offset * cell_height)
+    attributes = {
+        'attributeName': 'transform',
+        'type': 'translate',
+        'from': translation,
+        'to': translation,
+        'begin': _begin_time(time),
+        'dur': '{}ms'.format(duration)
+    }
+    return etree.Element(_SCROLL_ANIMATION_TAG, attributes)
+
+
+def open_animation(filename, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """Open the output file of an animation for writing
+
+    Animations written to a file whose name ends with ".svgz" are compressed with gzip on the
+    fly.
+
+    :param filename: Name of the output file
+    :param compression_level: Compression level from 0 (no compression) to 9 (best
+    compression) of SVGZ files
+    """
+    if filename.endswith('.svgz'):
+        return gzip.open(filename, 'wb', compresslevel=compression_level)
+    return open(filename, 'wb')
+
+
+def render_animation(records, filename, template, cell_width=DEFAULT_CELL_WIDTH,
+                     cell_height=DEFAULT_CELL_HEIGHT,
+                     compression_level=DEFAULT_COMPRESSION_LEVEL, cache_dir=None):
+    render_animations(records, [(filename, template)], cell_width, cell_height,
+                      compression_level, cache_dir)
+
+
+def render_animations(records, outputs, cell_width=DEFAULT_CELL_WIDTH,
+                      cell_height=DEFAULT_CELL_HEIGHT,
+                      compression_level=DEFAULT_COMPRESSION_LEVEL, cache_dir=None):
+    """Render the animation of a terminal session with several templates
+
+    The records are consumed once, whatever the number of templates, so the session is only
+    replayed once.
+
+    :param records: Records in the CharacterCellRecord format
+    :param outputs: Sequence of tuples made of the name of an output file and of the SVG
+    template (bytes) used to render the animation written to this file
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :param compression_level: Compression level of SVGZ files (see open_animation)
+    :param cache_dir: Directory of the cache of compiled templates (see load_template)
+    """
+    with ExitStack() as stack:
+        output_files = [(stack.enter_context(open_animation(filename, compression_level)),
+                         template)
+                        for filename, template in outputs]
+        _write_animations(records, output_files, cell_width, cell_height, cache_dir)
 
 
 def resize_template(template, columns, rows, cell_width, cell_height):
@@ -364,12 +735,9 @@ def validate_template(name, templates):
         raise TemplateError('Invalid template') from exc
 
 
-def _render_animation(records, template, cell_width, cell_height):
-    # Read header record and add the corresponding information to the SVG
-    if not isinstance(records, Iterator):
-        records = iter(records)
-    header = next(records)
-
+def _render_screen(header, template, cell_width, cell_height):
+    """Return the resized template and its 'screen' element, emptied of its children apart from
+    the background of the terminal"""
     root = resize_template(template, header.width, header.height, cell_width, cell_height)
 
     svg_screen_tag = root.find('.//{{{namespace}}}svg[@id="screen"]'.format(namespace=SVG_NS))
@@ -379,41 +747,620 @@ def _render_animation(records, template, cell_width, cell_height):
     for child in svg_screen_tag.getchildren():
         svg_screen_tag.remove(child)
 
-    svg_screen_tag.append(BG_RECT_TAG)
+    # Append a copy since an element can only belong to a single tree
+    svg_screen_tag.append(deepcopy(BG_RECT_TAG))
+    return root, svg_screen_tag
+
+
+# Placeholders for the parts of the document which depend on the animation itself
+_DURATION_MARKER = b'termtosvg-animation-duration'
+_SCREEN_CONTENT_MARKER = etree.tostring(etree.Comment('termtosvg screen content'))
+
+# Version of the format of compiled templates stored in cache directories. It must be
+# increased whenever the way templates are compiled changes.
+_COMPILED_TEMPLATE_VERSION = 1
+
+
+class CompiledTemplate(namedtuple('CompiledTemplate', ['document', 'scrolling_document',
+                                                       'screen_tag', 'screen_nsmap'])):
+    """Template resized to the geometry of the terminal and serialized ahead of rendering
+
+    document: Serialized SVG document with placeholders for the duration of the animation and
+              the animated elements of the screen
+    scrolling_document: Same as 'document' for animations whose screen is scrolled, in which
+                        case animated elements are gathered in a group
+    screen_tag: Tag of the 'screen' element of the template
+    screen_nsmap: Namespaces of the 'screen' element of the template
+    """
+    def split_document(self, animation_duration, scrolling):
+        """Return the beginning and the end of the SVG document, which surround the animated
+        elements of the screen"""
+        document = self.scrolling_document if scrolling else self.document
+        duration = '{}'.format(animation_duration).encode('utf-8')
+        start, end = document.replace(_DURATION_MARKER, duration).split(_SCREEN_CONTENT_MARKER)
+        return start, end
+
+    def screen_key(self):
+        """Return a hashable value identifying the 'screen' element: the children of the
+        'screen' elements of two templates with the same key are serialized alike"""
+        return self.screen_tag, frozenset(self.screen_nsmap.items())
+
+    def href_attribute(self):
+        """Return the qualified name of the xlink:href attribute of the children of the 'screen'
+        element (see _href_attribute)"""
+        return _href_attribute(self.screen_nsmap)
+
+    def serializer(self):
+        """Return a ChildSerializer for the children of the 'screen' element"""
+        return ChildSerializer(etree.Element(self.screen_tag, nsmap=self.screen_nsmap))
+
+    def to_json(self):
+        return json.dumps({
+            'version': _COMPILED_TEMPLATE_VERSION,
+            'document': self.document.decode('utf-8'),
+            'scrolling_document': self.scrolling_document.decode('utf-8'),
+            'screen_tag': self.screen_tag,
+            # The default namespace has no prefix which JSON objects do not support as key
+            'screen_nsmap': sorted(self.screen_nsmap.items(), key=lambda item: item[0] or ''),
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        """Raise ValueError if data is not a compiled template of the current version"""
+        attributes = json.loads(data)
+        if attributes.get('version') != _COMPILED_TEMPLATE_VERSION:
+            raise ValueError('Unsupported compiled template version')
+        return cls(attributes['document'].encode('utf-8'),
+                   attributes['scrolling_document'].encode('utf-8'),
+                   attributes['screen_tag'],
+                   dict(attributes['screen_nsmap']))
+
+
+def compile_template(template, columns, rows, cell_width, cell_height):
+    """Resize and validate the template and return it as a CompiledTemplate
 
-    # Process event records
+    Raise TemplateError if the template is invalid.
+
+    :param template: SVG template (bytes)
+    :param columns: Number of columns of the terminal
+    :param rows: Number of rows of the terminal
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    """
+    config = CharacterCellConfig(columns, rows)
+    root, svg_screen_tag = _render_screen(config, template, cell_width, cell_height)
+    generate_css(root=root, animation_duration=_DURATION_MARKER.decode('utf-8'))
+
+    marker = etree.Comment('termtosvg screen content')
+    svg_screen_tag.append(marker)
+    document = etree.tostring(root)
+    svg_screen_tag.remove(marker)
+    etree.SubElement(svg_screen_tag, 'g').append(marker)
+    scrolling_document = etree.tostring(root)
+
+    return CompiledTemplate(document, scrolling_document, svg_screen_tag.tag,
+                            dict(svg_screen_tag.nsmap))
+
+
+def load_template(template, columns, rows, cell_width, cell_height, cache_dir=None):
+    """Return the compiled template, reusing the one stored in cache_dir if possible
+
+    Compiled templates are stored in cache_dir under a name made of the hash of the template
+    and of the geometry of the terminal, so that templates modified since they were cached are
+    compiled again. Invalid cache files are replaced. Failing to write to cache_dir is not an
+    error.
+
+    :param template: SVG template (bytes)
+    :param columns: Number of columns of the terminal
+    :param rows: Number of rows of the terminal
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :param cache_dir: Directory where compiled templates are stored, or None to disable caching
+    """
+    if cache_dir is None:
+        return compile_template(template, columns, rows, cell_width, cell_height)
+
+    filename = os.path.join(cache_dir, '{}-{}x{}-{}x{}.json'.format(
+        hashlib.sha256(template).hexdigest(), columns, rows, cell_width, cell_height))
+    try:
+        with open(filename, 'r') as cache_file:
+            return CompiledTemplate.from_json(cache_file.read())
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    compiled_template = compile_template(template, columns, rows, cell_width, cell_height)
+    # The cache is only an optimization: the compiled template is still used if it cannot be
+    # stored (unwritable or read-only cache directory...)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so that concurrent renders never read a partial file
+        fd, temporary_filename = tempfile.mkstemp(dir=cache_dir, prefix='.termtosvg_')
+    except OSError:
+        return compiled_template
+
+    try:
+        with os.fdopen(fd, 'w') as cache_file:
+            cache_file.write(compiled_template.to_json())
+        os.replace(temporary_filename, filename)
+    except OSError:
+        os.remove(temporary_filename)
+    except BaseException:
+        os.remove(temporary_filename)
+        raise
+    return compiled_template
+
+
+def _render_frames(records, cell_width, cell_height):
+    """Yield the content of the screen as a sequence of animated elements
+
+    Each item is a tuple made of the new definitions the element refers to (mapping between text
+    runs and 'g' elements, see make_animated_group), the element itself and the time at which
+    the animation of the element ends. Elements are either animated groups displaying lines of
+    the screen or animations scrolling the screen (see make_scroll_animation). The 'animate' tag
+    of the last group is given the id LAST_ANIMATION_ID.
+
+    :param records: Event records (CharacterCellLineEvent or CharacterCellScrollEvent)
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    """
     def by_time(record):
-        return record.time, record.duration
+        return type(record), record.time, record.duration
 
     definitions = {}
-    last_animated_group = None
-    animation_duration = None
-    for (line_time, line_duration), record_group in groupby(records, key=by_time):
+    last_frame = None
+    for (record_type, time, duration), record_group in groupby(records, key=by_time):
+        if issubclass(record_type, CharacterCellScrollEvent):
+            for record in record_group:
+                scroll_animation = make_scroll_animation(record.offset, time, duration,
+                                                         cell_height)
+                yield {}, scroll_animation, time + duration
+            continue
+
         animated_group, new_defs = make_animated_group(records=record_group,
-                                                       time=line_time,
-                                                       duration=line_duration,
+                                                       time=time,
+                                                       duration=duration,
                                                        cell_height=cell_height,
                                                        cell_width=cell_width,
                                                        defs=definitions)
-        definitions.update(new_defs)
-        for definition in new_defs.values():
-            etree.SubElement(svg_screen_tag, 'defs').append(definition)
-
-        svg_screen_tag.append(animated_group)
-        last_animated_group = animated_group
-        animation_duration = line_time + line_duration
+        definitions.update((text_runs, definition.attrib['id'])
+                           for text_runs, definition in new_defs.items())
+        # Hold back the group until the next one is available so that the last group can
+        # be identified
+        if last_frame is not None:
+            yield last_frame
+        last_frame = new_defs, animated_group, time + duration
 
     # Add id attribute to the last 'animate' tag so that it can be referred to by the first
     # animations (enables animation looping)
-    if last_animated_group is not None:
+    if last_frame is not None:
+        _, last_animated_group, _ = last_frame
         animate_tags = last_animated_group.findall('animate')
         assert len(animate_tags) == 1
         animate_tags.pop().attrib['id'] = LAST_ANIMATION_ID
+        yield last_frame
+
+
+def _render_animation(records, template, cell_width, cell_height):
+    # Read header record and add the corresponding information to the SVG
+    if not isinstance(records, Iterator):
+        records = iter(records)
+    header = next(records)
+
+    root, svg_screen_tag = _render_screen(header, template, cell_width, cell_height)
+
+    # Elements are gathered in a group which is only kept if the screen needs scrolling
+    screen_content_tag = etree.Element('g')
+    scrolling = False
+    animation_duration = None
+    for new_defs, element, end_time in _render_frames(records, cell_width, cell_height):
+        for definition in new_defs.values():
+            etree.SubElement(screen_content_tag, 'defs').append(definition)
+        screen_content_tag.append(element)
+        scrolling = scrolling or element.tag == _SCROLL_ANIMATION_TAG
+        animation_duration = max(end_time, animation_duration or 0)
+
+    if scrolling:
+        svg_screen_tag.append(screen_content_tag)
+    else:
+        svg_screen_tag.extend(screen_content_tag.getchildren())
 
     generate_css(root=root, animation_duration=animation_duration)
     return root
 
 
+# Characters rejected by lxml in text content: control characters other than tab, line feed and
+# carriage return, surrogates and the non-characters U+FFFE and U+FFFF
+_XML_INCOMPATIBLE_CHARACTERS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#13;'})
+_ATTRIBUTE_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+                                    '\t': '&#9;', '\n': '&#10;', '\r': '&#13;'})
+
+
+def _escape_text(text):
+    """Escape text content the way lxml does, raising ValueError if the text contains
+    characters which cannot appear in an XML document"""
+    if _XML_INCOMPATIBLE_CHARACTERS.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes '
+                         'or control characters')
+    return text.translate(_TEXT_ESCAPES)
+
+
+def _color_markup(color):
+    """Return the markup of the attribute setting the color of an element (see make_rect_tag)"""
+    if color.startswith('#'):
+        return 'fill="{}"'.format(color.translate(_ATTRIBUTE_ESCAPES))
+    return 'class="{}"'.format(color.translate(_ATTRIBUTE_ESCAPES))
+
+
+def _text_style_markup(attributes):
+    """Return the markup of the style attributes of a 'text' element (see make_text_tag)
+
+    :param attributes: Values of _TEXT_ATTRIBUTES
+    """
+    color, bold, italics, underscore, strikethrough = attributes
+    markup = []
+    if bold:
+        markup.append('font-weight="bold"')
+    if italics:
+        markup.append('font-style="italic"')
+    decoration = ''
+    if underscore:
+        decoration = 'underline'
+    if strikethrough:
+        decoration += ' line-through'
+    if decoration:
+        markup.append('text-decoration="{}"'.format(decoration))
+    markup.append(_color_markup(color))
+    return ' '.join(markup)
+
+
+class _MarkupCache(dict):
+    """Mapping between values and their markup, computed on first access"""
+    def __init__(self, markup_function):
+        super().__init__()
+        self.markup_function = markup_function
+
+    def __missing__(self, key):
+        markup = self[key] = self.markup_function(key)
+        return markup
+
+
+def _definition_markup(group_id, text_runs, cell_width, text_style_markup):
+    """Return the markup of the 'defs' element holding the definition of a line (see
+    make_animated_group)"""
+    if not text_runs:
+        return '<defs><g id="{}"/></defs>'.format(group_id)
+    return '<defs><g id="{}">{}</g></defs>'.format(group_id, ''.join(
+        '<text x="{}" textLength="{}" {}>{}</text>'.format(
+            column * cell_width, len(text) * cell_width, text_style_markup[attributes],
+            _escape_text(text))
+        for column, text, attributes in text_runs
+    ))
+
+
+def _href_attribute(nsmap):
+    """Return the qualified name of the xlink:href attribute of the children of an element
+    whose namespaces are 'nsmap', or None if the namespace of xlink is not declared by a single
+    prefix"""
+    prefixes = [prefix for prefix, namespace in nsmap.items() if namespace == XLINK_NS]
+    if len(prefixes) != 1 or prefixes[0] is None:
+        return None
+    return '{}:href'.format(prefixes[0])
+
+
+def _render_markup(records, cell_width, cell_height, href_attribute):
+    """Yield the content of the screen as a sequence of serialized animated elements
+
+    This is the equivalent of serializing the output of _render_frames with a ChildSerializer,
+    byte for byte, except that the markup is written directly instead of building lxml elements
+    first, which is about three times faster.
+
+    Each item is a tuple made of the new definitions the element refers to (list of tuples made
+    of the text runs of the line, the id of the definition and the serialized 'defs' element
+    holding the definition), the serialized element and the time at which the animation of the
+    element ends.
+
+    :param records: Event records (CharacterCellLineEvent or CharacterCellScrollEvent)
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :param href_attribute: Qualified name of the xlink:href attribute, whose namespace must be
+    declared by the parent of the elements
+    """
+    def by_time(record):
+        return type(record), record.time, record.duration
+
+    color_markup = _MarkupCache(_color_markup)
+    text_style_markup = _MarkupCache(_text_style_markup)
+    definitions = {}
+    last_frame = None
+    for (record_type, time, duration), record_group in groupby(records, key=by_time):
+        if issubclass(record_type, CharacterCellScrollEvent):
+            for record in record_group:
+                translation = '0,{}'.format(-record.offset * cell_height)
+                scroll_animation = ('<{0} attributeName="transform" type="translate" '
+                                    'from="{1}" to="{1}" begin="{2}" dur="{3}ms"/>'
+                                    .format(_SCROLL_ANIMATION_TAG, translation,
+                                            _begin_time(time), duration))
+                yield [], scroll_animation.encode('ascii'), time + duration
+            continue
+
+        new_defs = []
+        markup = ['<g display="none">']
+        for event_record in record_group:
+            y = event_record.row * cell_height
+            background_runs, text_runs = _line_runs(event_record.line)
+            for column, length, background_color in background_runs:
+                markup.append('<rect x="{}" y="{}" width="{}" height="{}" {}/>'.format(
+                    column * cell_width, y, length * cell_width, cell_height,
+                    color_markup[background_color]))
+
+            try:
+                group_id = definitions[text_runs]
+            except KeyError:
+                group_id = definitions[text_runs] = 'g{}'.format(len(definitions) + 1)
+                definition = _definition_markup(group_id, text_runs, cell_width,
+                                                text_style_markup)
+                new_defs.append((text_runs, group_id,
+                                 definition.encode('ascii', 'xmlcharrefreplace')))
+            markup.append('<use {}="#{}" y="{}"/>'.format(href_attribute, group_id, y))
+
+        markup.append('<animate attributeName="display" from="inline" to="inline" begin="{}" '
+                      'dur="{}ms"'.format(_begin_time(time), duration))
+        # Hold back the group until the next one is available so that the last group can
+        # be identified
+        if last_frame is not None:
+            last_defs, last_markup, last_end_time = last_frame
+            yield last_defs, last_markup + b'/></g>', last_end_time
+        last_frame = new_defs, ''.join(markup).encode('ascii', 'xmlcharrefreplace'), time + duration
+
+    # Add id attribute to the last 'animate' tag so that it can be referred to by the first
+    # animations (enables animation looping)
+    if last_frame is not None:
+        last_defs, last_markup, last_end_time = last_frame
+        last_animation_id = ' id="{}"/></g>'.format(LAST_ANIMATION_ID).encode('ascii')
+        yield last_defs, last_markup + last_animation_id, last_end_time
+
+
+def _serialize_frames(frames, serialize):
+    """Serialize the output of _render_frames into the format of _render_markup"""
+    for new_defs, element, end_time in frames:
+        serialized_defs = []
+        for text_runs, definition in new_defs.items():
+            defs_tag = etree.Element('defs')
+            defs_tag.append(definition)
+            serialized_defs.append((text_runs, definition.attrib['id'], serialize(defs_tag)))
+        yield serialized_defs, serialize(element), end_time
+
+
+_SCROLL_ANIMATION_MARKUP = '<{}'.format(_SCROLL_ANIMATION_TAG).encode('ascii')
+
+
+def _is_scroll_animation(markup):
+    return markup.startswith(_SCROLL_ANIMATION_MARKUP)
+
+
+class ChildSerializer:
+    """Callable serializing elements the way they would be serialized if they were children of
+    'parent'
+
+    Unlike etree.tostring, no namespace declaration is added to the serialized element as long as
+    the namespace is already declared by 'parent'.
+    """
+    def __init__(self, parent):
+        self.container = etree.Element(parent.tag, nsmap=parent.nsmap)
+        self.container.text = ''
+        empty_container = etree.tostring(self.container)
+        split_index = empty_container.rindex(b'</')
+        self.start_tag_length = split_index
+        self.end_tag_length = len(empty_container) - split_index
+
+    def __call__(self, element):
+        self.container.append(element)
+        try:
+            data = etree.tostring(self.container)
+        finally:
+            self.container.remove(element)
+        return data[self.start_tag_length:-self.end_tag_length]
+
+
+def _write_animations(records, outputs, cell_width, cell_height, cache_dir=None):
+    """Write the SVG animation of the records to several files incrementally
+
+    Animated groups are serialized as soon as they are produced and appended to a temporary file
+    so that memory usage does not depend on the length of the recording. The beginning of the
+    document, which includes the duration of the animation, is written once all groups have been
+    produced, followed by the content of the temporary file and the end of the document.
+
+    Animated groups only depend on the template through the namespaces of its 'screen' element,
+    so they are serialized once for all the templates whose 'screen' elements are alike. Their
+    markup is written directly (see _render_markup) unless a template does not declare the
+    namespace of xlink with a prefix, in which case elements are built and serialized by lxml.
+
+    :param records: Records in the CharacterCellRecord format
+    :param outputs: Sequence of tuples made of a binary file object the animation is written to
+    and of the SVG template (bytes) of this animation
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :param cache_dir: Directory of the cache of compiled templates (see load_template)
+    """
+    if not isinstance(records, Iterator):
+        records = iter(records)
+    header = next(records)
+
+    compiled_templates = [load_template(template, header.width, header.height, cell_width,
+                                        cell_height, cache_dir)
+                          for _, template in outputs]
+
+    with ExitStack() as stack:
+        href_attributes = {compiled_template.href_attribute()
+                           for compiled_template in compiled_templates}
+        if len(href_attributes) == 1 and None not in href_attributes:
+            # The markup of the elements is written directly and is the same for all templates
+            keys = [None] * len(compiled_templates)
+            streams = {None: _render_markup(records, cell_width, cell_height,
+                                            href_attributes.pop())}
+        else:
+            keys = [compiled_template.screen_key() for compiled_template in compiled_templates]
+            serializers = {key: compiled_template.serializer()
+                           for key, compiled_template in zip(keys, compiled_templates)}
+            frame_streams = tee(_render_frames(records, cell_width, cell_height),
+                                len(serializers))
+            streams = {key: _serialize_frames(frames, serialize)
+                       for (key, serialize), frames in zip(serializers.items(), frame_streams)}
+        screen_content_files = {key: stack.enter_context(tempfile.TemporaryFile())
+                                for key in streams}
+
+        scrolling = False
+        animation_duration = None
+        for frames in zip(*streams.values()):
+            for (new_defs, markup, _), screen_content_file in zip(frames,
+                                                                  screen_content_files.values()):
+                for _, _, definition in new_defs:
+                    screen_content_file.write(definition)
+                screen_content_file.write(markup)
+            _, markup, end_time = frames[0]
+            scrolling = scrolling or _is_scroll_animation(markup)
+            animation_duration = max(end_time, animation_duration or 0)
+
+        for (output_file, _), compiled_template, key in zip(outputs, compiled_templates, keys):
+            # If the screen needs scrolling, animated elements are gathered in a group (see
+            # _render_animation)
+            document_start, document_end = compiled_template.split_document(animation_duration,
+                                                                            scrolling)
+            screen_content_file = screen_content_files[key]
+            output_file.write(document_start)
+            screen_content_file.seek(0)
+            shutil.copyfileobj(screen_content_file, output_file)
+            output_file.write(document_end)
+
+
+_SegmentAnimation = namedtuple('_SegmentAnimation', ['filename', 'definitions', 'scrolling',
+                                                     'has_groups', 'animation_duration'])
+
+# References to definitions in serialized animated groups
+_DEFINITION_REFERENCE = re.compile(rb'href="#(g[0-9]+)"')
+
+
+def render_animation_parallel(config, segments, filename, template, jobs,
+                              cell_width=DEFAULT_CELL_WIDTH, cell_height=DEFAULT_CELL_HEIGHT,
+                              compression_level=DEFAULT_COMPRESSION_LEVEL, cache_dir=None):
+    """Render the animation of a terminal session split into segments using a pool of processes
+
+    Segments are rendered independently of each other by the processes of the pool. Definitions
+    of the lines of each segment are then merged so that lines appearing in several segments are
+    only defined once, and the ids of the definitions and of the last animation are updated
+    accordingly.
+
+    :param config: Configuration record of the session (CharacterCellConfig)
+    :param segments: Segments of the session (see termtosvg.term.split_replay). Segments must
+    have a 'replay' method returning their records in the CharacterCellRecord format.
+    :param filename: Name of the output file
+    :param template: SVG template (bytes)
+    :param jobs: Number of processes rendering segments
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :param compression_level: Compression level of SVGZ files (see open_animation)
+    :param cache_dir: Directory of the cache of compiled templates (see load_template)
+    """
+    compiled_template = load_template(template, config.width, config.height, cell_width,
+                                      cell_height, cache_dir)
+
+    with tempfile.TemporaryDirectory(prefix='termtosvg_') as directory:
+        render_segment = partial(_render_segment,
+                                 directory=directory,
+                                 parent_tag=compiled_template.screen_tag,
+                                 nsmap=compiled_template.screen_nsmap,
+                                 cell_width=cell_width,
+                                 cell_height=cell_height)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            segment_animations = list(executor.map(render_segment, segments))
+
+        scrolling = any(animation.scrolling for animation in segment_animations)
+        end_times = [animation.animation_duration for animation in segment_animations
+                     if animation.animation_duration is not None]
+        animation_duration = max(end_times) if end_times else None
+
+        # Only the last group of the last segment keeps the id of the last animation
+        last_index = None
+        for index, animation in enumerate(segment_animations):
+            if animation.has_groups:
+                last_index = index
+        last_animation_id = ' id="{}"'.format(LAST_ANIMATION_ID).encode('utf-8')
+
+        document_start, document_end = compiled_template.split_document(animation_duration,
+                                                                        scrolling)
+        with open_animation(filename, compression_level) as output_file:
+            output_file.write(document_start)
+            definitions = {}
+            for index, animation in enumerate(segment_animations):
+                ids = {}
+                for segment_id, text_runs, data in animation.definitions:
+                    try:
+                        ids[segment_id] = definitions[text_runs]
+                    except KeyError:
+                        group_id = 'g{}'.format(len(definitions) + 1)
+                        definitions[text_runs] = ids[segment_id] = group_id
+                        output_file.write(data.replace(
+                            'id="{}"'.format(segment_id).encode('utf-8'),
+                            'id="{}"'.format(group_id).encode('utf-8'),
+                            1
+                        ))
+
+                with open(animation.filename, 'rb') as segment_file:
+                    data = segment_file.read()
+                os.remove(animation.filename)
+
+                data = _DEFINITION_REFERENCE.sub(
+                    lambda match, ids=ids: 'href="#{}"'.format(
+                        ids[match.group(1).decode('utf-8')]).encode('utf-8'),
+                    data
+                )
+                if index != last_index:
+                    data = data.replace(last_animation_id, b'')
+                output_file.write(data)
+            output_file.write(document_end)
+
+
+def _render_segment(segment, directory, parent_tag, nsmap, cell_width, cell_height):
+    """Render the animated elements of a segment of a terminal session to a file of 'directory'
+
+    Definitions are not written to the file but returned to the caller along with the text
+    runs they were built from so that the caller can merge the definitions of all segments.
+
+    :param segment: Segment of the terminal session
+    :param directory: Directory where the file is created
+    :param parent_tag: Tag of the element the animated elements will be children of
+    :param nsmap: Namespaces of the element the animated elements will be children of
+    :param cell_width: Width of a character cell in pixels
+    :param cell_height: Height of a character cell in pixels
+    :return: _SegmentAnimation
+    """
+    records = segment.replay(CharacterCell.from_pyte, CharacterCellLine.converter())
+    href_attribute = _href_attribute(nsmap)
+    if href_attribute is not None:
+        frames = _render_markup(records, cell_width, cell_height, href_attribute)
+    else:
+        serialize = ChildSerializer(etree.Element(parent_tag, nsmap=nsmap))
+        frames = _serialize_frames(_render_frames(records, cell_width, cell_height), serialize)
+
+    definitions = []
+    scrolling = False
+    has_groups = False
+    animation_duration = None
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as segment_file:
+        for new_defs, markup, end_time in frames:
+            for text_runs, group_id, definition in new_defs:
+                definitions.append((group_id, text_runs, definition))
+            segment_file.write(markup)
+            is_scroll_animation = _is_scroll_animation(markup)
+            scrolling = scrolling or is_scroll_animation
+            has_groups = has_groups or not is_scroll_animation
+            animation_duration = max(end_time, animation_duration or 0)
+
+    return _SegmentAnimation(segment_file.name, definitions, scrolling, has_groups,
+                             animation_duration)
+
+
 def generate_css(root, animation_duration):
     """Build and embed CSS in SVG animation"""
     try:
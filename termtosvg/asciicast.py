@@ -7,10 +7,17 @@ specification of the two formats are available here:
     [2] https://github.com/asciinema/asciinema/blob/develop/doc/asciicast-v2.md
 """
 import abc
+import bisect
 import codecs
+import importlib
 import json
+import math
+import mmap
+import os
+import re
+import time
+from array import array
 from collections import namedtuple
-from typing import Iterable
 
 utf8_decoder = codecs.getincrementaldecoder('utf-8')('replace')
 
@@ -29,69 +36,393 @@ class AsciiCastV2Record(abc.ABC):
     def from_json_line(cls, line):
         """Raise AsciiCastError if line is not a valid asciicast v2 record"""
         try:
-            json_dict = json.loads(line)
+            json_value = json.loads(line)
         except json.JSONDecodeError as exc:
             raise AsciiCastError from exc
-        if isinstance(json_dict, dict):
-            return AsciiCastV2Header.from_json_line(line)
-        if isinstance(json_dict, list):
-            return AsciiCastV2Event.from_json_line(line)
-        truncated_line = line if len(line) < 20 else '{}...'.format(line[:20])
-        raise AsciiCastError('Unknown record type: "{}"'.format(truncated_line))
-
-
-def _read_v1_records(data):
-    v1_header_attributes = {
-        'version',
-        'width',
-        'height',
-        'stdout'
-    }
+        return cls.from_json_value(json_value)
+
+    @classmethod
+    def from_json_value(cls, json_value):
+        """Return the record matching the value decoded from a JSON line
+
+        Raise AsciiCastError if the value is not a valid asciicast v2 record"""
+        if isinstance(json_value, dict):
+            return AsciiCastV2Header.from_json_value(json_value)
+        if isinstance(json_value, list):
+            return AsciiCastV2Event.from_json_value(json_value)
+        value = str(json_value)
+        truncated_value = value if len(value) < 20 else '{}...'.format(value[:20])
+        raise AsciiCastError('Unknown record type: "{}"'.format(truncated_value))
+
+
+# Keys of asciicast v1 files needed to build the header of the recording
+_V1_HEADER_ATTRIBUTES = {'version', 'width', 'height'}
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_JSON_ARRAY_SEPARATOR = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+_JSON_NUMBER_CHARACTERS = frozenset('0123456789.eE+-')
+
+# Compression formats supported for recordings: extension of the file, magic bytes at the
+# beginning of the file and module implementing the format
+_COMPRESSION_FORMATS = [
+    ('.gz', b'\x1f\x8b', 'gzip'),
+    ('.xz', b'\xfd7zXZ\x00', 'lzma'),
+]
+
+
+def _compression_module_name(filename, mode):
+    """Return the name of the module handling the compression of the file or None if the file
+    is not compressed
+
+    Existing files opened for reading are identified by their first bytes, files opened for
+    writing by their extension.
+    """
+    if 'r' in mode:
+        with open(filename, 'rb') as cast_file:
+            magic = cast_file.read(max(len(magic) for _, magic, _ in _COMPRESSION_FORMATS))
+        for _, format_magic, module_name in _COMPRESSION_FORMATS:
+            if magic.startswith(format_magic):
+                return module_name
+    else:
+        for extension, _, module_name in _COMPRESSION_FORMATS:
+            if filename.endswith(extension):
+                return module_name
+    return None
+
+
+def open_cast(filename, mode='r'):
+    """Open a recording, compressing or decompressing it on the fly if needed
+
+    Recordings compressed with gzip or xz are supported: they are detected from the first
+    bytes of the file when reading and from the extension of the filename (".gz" or ".xz")
+    when writing. Compressed recordings are seekable but seeking backwards or far ahead
+    requires decompressing the file again from its beginning.
+    Raise AsciiCastError if the compression format is not available on this platform.
+
+    :param filename: Name of the recording
+    :param mode: Same as the mode argument of the builtin open function
+    """
+    module_name = _compression_module_name(filename, mode)
+    if module_name is None:
+        return open(filename, mode)
     try:
-        json_dict = json.loads(data)
-    except json.JSONDecodeError as exc:
-        raise AsciiCastError from exc
-    missing_attributes = v1_header_attributes - set(json_dict)
-    if missing_attributes:
-        raise AsciiCastError('Missing attributes in asciicast v1 file: {}'
-                             .format(missing_attributes))
+        module = importlib.import_module(module_name)
+    except ImportError as exc:
+        raise AsciiCastError('Python was built without support for the compression '
+                             'of {}'.format(filename)) from exc
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    return module.open(filename, mode)
+
+
+class _JSONTextStream:
+    """Incremental reader of the JSON values of a text file
+
+    Only a chunk of the file is held in memory at a time, so that values can be read one by one
+    from files too large to be decoded at once.
+    """
+    def __init__(self, text_file, chunk_size=65536):
+        self.text_file = text_file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read_chunk(self):
+        """Append data from the file to the buffer and return False if the file is exhausted"""
+        if self.eof:
+            return False
+        # Read at least as much data as is already buffered so that values spanning many chunks
+        # are not decoded over and over
+        data = self.text_file.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or an empty string at the end of the
+        file"""
+        while True:
+            self.position = _JSON_WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read_chunk():
+                return ''
+
+    def expect(self, characters):
+        """Consume the next character and return it; raise AsciiCastError if it is not one of
+        'characters'"""
+        character = self.peek()
+        if not character or character not in characters:
+            raise AsciiCastError('Invalid JSON: expected one of "{}" but got "{}"'
+                                 .format(characters, character))
+        self.position += 1
+        return character
+
+    def value(self):
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as exc:
+                # The value may be incomplete
+                if self._read_chunk():
+                    continue
+                raise AsciiCastError from exc
+            # Numbers may be cut short by the end of the buffer, even after a '.' or an 'e' which
+            # the decoder leaves out of a number it cannot complete
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and (end == len(self.buffer) or self.buffer[end] in _JSON_NUMBER_CHARACTERS)
+                    and self._read_chunk()):
+                continue
+            self.position = end
+            return value
+
+    def array_values(self):
+        """Yield the values of the JSON array starting at the next character one at a time"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+
+        decode = self.decoder.raw_decode
+        match_separator = _JSON_ARRAY_SEPARATOR.match
+        while True:
+            # Fast path: the value and the separator following it are entirely buffered
+            buffer = self.buffer
+            try:
+                value, end = decode(buffer, self.position)
+                match = match_separator(buffer, end)
+            except json.JSONDecodeError:
+                match = None
+
+            if match is not None and match.end() < len(buffer):
+                self.position = match.end()
+                separator = match.group(1)
+            else:
+                value = self.value()
+                separator = self.expect(',]')
+                self.peek()
+
+            yield value
+            if separator == ']':
+                return
+
 
-    if json_dict['version'] != 1:
-        raise AsciiCastError('This function can only decode asciicast v1 data')
+def _iter_v1_object(text_file, chunk_size=65536):
+    """Yield the attributes of an asciicast v1 file as (key, value) tuples
 
-    yield AsciiCastV2Header(2, json_dict['width'], json_dict['height'], None, None)
+    The events of the 'stdout' attribute are not decoded all at once: ('stdout', None) is
+    returned instead, followed by one (None, event) tuple for each event.
+    """
+    stream = _JSONTextStream(text_file, chunk_size)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise AsciiCastError('Invalid JSON: object keys must be strings')
+        stream.expect(':')
+        if key == 'stdout' and stream.peek() == '[':
+            yield key, None
+            for event in stream.array_values():
+                yield None, event
+        elif key == 'stdout':
+            raise AsciiCastError('Invalid type for stdout attribute (expected Iterable): {}'
+                                 .format(stream.value()))
+        else:
+            yield key, stream.value()
+
+        if stream.expect(',}') == '}':
+            break
 
-    if not isinstance(json_dict['stdout'], Iterable):
-        raise AsciiCastError('Invalid type for stdout attribute (expected Iterable): {}'
-                             .format(json_dict['stdout']))
 
+def _read_v1_records(text_file, chunk_size=65536):
+    """Yield asciicast v2 records built from an asciicast v1 file
+
+    Events are decoded as the file is read so that memory usage does not depend on the size of
+    the file. The file is read a second time in the unusual case where the 'stdout' attribute
+    precedes the attributes needed for the header.
+
+    :param text_file: File object in text mode
+    :param chunk_size: Number of characters read from the file at once
+    """
+    attributes = {}
+
+    def make_header():
+        missing_attributes = _V1_HEADER_ATTRIBUTES - set(attributes)
+        if 'stdout' not in attributes:
+            missing_attributes.add('stdout')
+        if missing_attributes:
+            raise AsciiCastError('Missing attributes in asciicast v1 file: {}'
+                                 .format(missing_attributes))
+        if attributes['version'] != 1:
+            raise AsciiCastError('This function can only decode asciicast v1 data')
+        return AsciiCastV2Header(2, attributes['width'], attributes['height'], None, None)
+
+    header = None
+    events_skipped = False
     time = 0
-    for event in json_dict['stdout']:
+    for key, value in _iter_v1_object(text_file, chunk_size):
+        if key is not None:
+            attributes[key] = value
+        elif header is None and not _V1_HEADER_ATTRIBUTES <= set(attributes):
+            events_skipped = True
+        else:
+            if header is None:
+                header = make_header()
+                yield header
+            event = _v1_event(value, time)
+            time = event.time
+            yield event
+
+    if header is None:
+        yield make_header()
+
+    if events_skipped:
+        text_file.seek(0)
+        for key, value in _iter_v1_object(text_file, chunk_size):
+            if key is None:
+                event = _v1_event(value, time)
+                time = event.time
+                yield event
+
+
+def _v1_event(event, time):
+    """Return the asciicast v2 record of an event of the 'stdout' attribute of an asciicast v1
+    file
+
+    :param event: Event made of the time elapsed since the previous event and the data captured
+    :param time: Time of the previous event
+    """
+    try:
+        time_elapsed, event_data = event
+    except (TypeError, ValueError) as exc:
+        raise AsciiCastError from exc
+
+    if not isinstance(time_elapsed, (int, float)) or not isinstance(event_data, str):
+        raise AsciiCastError('Invalid type for event: got object "{}" but expected '
+                             'type Tuple[Union[int, float], str]'.format(event))
+    # Types were checked above so validation by AsciiCastV2Event.__new__ can be skipped
+    return AsciiCastV2Event._make((time + time_elapsed, 'o', event_data.encode('utf-8'), None))
+
+
+def _is_v1_file(text_file, limit=65536):
+    """Return True if the file looks like an asciicast v1 file
+
+    Only the beginning of the first line of the file is read: the first line of an asciicast
+    v2 file is the header, a JSON object with a 'version' attribute different from 1. The
+    position in the file is restored.
+    """
+    position = text_file.tell()
+    line = text_file.readline(limit)
+    text_file.seek(position)
+    try:
+        json_dict = json.loads(line)
+    except ValueError:
+        return True
+    return not isinstance(json_dict, dict) or json_dict.get('version') == 1
+
+
+def read_records(filename, use_mmap=False):
+    """Yield asciicast v2 records from the file
+
+    The records in the file may themselves be in either asciicast v1 or v2 format (although
+    there must be only one record format version in the file). The format is detected from the
+    first line of the file.
+    Compressed recordings are decompressed on the fly (see open_cast).
+    Raise AsciiCastError if a record is invalid
+
+    :param use_mmap: Map uncompressed asciicast v2 files in memory and decode their records
+    from the mapping (see MappedCast) instead of reading the file line by line
+    """
+    with open_cast(filename, 'r') as cast_file:
+        if _is_v1_file(cast_file):
+            yield from _read_v1_records(cast_file)
+            return
+        if not use_mmap or _compression_module_name(filename, 'r') is not None:
+            yield from records_from_json_lines(cast_file)
+            return
+
+    with MappedCast(filename) as cast:
+        yield from cast.records()
+
+
+def records_from_json_lines(lines):
+    """Yield the asciicast v2 records encoded by each line of 'lines'
+
+    This is equivalent to calling AsciiCastV2Record.from_json_line on each line but faster for
+    long sequences of events: each line is decoded only once and events whose attributes have
+    the expected types are built without going through the validation of
+    AsciiCastV2Event.__new__. Other records go through the usual validation.
+    Raise AsciiCastError if a record is invalid.
+
+    :param lines: Iterable of strings, each one encoding a single record
+    """
+    loads = json.loads
+    make_event = AsciiCastV2Event._make
+    from_json_value = AsciiCastV2Record.from_json_value
+    for line in lines:
         try:
-            time_elapsed, event_data = event
+            json_value = loads(line)
         except ValueError as exc:
             raise AsciiCastError from exc
 
-        if not isinstance(time_elapsed, (int, float)) or not isinstance(event_data, str):
-            raise AsciiCastError('Invalid type for event: got object "{}" but expected '
-                                 'type Tuple[Union[int, float], str]'.format(event))
-        time += time_elapsed
-        yield AsciiCastV2Event(time, 'o', event_data.encode('utf-8'), None)
+        # Exact type checks are cheaper than isinstance and leave the unusual cases (such as
+        # booleans, which are instances of int) to the full validation
+        if type(json_value) is list and len(json_value) == 3:
+            time, event_type, event_data = json_value
+            if (type(time) is float or type(time) is int) and type(event_type) is str and \
+                    type(event_data) is str:
+                yield make_event((time, event_type, event_data.encode('utf-8'), None))
+                continue
+        yield from_json_value(json_value)
 
 
-def read_records(filename):
-    """Yield asciicast v2 records from the file
+def read_records_with_offsets(filename, use_mmap=False):
+    """Yield the records of an asciicast v2 file along with their position in the file
 
-    The records in the file may themselves be in either asciicast v1 or v2 format (although
-    there must be only one record format version in the file).
-    Raise AsciiCastError if a record is invalid"""
-    try:
-        with open(filename, 'r') as cast_file:
-            for line in cast_file:
-                yield AsciiCastV2Record.from_json_line(line)
-    except AsciiCastError:
-        with open(filename, 'r') as cast_file:
-            yield from _read_v1_records(cast_file.read())
+    Each item is a tuple made of the offset of the record from the beginning of the file in
+    bytes and the record itself. Raise AsciiCastError if a record is invalid, which includes
+    files in asciicast v1 format since their records cannot be located this way. Offsets of
+    compressed recordings are positions in the decompressed data.
+
+    :param use_mmap: Map uncompressed files in memory (see read_records)
+    """
+    if use_mmap and _compression_module_name(filename, 'r') is None:
+        with MappedCast(filename) as cast:
+            yield from cast.records_with_offsets()
+        return
+
+    with open_cast(filename, 'rb') as cast_file:
+        offset = 0
+        for line in cast_file:
+            yield offset, AsciiCastV2Record.from_json_line(line.decode('utf-8'))
+            offset += len(line)
+
+
+def read_records_from(filename, offset):
+    """Yield the header of an asciicast v2 file followed by the records located at least
+    'offset' bytes from the beginning of the file
+
+    'offset' must be the position of a record as returned by read_records_with_offsets.
+    Raise AsciiCastError if a record is invalid.
+    """
+    with open_cast(filename, 'rb') as cast_file:
+        header = AsciiCastV2Record.from_json_line(cast_file.readline().decode('utf-8'))
+        if not isinstance(header, AsciiCastV2Header):
+            raise AsciiCastError('The first record of the file must be a header')
+        yield header
+
+        cast_file.seek(offset)
+        yield from records_from_json_lines(line.decode('utf-8') for line in cast_file)
 
 
 _AsciiCastV2Theme = namedtuple('AsciiCastV2Theme', ['fg', 'bg', 'palette'])
@@ -177,7 +508,12 @@ class AsciiCastV2Header(AsciiCastV2Record, _AsciiCastV2Header):
 
     @classmethod
     def from_json_line(cls, line):
-        attributes = json.loads(line)
+        return cls.from_json_value(json.loads(line))
+
+    @classmethod
+    def from_json_value(cls, attributes):
+        if not isinstance(attributes, dict):
+            raise AsciiCastError('Invalid header: {}'.format(attributes))
         filtered_attributes = {attr: attributes.get(attr) for attr in AsciiCastV2Header._fields}
         if filtered_attributes['theme'] is not None:
             filtered_attributes['theme'] = AsciiCastV2Theme(**filtered_attributes['theme'])
@@ -222,8 +558,16 @@ class AsciiCastV2Event(AsciiCastV2Record, _AsciiCastV2Event):
     @classmethod
     def from_json_line(cls, line):
         try:
-            time, event_type, event_data = json.loads(line)
-        except (json.JSONDecodeError, ValueError) as exc:
+            json_value = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise AsciiCastError from exc
+        return cls.from_json_value(json_value)
+
+    @classmethod
+    def from_json_value(cls, json_value):
+        try:
+            time, event_type, event_data = json_value
+        except (TypeError, ValueError) as exc:
             raise AsciiCastError from exc
 
         try:
@@ -233,3 +577,372 @@ class AsciiCastV2Event(AsciiCastV2Record, _AsciiCastV2Event):
 
         event = cls(time, event_type, event_data, None)
         return event
+
+
+class EventStore:
+    """Compact in-memory storage of the events of a recording
+
+    Events are stored column by column: times and durations are arrays of floats, event
+    types are indexes in the list of the types encountered, and the data of all events is
+    concatenated in a single bytearray along with an array of offsets. The memory needed to
+    hold a recording is thus close to the size of the file it was read from and, unlike
+    streams of records, the recording can be walked through any number of times.
+
+    Durations are only set for events grouped into frames (see termtosvg.term._group_by_time),
+    which is how the store is used by termtosvg.term.split_replay. Events without a duration,
+    such as the ones read from a file, have a duration of None.
+
+    Slicing the store with consecutive indexes returns a read-only view of the same storage in
+    constant time. Indexing it returns an AsciiCastV2Event. Pickling a view only copies the
+    events it is made of.
+    """
+    def __init__(self, header=None):
+        """
+        :param header: AsciiCastV2Header of the recording
+        """
+        self.header = header
+        self._times = array('d')
+        # Missing durations are stored as NaN
+        self._durations = array('d')
+        self._types = array('B')
+        self._type_names = []
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self._start = 0
+        self._stop = 0
+        self._is_view = False
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a store from asciicast v2 records made of a header followed by events
+
+        Raise AsciiCastError if the first record is not a header.
+        """
+        records = iter(records)
+        header = next(records, None)
+        if not isinstance(header, AsciiCastV2Header):
+            raise AsciiCastError('The first record must be a header')
+        store = cls(header)
+        store.extend(records)
+        return store
+
+    @classmethod
+    def load(cls, filename):
+        """Read a recording in asciicast v1 or v2 format (see read_records)"""
+        return cls.from_records(read_records(filename))
+
+    def append(self, event):
+        """Add an AsciiCastV2Event at the end of the store
+
+        Raise ValueError if the store is a slice of another store, and BufferError if a
+        memoryview of event data returned by event_data is still alive.
+        """
+        if self._is_view:
+            raise ValueError('Slices of an EventStore are read-only')
+        try:
+            type_index = self._type_names.index(event.event_type)
+        except ValueError:
+            type_index = len(self._type_names)
+            self._type_names.append(event.event_type)
+        self._data += event.event_data
+        self._times.append(event.time)
+        self._durations.append(math.nan if event.duration is None else event.duration)
+        self._types.append(type_index)
+        self._offsets.append(len(self._data))
+        self._stop += 1
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('Slices of an EventStore must be made of consecutive events')
+            view = EventStore.__new__(EventStore)
+            view.__dict__.update(self.__dict__)
+            view._start = self._start + start
+            view._stop = self._start + max(start, stop)
+            view._is_view = True
+            return view
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('EventStore index out of range')
+        i = self._start + index
+        duration = self._durations[i]
+        return AsciiCastV2Event._make((
+            self._times[i],
+            self._type_names[self._types[i]],
+            bytes(self._data[self._offsets[i]:self._offsets[i + 1]]),
+            None if math.isnan(duration) else duration,
+        ))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def event_data(self, index):
+        """Return a memoryview of the data of an event, without copying it
+
+        The view can be passed as is to pyte.ByteStream.feed.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('EventStore index out of range')
+        i = self._start + index
+        return memoryview(self._data)[self._offsets[i]:self._offsets[i + 1]]
+
+    def time(self, index):
+        """Return the time of an event"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('EventStore index out of range')
+        return self._times[self._start + index]
+
+    def duration(self, index):
+        """Return the duration of an event, or None if the event has no duration"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('EventStore index out of range')
+        duration = self._durations[self._start + index]
+        return None if math.isnan(duration) else duration
+
+    def data_size(self):
+        """Return the total size of the data of the events in bytes"""
+        return self._offsets[self._stop] - self._offsets[self._start]
+
+    def index_at(self, time):
+        """Return the index of the first event happening at or after 'time', or the number of
+        events if there is none. Events must be sorted by time."""
+        return bisect.bisect_left(self._times, time, self._start, self._stop) - self._start
+
+    def between(self, start, end):
+        """Return a view of the events happening in the interval [start, end)"""
+        return self[self.index_at(start):self.index_at(end)]
+
+    def records(self):
+        """Yield the header of the recording followed by its events"""
+        yield self.header
+        yield from self
+
+    def __getstate__(self):
+        # Views would otherwise be pickled along with the whole storage of the store
+        start, stop = self._start, self._stop
+        data_start, data_stop = self._offsets[start], self._offsets[stop]
+        state = dict(self.__dict__)
+        state.update({
+            '_times': self._times[start:stop],
+            '_durations': self._durations[start:stop],
+            '_types': self._types[start:stop],
+            '_data': self._data[data_start:data_stop],
+            '_offsets': array('Q', (offset - data_start
+                                    for offset in self._offsets[start:stop + 1])),
+            '_start': 0,
+            '_stop': stop - start,
+        })
+        return state
+
+
+def _line_offsets(buffer):
+    """Return an array of the offsets of the beginning of each line of the buffer, followed by
+    the size of the buffer
+
+    Newlines are located with the find method of the buffer so that no object other than the
+    offset itself is created for each line.
+    """
+    offsets = array('Q', [0])
+    append = offsets.append
+    find = buffer.find
+    position = find(b'\n')
+    while position != -1:
+        position += 1
+        append(position)
+        position = find(b'\n', position)
+    if offsets[-1] != len(buffer):
+        append(len(buffer))
+    return offsets
+
+
+class MappedCast:
+    """Random access to the events of an asciicast v2 file mapped in memory
+
+    The file is mapped with mmap and the positions of its lines are found in a single scan
+    when the object is created. Events are then decoded lazily, one line at a time, from the
+    mapped buffer: only the events accessed are copied into Python objects which makes it
+    possible to sample or seek through very large recordings.
+
+    Events are numbered from 0, the header of the recording not being counted. Use as a
+    context manager or call close() to release the mapping.
+    """
+    def __init__(self, filename):
+        """Raise AsciiCastError if the file is not an uncompressed asciicast v2 file"""
+        if _compression_module_name(filename, 'r') is not None:
+            raise AsciiCastError('Compressed recordings cannot be mapped in memory: {}'
+                                 .format(filename))
+        self._file = open(filename, 'rb')
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise AsciiCastError('Empty recording: {}'.format(filename))
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        try:
+            self._offsets = _line_offsets(self._buffer)
+            self.header = AsciiCastV2Record.from_json_line(self._line(0))
+            if not isinstance(self.header, AsciiCastV2Header):
+                raise AsciiCastError('The first record of the file must be a header')
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _line(self, line_number):
+        start, end = self._offsets[line_number], self._offsets[line_number + 1]
+        return self._buffer[start:end].decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 2
+
+    def __getitem__(self, index):
+        """Return the event decoded from the file, or a list of events for slices
+
+        Raise AsciiCastError if the line of an event is not a valid record.
+        """
+        if isinstance(index, slice):
+            return list(self.events(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MappedCast index out of range')
+        return AsciiCastV2Record.from_json_line(self._line(index + 1))
+
+    def events(self, start=0, stop=None, step=1):
+        """Yield the events of the file in range(start, stop, step)"""
+        if stop is None:
+            stop = len(self)
+        lines = (self._line(index + 1) for index in range(start, stop, step))
+        yield from records_from_json_lines(lines)
+
+    def __iter__(self):
+        return self.events()
+
+    def records(self):
+        """Yield the header of the recording followed by its events"""
+        yield self.header
+        yield from self.events()
+
+    def records_with_offsets(self):
+        """Yield the records of the file along with their position in the file (see
+        read_records_with_offsets)"""
+        yield 0, self.header
+        yield from zip(self._offsets[1:-1], self.events())
+
+    def offset(self, index):
+        """Return the position in bytes of an event from the beginning of the file"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MappedCast index out of range')
+        return self._offsets[index + 1]
+
+    def index_at(self, time):
+        """Return the index of the first event happening at or after 'time', or the number of
+        events if there is none
+
+        Events must be sorted by time; only the events met by the binary search are decoded.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle].time < time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+class AsciiCastWriter:
+    """Buffered writer of asciicast v2 records
+
+    Records are encoded as they are written but only written to the file in batches: the
+    buffer is flushed once it holds more than 'buffer_size' characters or once 'flush_interval'
+    seconds have passed since the last flush, whichever comes first. Since both conditions are
+    checked when a record is written, data can stay buffered while the recorded program is
+    idle. Use the writer as a context manager so that buffered records are written to the file
+    no matter how the recording ends.
+
+    The output is identical to the one obtained by writing the result of to_json_line for each
+    record followed by a newline.
+    """
+    def __init__(self, file, buffer_size=65536, flush_interval=1.0):
+        """
+        :param file: File object in text mode
+        :param buffer_size: Number of characters buffered before the buffer is flushed
+        :param flush_interval: Maximum time in seconds between two flushes of the buffer
+        """
+        self.file = file
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffered_size = 0
+        self._last_flush = time.monotonic()
+        # Event data may end in the middle of a UTF-8 sequence which is then completed by the
+        # data of the next event, hence the incremental decoder
+        self._decode = codecs.getincrementaldecoder('utf-8')('replace').decode
+        self._encode_string = json.encoder.encode_basestring
+
+    def write(self, record):
+        if isinstance(record, AsciiCastV2Event):
+            line = self._encode_event(record)
+        else:
+            line = record.to_json_line() + '\n'
+        self._buffer.append(line)
+        self._buffered_size += len(line)
+        if self._buffered_size >= self.buffer_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _encode_event(self, event):
+        event_time = event.time
+        event_data = self._decode(event.event_data)
+        # Same output as json.dumps for the common case of finite floats and integers
+        if type(event_time) is float and math.isfinite(event_time) or type(event_time) is int:
+            return '[{!r}, {}, {}]\n'.format(event_time, self._encode_string(event.event_type),
+                                             self._encode_string(event_data))
+        attributes = [event_time, event.event_type, event_data]
+        return json.dumps(attributes, ensure_ascii=False) + '\n'
+
+    def flush(self):
+        """Write buffered records to the file and flush it"""
+        if self._buffer:
+            self.file.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered_size = 0
+        self.file.flush()
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
@@ -0,0 +1,223 @@
+"""Rendering of many recordings at once
+
+Recordings are either all the recordings of a directory or the ones listed in a manifest, a
+text file with one recording per line. The name of the animation may follow the name of the
+recording on the same line, separated by a tab character; otherwise the animation is written
+next to the recording (or in the output directory) with the extension of the recording replaced
+by ".svg". Empty lines and lines starting with '#' are ignored and relative filenames are
+relative to the directory of the manifest:
+    # Recordings of the tutorial
+    intro.cast
+    install.cast.gz	../docs/install.svgz
+
+If a cache directory is used, the key of the template and of the settings each animation was
+rendered with (see cache.settings_key) is stored in a single file of the cache directory so that
+animations are rendered again once the template or the settings change. Otherwise, only the
+modification times of the animations and of the recordings are compared.
+"""
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import termtosvg.anim
+import termtosvg.asciicast
+import termtosvg.term
+from termtosvg.cache import settings_key
+from termtosvg.config import CAST_EXTENSIONS
+
+
+class BatchError(Exception):
+    pass
+
+
+BatchItem = namedtuple('BatchItem', ['cast_filename', 'svg_filename'])
+
+# Outcome of the rendering of a BatchItem: 'duration' is the time spent rendering the
+# recording in seconds (None if the animation was up to date) and 'error' is the error which
+# interrupted the rendering, if any
+BatchResult = namedtuple('BatchResult', ['item', 'duration', 'error'])
+
+
+def _svg_filename(cast_filename, output_directory):
+    directory, basename = os.path.split(cast_filename)
+    for extension in CAST_EXTENSIONS:
+        if basename.endswith(extension):
+            basename = basename[:-len(extension)]
+            break
+    return os.path.join(output_directory or directory, basename + '.svg')
+
+
+def batch_items(path, output_directory=None):
+    """Return the list of recordings to render along with the names of their animations
+
+    Raise BatchError if the manifest is invalid.
+
+    :param path: Directory of the recordings or manifest listing them
+    :param output_directory: Directory where animations are written, unless the manifest
+    specifies their name. Defaults to the directory of each recording.
+    """
+    if os.path.isdir(path):
+        cast_filenames = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith(CAST_EXTENSIONS))
+        return [BatchItem(cast_filename, _svg_filename(cast_filename, output_directory))
+                for cast_filename in cast_filenames]
+
+    items = []
+    manifest_directory = os.path.dirname(path)
+    with open(path, 'r') as manifest_file:
+        for line_number, line in enumerate(manifest_file, start=1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            filenames = [os.path.join(manifest_directory, filename)
+                         for filename in line.split('\t')]
+            if len(filenames) == 1:
+                filenames.append(_svg_filename(filenames[0], output_directory))
+            elif len(filenames) != 2:
+                raise BatchError('Invalid line in manifest {} (line {}): expected the name of '
+                                 'a recording optionally followed by a tab and the name of an '
+                                 'animation'.format(path, line_number))
+            items.append(BatchItem(*filenames))
+    return items
+
+
+# Name of the file of the cache directory mapping the absolute names of the animations rendered
+# by render_batch to the key of the template and settings they were rendered with
+_STAMPS_FILENAME = 'render-batch.json'
+
+
+def _load_stamps(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _STAMPS_FILENAME), 'r') as stamps_file:
+            stamps = json.load(stamps_file)
+    except (OSError, ValueError):
+        return {}
+    return stamps if isinstance(stamps, dict) else {}
+
+
+def _store_stamps(cache_dir, stamps):
+    # Like compiled templates, stamps are only an optimization: failing to store them means
+    # animations are rendered again by the next batch
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temporary_filename = tempfile.mkstemp(dir=cache_dir, prefix='.termtosvg_')
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, 'w') as stamps_file:
+            json.dump(stamps, stamps_file, sort_keys=True)
+        os.replace(temporary_filename, os.path.join(cache_dir, _STAMPS_FILENAME))
+    except OSError:
+        os.remove(temporary_filename)
+    except BaseException:
+        os.remove(temporary_filename)
+        raise
+
+
+def is_up_to_date(item, key=None, stamps=None):
+    """Return True if the animation exists and is more recent than its recording
+
+    :param key: If not None, the animation must also have been rendered with the template and
+    settings of this key (see cache.settings_key) according to 'stamps'
+    :param stamps: Mapping between the absolute names of animations and the key of the template
+    and settings they were rendered with
+    """
+    try:
+        if os.stat(item.svg_filename).st_mtime < os.stat(item.cast_filename).st_mtime:
+            return False
+    except FileNotFoundError:
+        return False
+
+    if key is None:
+        return True
+    return stamps.get(os.path.abspath(item.svg_filename)) == key
+
+
+def _render_item(item, template, min_frame_duration, max_frame_duration, compression_level,
+                 cache_dir):
+    """Render the animation of a single recording and return the time it took in seconds"""
+    start = time.perf_counter()
+    records = termtosvg.asciicast.read_records(item.cast_filename)
+    replayed_records = termtosvg.term.replay(
+        records=records,
+        from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
+        from_pyte_line=termtosvg.anim.CharacterCellLine.converter(),
+        min_frame_duration=min_frame_duration,
+        max_frame_duration=max_frame_duration
+    )
+    try:
+        termtosvg.anim.render_animation(records=replayed_records,
+                                        filename=item.svg_filename,
+                                        template=template,
+                                        compression_level=compression_level,
+                                        cache_dir=cache_dir)
+    except BaseException:
+        # An incomplete animation would be considered up to date by the next batch
+        if os.path.exists(item.svg_filename):
+            os.remove(item.svg_filename)
+        raise
+    return time.perf_counter() - start
+
+
+def render_batch(items, template, min_frame_duration, max_frame_duration, jobs, force=False,
+                 compression_level=termtosvg.anim.DEFAULT_COMPRESSION_LEVEL, cache_dir=None):
+    """Render the animations of several recordings using a pool of processes
+
+    Templates compiled by the processes of the pool are shared through the cache directory. If
+    no cache directory is given, a temporary one is used for the duration of the batch.
+    Failing to render a recording does not interrupt the batch.
+
+    :param items: BatchItems to render
+    :param template: SVG template (bytes)
+    :param min_frame_duration: Minimum frame duration in milliseconds
+    :param max_frame_duration: Maximum frame duration in milliseconds
+    :param jobs: Number of processes rendering recordings
+    :param force: Render animations even if they are more recent than their recordings and were
+    rendered with the same template and settings
+    :param compression_level: Compression level of SVGZ files (see anim.open_animation)
+    :param cache_dir: Directory of the cache of compiled templates (see anim.load_template) and
+    of the keys of the template and settings animations were rendered with
+    :return: List of BatchResult in the order of items
+    """
+    key, stamps = None, None
+    if cache_dir is not None:
+        key = settings_key(template, min_frame_duration=min_frame_duration,
+                           max_frame_duration=max_frame_duration,
+                           compression_level=compression_level)
+        stamps = _load_stamps(cache_dir)
+
+    with tempfile.TemporaryDirectory(prefix='termtosvg_') as temporary_directory:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            for item in items:
+                if not force and is_up_to_date(item, key, stamps):
+                    futures.append(None)
+                    continue
+                futures.append(executor.submit(_render_item, item, template,
+                                               min_frame_duration, max_frame_duration,
+                                               compression_level,
+                                               cache_dir or temporary_directory))
+
+            results = []
+            for item, future in zip(items, futures):
+                if future is None:
+                    results.append(BatchResult(item, None, None))
+                    continue
+                try:
+                    results.append(BatchResult(item, future.result(), None))
+                except Exception as exc:
+                    results.append(BatchResult(item, None, exc))
+
+    if stamps is not None:
+        for item, duration, error in results:
+            svg_filename = os.path.abspath(item.svg_filename)
+            if error is not None:
+                stamps.pop(svg_filename, None)
+            elif duration is not None:
+                stamps[svg_filename] = key
+        _store_stamps(cache_dir, stamps)
+    return results
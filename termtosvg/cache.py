@@ -0,0 +1,159 @@
+"""Cache of rendered animations
+
+Rendering is deterministic: the same recording rendered with the same template and settings
+always produces the same animation. Rendered animations are stored in a directory under a name
+made of a hash of everything the rendering depends on, so that a recording rendered again is
+copied from the cache instead of being replayed and rendered. Entries are evicted based on the
+time they were last used once they get too old or once the cache gets too large.
+
+This module does not import lxml or pyte so that rendering an animation found in the cache
+does not pay for importing them.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+# Version of the rendering, to be increased whenever a change of termtosvg alters the animations
+# rendered from the same inputs so that animations cached by older versions are not used
+RENDER_CACHE_VERSION = 1
+
+_CAST_CHUNK_SIZE = 1024 * 1024
+
+RenderCacheStats = namedtuple('RenderCacheStats', ['hits', 'misses', 'evictions'])
+
+
+def settings_key(template, **settings):
+    """Return a key identifying what the rendering of any recording depends on
+
+    :param template: SVG template (bytes)
+    :param settings: Every other value the rendering depends on (frame durations, cell size...),
+    which must be serializable to JSON
+    """
+    key = hashlib.sha256()
+    key.update(json.dumps({
+        'version': RENDER_CACHE_VERSION,
+        'template': hashlib.sha256(template).hexdigest(),
+        'settings': settings,
+    }, sort_keys=True).encode('utf-8'))
+    return key.hexdigest()
+
+
+def render_key(cast_filename, template, **settings):
+    """Return the key of the animation rendered from a recording
+
+    :param cast_filename: Name of the recording
+    :param template: SVG template (bytes)
+    :param settings: Every other value the rendering depends on (see settings_key)
+    """
+    cast_hash = hashlib.sha256()
+    with open(cast_filename, 'rb') as cast_file:
+        for chunk in iter(lambda: cast_file.read(_CAST_CHUNK_SIZE), b''):
+            cast_hash.update(chunk)
+
+    key = hashlib.sha256()
+    key.update(json.dumps({
+        'cast': cast_hash.hexdigest(),
+        'settings': settings_key(template, **settings),
+    }, sort_keys=True).encode('utf-8'))
+    return key.hexdigest()
+
+
+class RenderCache:
+    """Directory of rendered animations stored under their key (see render_key)"""
+    def __init__(self, directory, max_size=None, max_age=None):
+        """
+        :param directory: Directory of the cache, created on first use
+        :param max_size: Maximum size of the cache in bytes, or None for no limit
+        :param max_age: Maximum time in seconds since an entry was last used, or None for no
+        limit
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self):
+        return RenderCacheStats(self.hits, self.misses, self.evictions)
+
+    def _entry_filename(self, key):
+        return os.path.join(self.directory, '{}.svg'.format(key))
+
+    def fetch(self, key, filename):
+        """Copy the animation stored under 'key' to 'filename'
+
+        Animations are copied rather than hard linked so that overwriting the output file later
+        on does not alter the cache.
+
+        :return: True if the animation was found in the cache, False otherwise
+        """
+        entry_filename = self._entry_filename(key)
+        try:
+            shutil.copyfile(entry_filename, filename)
+            # The modification time of an entry is the last time it was used
+            os.utime(entry_filename)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, filename):
+        """Store a copy of the animation 'filename' under 'key'"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Copy to a temporary file first so that concurrent renders never read a partial entry
+        fd, temporary_filename = tempfile.mkstemp(dir=self.directory, prefix='.termtosvg_')
+        try:
+            with os.fdopen(fd, 'wb') as entry_file, open(filename, 'rb') as animation_file:
+                shutil.copyfileobj(animation_file, entry_file)
+            os.replace(temporary_filename, self._entry_filename(key))
+        except BaseException:
+            os.remove(temporary_filename)
+            raise
+
+    def evict(self, now=None):
+        """Remove entries unused for more than max_age seconds, then the least recently used
+        entries until the size of the cache is at most max_size bytes
+
+        :param now: Current time as returned by time.time()
+        :return: Number of entries removed
+        """
+        if now is None:
+            now = time.time()
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.svg')]
+        except FileNotFoundError:
+            return 0
+
+        entries = []
+        for name in names:
+            entry_filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(entry_filename)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_filename))
+        entries.sort()
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        count = 0
+        for mtime, entry_size, entry_filename in entries:
+            too_old = self.max_age is not None and now - mtime > self.max_age
+            too_large = self.max_size is not None and size > self.max_size
+            if not too_old and not too_large:
+                break
+            try:
+                os.remove(entry_filename)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            count += 1
+
+        self.evictions += count
+        return count
@@ -1,7 +1,18 @@
 import pkgutil
+from collections.abc import Mapping
 
 PKG_TEMPLATE_PATH = 'data/templates'
 
+# Compression level of animations in SVGZ format
+DEFAULT_COMPRESSION_LEVEL = 9
+
+# Size of a character cell of the terminal in pixels
+DEFAULT_CELL_WIDTH = 8
+DEFAULT_CELL_HEIGHT = 17
+
+# Extensions of the files considered as recordings when rendering a whole directory
+CAST_EXTENSIONS = ('.cast', '.cast.gz', '.cast.xz')
+
 # Listing templates here is not ideal but importing pkg_resources to get resource_listdir
 # does not seem worth it: it adds a dependency and slows down the invocation of termtosvg
 # by 150ms ('time termtosvg --help' execution time goes from 200ms to 350ms)
@@ -25,16 +36,41 @@ def validate_geometry(screen_geometry):
     return columns, rows
 
 
-def default_templates():
-    """Return mapping between the name of a template and the SVG template itself"""
-    templates = {}
-    for template_name in DEFAULT_TEMPLATES_NAMES:
-        pkg_template_path = '{}/{}'.format(PKG_TEMPLATE_PATH, template_name)
-        bstream = pkgutil.get_data(__name__, pkg_template_path)
+class _TemplateRegistry(Mapping):
+    """Read-only mapping between template names and templates loaded on first access
+
+    Templates are only read from the package data when they are used so that invocations of
+    termtosvg which render nothing, or a single template, do not pay for reading all of them.
+    """
+    def __init__(self, template_names):
         suffix = '.svg'
-        if template_name.endswith(suffix):
-            templates[template_name[:-len(suffix)]] = bstream
-        else:
-            templates[template_name] = bstream
+        self._filenames = {}
+        for template_name in template_names:
+            if template_name.endswith(suffix):
+                self._filenames[template_name[:-len(suffix)]] = template_name
+            else:
+                self._filenames[template_name] = template_name
+        self._templates = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._templates[name]
+        except KeyError:
+            pass
+        pkg_template_path = '{}/{}'.format(PKG_TEMPLATE_PATH, self._filenames[name])
+        template = self._templates[name] = pkgutil.get_data(__name__, pkg_template_path)
+        return template
+
+    def __iter__(self):
+        return iter(self._filenames)
+
+    def __len__(self):
+        return len(self._filenames)
+
+
+def default_templates():
+    """Return mapping between the name of a template and the SVG template itself
 
-    return templates
+    Templates are loaded lazily, the first time they are looked up in the mapping.
+    """
+    return _TemplateRegistry(DEFAULT_TEMPLATES_NAMES)
@@ -0,0 +1,115 @@
+"""Index of asciicast v2 recordings
+
+An index is a sidecar file of a recording which maps timestamps of the recording to the position
+of the records in the recording and to snapshots of the terminal screen. This makes it possible
+to replay part of a recording without emulating the terminal from the beginning of the
+recording.
+
+The index is a text file made of one JSON object per line. The first line describes the file
+indexed:
+    {"version": 1, "cast_size": 1234, "cast_mtime": 1545000000.0}
+Each following line is a snapshot of the screen taken right before the record located 'offset'
+bytes from the beginning of the recording, which happened 'time' seconds after the beginning of
+the recording:
+    {"time": 30.2, "offset": 5678, "screen": {...}}
+Snapshots are sorted by time.
+"""
+import json
+import os
+
+import termtosvg.asciicast
+import termtosvg.term
+
+INDEX_VERSION = 1
+
+# Default time between two snapshots in seconds
+DEFAULT_INTERVAL = 30
+
+
+class CastIndexError(Exception):
+    pass
+
+
+def index_filename(cast_filename):
+    """Return the name of the index of a recording"""
+    return '{}.idx'.format(cast_filename)
+
+
+def build_index(cast_filename, index_filename, interval=DEFAULT_INTERVAL):
+    """Write the index of an asciicast v2 recording to index_filename
+
+    :param cast_filename: Name of the recording
+    :param index_filename: Name of the index
+    :param interval: Minimum time between two snapshots of the screen in seconds
+    :return: Number of snapshots in the index
+    """
+    stat = os.stat(cast_filename)
+    if not stat.st_size:
+        raise CastIndexError('Empty recording: {}'.format(cast_filename))
+    # Uncompressed recordings are mapped in memory: records located in the mapping are decoded
+    # without reading the file line by line
+    records = termtosvg.asciicast.read_records_with_offsets(cast_filename, use_mmap=True)
+    try:
+        _, header = next(records)
+    except StopIteration:
+        raise CastIndexError('Empty recording: {}'.format(cast_filename))
+    if not isinstance(header, termtosvg.asciicast.AsciiCastV2Header):
+        raise CastIndexError('The first record of the recording must be a header')
+
+    index_header = {
+        'version': INDEX_VERSION,
+        'cast_size': stat.st_size,
+        'cast_mtime': stat.st_mtime,
+    }
+    count = 0
+    with open(index_filename, 'w') as index_file:
+        print(json.dumps(index_header), file=index_file)
+        for offset, time, screen in termtosvg.term.snapshots(header, records, interval):
+            entry = {
+                'time': time,
+                'offset': offset,
+                'screen': screen,
+            }
+            print(json.dumps(entry, ensure_ascii=False), file=index_file)
+            count += 1
+
+    return count
+
+
+def find_snapshot(cast_filename, index_filename, time):
+    """Return the last snapshot of the index taken at or before 'time'
+
+    Raise CastIndexError if the index is invalid or if the recording was modified after the
+    index was built.
+
+    :param cast_filename: Name of the recording
+    :param index_filename: Name of the index
+    :param time: Time in seconds since the beginning of the recording
+    :return: Tuple made of the offset of the record following the snapshot and the snapshot
+    itself (see termtosvg.term.save_screen), or None if no snapshot precedes 'time'
+    """
+    snapshot = None
+    with open(index_filename, 'r') as index_file:
+        try:
+            index_header = json.loads(index_file.readline())
+        except ValueError as exc:
+            raise CastIndexError('Invalid index: {}'.format(index_filename)) from exc
+
+        stat = os.stat(cast_filename)
+        if index_header.get('version') != INDEX_VERSION:
+            raise CastIndexError('Unsupported index version: {}'.format(index_filename))
+        if (index_header.get('cast_size'), index_header.get('cast_mtime')) != \
+                (stat.st_size, stat.st_mtime):
+            raise CastIndexError('Index is out of date: {}'.format(index_filename))
+
+        for line in index_file:
+            try:
+                entry = json.loads(line)
+                entry_time = entry['time']
+                if entry_time > time:
+                    break
+                snapshot = entry['offset'], entry['screen']
+            except (ValueError, KeyError, TypeError) as exc:
+                raise CastIndexError('Invalid index: {}'.format(index_filename)) from exc
+
+    return snapshot
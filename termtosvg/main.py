@@ -6,22 +6,34 @@ import os
 import shlex
 import sys
 import tempfile
+import time
 
+import termtosvg.cache
 import termtosvg.config
-import termtosvg.anim
 
 logger = logging.getLogger('termtosvg')
 
 USAGE = """termtosvg [output_file] [-c COMMAND] [-g GEOMETRY] [-m MIN_DURATION]
-                 [-M MAX_DURATION] [-t TEMPLATE] [-h]
+                 [-M MAX_DURATION] [-t TEMPLATE] [-z LEVEL] [-h]
 
 Record a terminal session and render an SVG animation on the fly
 """
-EPILOG = "See also 'termtosvg record --help' and 'termtosvg render --help'"
+EPILOG = ("See also 'termtosvg record --help', 'termtosvg render --help' and "
+          "'termtosvg index --help'")
 RECORD_USAGE = """termtosvg record [output_file] [-c COMMAND] [-g GEOMETRY]
                  [-m MIN_DURATION] [-M MAX_DURATION] [-h]"""
-RENDER_USAGE = """termtosvg render input_file [output_file] [-m MIN_DURATION]
-                 [-M MAX_DURATION] [-t TEMPLATE] [-h]"""
+RENDER_USAGE = """termtosvg render input_file [output_file ...] [-j JOBS] [-m MIN_DURATION]
+                 [-M MAX_DURATION] [-t TEMPLATE ...] [-z LEVEL] [--from START] [--to END]
+                 [--cache-dir DIRECTORY] [--render-cache DIRECTORY]
+                 [--render-cache-size SIZE] [--render-cache-age DAYS] [-h]"""
+INDEX_USAGE = """termtosvg index input_file [-h]"""
+RENDER_BATCH_USAGE = """termtosvg render-batch input [output_directory] [-j JOBS] [-f]
+                 [-m MIN_DURATION] [-M MAX_DURATION] [-t TEMPLATE] [-z LEVEL]
+                 [--cache-dir DIRECTORY] [-h]"""
+
+# Default eviction settings of the render cache, in megabytes and days
+DEFAULT_RENDER_CACHE_SIZE = 100
+DEFAULT_RENDER_CACHE_AGE = 30
 
 
 def integral_duration(duration):
@@ -33,6 +45,36 @@ def integral_duration(duration):
     raise ValueError('duration must be an integer greater than 0')
 
 
+def positive_integer(value):
+    if value.isdigit() and int(value) >= 1:
+        return int(value)
+    raise ValueError('value must be an integer greater than 0')
+
+
+def compression_level(value):
+    if value.isdigit() and 0 <= int(value) <= 9:
+        return int(value)
+    raise ValueError('compression level must be an integer between 0 and 9')
+
+
+def time_offset(value):
+    """Return the number of seconds represented by 'value', which must be a non-negative number"""
+    seconds = float(value)
+    if not 0 <= seconds < float('inf'):
+        raise ValueError('time must be a non-negative number of seconds')
+    return seconds
+
+
+def validate_template(name, templates):
+    # termtosvg.anim is only imported when needed since importing lxml and pyte slows down the
+    # invocations of termtosvg which render nothing, or which copy the animation from the render
+    # cache
+    if name in templates:
+        return templates[name]
+    import termtosvg.anim
+    return termtosvg.anim.validate_template(name, templates)
+
+
 def parse(args, templates, default_template, default_geometry, default_min_dur, default_max_dur,
           default_cmd):
     """Parse command line arguments
@@ -45,8 +87,8 @@ def parse(args, templates, default_template, default_geometry, default_min_dur,
     :param default_max_dur: Default maximal duration between frames in milliseconds
     :param default_max_dur: Default maximal duration between frames in milliseconds
     :param default_cmd: Default program (with argument list) recorded
-    :return: Tuple made of the subcommand called (None, 'render' or 'record') and all parsed
-    arguments
+    :return: Tuple made of the subcommand called (None, 'render', 'record', 'index' or
+    'render-batch') and all parsed arguments
     """
     command_parser = argparse.ArgumentParser(add_help=False)
     command_parser.add_argument(
@@ -63,7 +105,7 @@ def parse(args, templates, default_template, default_geometry, default_min_dur,
         help=('set the SVG template used for rendering the SVG animation. '
               'TEMPLATE may either be one of the default templates ({}) '
               'or a path to a valid template.').format(', '.join(templates)),
-        type=lambda name: termtosvg.anim.validate_template(name, templates),
+        type=lambda name: validate_template(name, templates),
         default=default_template,
         metavar='TEMPLATE'
     )
@@ -74,10 +116,20 @@ def parse(args, templates, default_template, default_geometry, default_min_dur,
         help=('set the SVG template used for rendering the SVG animation. '
               'TEMPLATE may either be one of the default templates ({}) '
               'or a path to a valid template.').format(', '.join(templates)),
-        type=lambda name: termtosvg.anim.validate_template(name, templates),
+        type=lambda name: validate_template(name, templates),
         default=default_template,
         metavar='TEMPLATE'
     )
+    compression_parser = argparse.ArgumentParser(add_help=False)
+    compression_parser.add_argument(
+        '-z', '--compression-level',
+        type=compression_level,
+        metavar='LEVEL',
+        default=termtosvg.config.DEFAULT_COMPRESSION_LEVEL,
+        help='compression level from 0 (fastest) to 9 (smallest) of animations written to a '
+        'file with the ".svgz" extension, which are compressed with gzip (default: {})'
+        .format(termtosvg.config.DEFAULT_COMPRESSION_LEVEL)
+    )
     geometry_parser = argparse.ArgumentParser(add_help=False)
     geometry_parser.add_argument(
         '-g', '--screen-geometry',
@@ -114,15 +166,15 @@ def parse(args, templates, default_template, default_geometry, default_min_dur,
     parser = argparse.ArgumentParser(
         prog='termtosvg',
         parents=[command_parser, geometry_parser, min_duration_parser, max_duration_parser,
-                 template_parser],
+                 template_parser, compression_parser],
         usage=USAGE,
         epilog=EPILOG
     )
     parser.add_argument(
         'output_file',
         nargs='?',
-        help='optional filename of the SVG animation; if missing, a random filename will be '
-        'automatically generated',
+        help='optional filename of the SVG animation, compressed with gzip if it ends with '
+        '".svgz"; if missing, a random filename will be automatically generated',
         metavar='output_file'
     )
     if args:
@@ -135,87 +187,422 @@ def parse(args, templates, default_template, default_geometry, default_min_dur,
             parser.add_argument(
                 'output_file',
                 nargs='?',
-                help='optional filename for the recording; if missing, a random filename will '
-                'be automatically generated',
+                help='optional filename for the recording, compressed with gzip or xz if it '
+                'ends with ".gz" or ".xz"; if missing, a random filename will be automatically '
+                'generated',
                 metavar='output_file'
             )
             return 'record', parser.parse_args(args[1:])
         elif args[0] == 'render':
             parser = argparse.ArgumentParser(
                 description='render an asciicast recording as an SVG animation',
-                parents=[template_parser, min_duration_parser, max_duration_parser],
+                parents=[min_duration_parser, max_duration_parser, compression_parser],
                 usage=RENDER_USAGE
             )
+            parser.add_argument(
+                '-t', '--template',
+                help=('set the SVG template used for rendering the SVG animation. '
+                      'TEMPLATE may either be one of the default templates ({}) '
+                      'or a path to a valid template. This option may be repeated to render '
+                      'an animation for each template, in which case there must be as many '
+                      'output files as templates.').format(', '.join(templates)),
+                type=lambda name: validate_template(name, templates),
+                action='append',
+                dest='templates',
+                metavar='TEMPLATE'
+            )
             parser.add_argument(
                 'input_file',
-                help='recording of a terminal session in asciicast v1 or v2 format'
+                help='recording of a terminal session in asciicast v1 or v2 format, '
+                'optionally compressed with gzip or xz'
             )
             parser.add_argument(
-                'output_file',
-                nargs='?',
-                help='optional filename for the SVG animation; if missing, a random filename will '
-                'be automatically generated',
+                '-j', '--jobs',
+                type=positive_integer,
+                metavar='JOBS',
+                default=1,
+                help='number of processes rendering parts of the recording in parallel '
+                     '(default: 1)'
+            )
+            parser.add_argument(
+                'output_files',
+                nargs='*',
+                help='optional filenames for the SVG animations, one for each template, '
+                'compressed with gzip if they end with ".svgz"; if missing, random filenames '
+                'will be automatically generated',
                 metavar='output_file'
             )
-            return 'render', parser.parse_args(args[1:])
+            parser.add_argument(
+                '--from',
+                dest='start',
+                type=time_offset,
+                metavar='START',
+                help='only render the recording from START seconds after its beginning '
+                     '(seeking is faster if the recording was indexed, see '
+                     '\'termtosvg index --help\')'
+            )
+            parser.add_argument(
+                '--to',
+                dest='end',
+                type=time_offset,
+                metavar='END',
+                help='only render the recording until END seconds after its beginning'
+            )
+            parser.add_argument(
+                '--cache-dir',
+                metavar='DIRECTORY',
+                help='directory where templates resized to the geometry of the recording are '
+                     'stored so that later renders with the same template and geometry skip '
+                     'the processing of the template'
+            )
+            parser.add_argument(
+                '--render-cache',
+                metavar='DIRECTORY',
+                help='directory where rendered animations are stored so that rendering a '
+                     'recording again with the same template and options copies the animation '
+                     'from this directory'
+            )
+            parser.add_argument(
+                '--render-cache-size',
+                type=positive_integer,
+                metavar='SIZE',
+                default=DEFAULT_RENDER_CACHE_SIZE,
+                help='maximum size of the render cache in megabytes, least recently used '
+                     'animations are removed first (default: {})'
+                     .format(DEFAULT_RENDER_CACHE_SIZE)
+            )
+            parser.add_argument(
+                '--render-cache-age',
+                type=positive_integer,
+                metavar='DAYS',
+                default=DEFAULT_RENDER_CACHE_AGE,
+                help='number of days after which animations unused are removed from the render '
+                     'cache (default: {})'.format(DEFAULT_RENDER_CACHE_AGE)
+            )
+            render_args = parser.parse_args(args[1:])
+            if render_args.templates is None:
+                render_args.templates = [validate_template(default_template, templates)]
+            if render_args.output_files and \
+                    len(render_args.output_files) != len(render_args.templates):
+                parser.error('the number of output files must match the number of templates')
+            if len(set(render_args.output_files)) != len(render_args.output_files):
+                parser.error('output files must be distinct')
+            if render_args.start is not None and render_args.end is not None and \
+                    render_args.end <= render_args.start:
+                parser.error('END must be greater than START')
+            if render_args.jobs > 1 and (render_args.start is not None or
+                                         render_args.end is not None):
+                parser.error('--jobs cannot be combined with --from or --to')
+            return 'render', render_args
+        elif args[0] == 'index':
+            parser = argparse.ArgumentParser(
+                description='index an asciicast v2 recording to speed up the rendering of parts '
+                'of the recording',
+                usage=INDEX_USAGE
+            )
+            parser.add_argument(
+                'input_file',
+                help='recording of a terminal session in asciicast v2 format; the index is '
+                'written next to the recording with the ".idx" extension'
+            )
+            return 'index', parser.parse_args(args[1:])
+        elif args[0] == 'render-batch':
+            parser = argparse.ArgumentParser(
+                description='render many asciicast recordings as SVG animations using a pool '
+                'of processes',
+                parents=[template_parser, min_duration_parser, max_duration_parser,
+                         compression_parser],
+                usage=RENDER_BATCH_USAGE
+            )
+            parser.add_argument(
+                'input',
+                help='directory of the recordings (files with extension {}) or manifest '
+                'listing one recording per line, optionally followed by a tab and the name of '
+                'the animation'.format(', '.join('"{}"'.format(extension) for extension in
+                                                 termtosvg.config.CAST_EXTENSIONS))
+            )
+            parser.add_argument(
+                'output_directory',
+                nargs='?',
+                help='directory of the SVG animations (default: directory of each recording)'
+            )
+            parser.add_argument(
+                '-j', '--jobs',
+                type=positive_integer,
+                metavar='JOBS',
+                default=os.cpu_count() or 1,
+                help='number of processes rendering recordings in parallel (default: number of '
+                     'processors)'
+            )
+            parser.add_argument(
+                '-f', '--force',
+                action='store_true',
+                help='render all recordings, including the ones whose animation is more recent '
+                     'than the recording; without --cache-dir, this is needed to render '
+                     'animations again after changing the template or the settings'
+            )
+            parser.add_argument(
+                '--cache-dir',
+                metavar='DIRECTORY',
+                help='directory where templates resized to the geometry of the recordings are '
+                     'stored (see \'termtosvg render --help\') along with the template and '
+                     'settings each animation was rendered with'
+            )
+            return 'render-batch', parser.parse_args(args[1:])
 
     return None, parser.parse_args(args)
 
 
 def record_subcommand(process_args, geometry, input_fileno, output_fileno, cast_filename):
     """Save a terminal session as an asciicast recording"""
-    import termtosvg.term
+    import termtosvg.asciicast
+    import termtosvg.recorder
     logger.info('Recording started, enter "exit" command or Control-D to end')
     if geometry is None:
-        columns, lines = termtosvg.term.get_terminal_size(output_fileno)
+        columns, lines = termtosvg.recorder.get_terminal_size(output_fileno)
     else:
         columns, lines = geometry
-    with termtosvg.term.TerminalMode(input_fileno):
-        records = termtosvg.term.record(process_args, columns, lines, input_fileno, output_fileno)
-        with open(cast_filename, 'w') as cast_file:
+    with termtosvg.recorder.TerminalMode(input_fileno):
+        records = termtosvg.recorder.record(process_args, columns, lines, input_fileno,
+                                            output_fileno)
+        with termtosvg.asciicast.open_cast(cast_filename, 'w') as cast_file, \
+                termtosvg.asciicast.AsciiCastWriter(cast_file) as writer:
             for record in records:
-                print(record.to_json_line(), file=cast_file)
+                writer.write(record)
     logger.info('Recording ended, cast file is {}'.format(cast_filename))
 
 
-def render_subcommand(template, cast_filename, svg_filename, min_frame_duration,
-                      max_frame_duration):
-    """Render the animation from an asciicast recording"""
+def render_subcommand(templates, cast_filename, svg_filenames, min_frame_duration,
+                      max_frame_duration, jobs=1, start=None, end=None,
+                      compression_level=termtosvg.config.DEFAULT_COMPRESSION_LEVEL,
+                      cache_dir=None, render_cache=None):
+    """Render the animations of an asciicast recording, one for each template
+
+    The recording is replayed once for all templates, apart from parallel renderings (jobs > 1)
+    which replay it once per template.
+
+    If 'start' or 'end' is set, only this part of the recording is rendered. Rendering then
+    starts from the closest snapshot of the screen found in the index of the recording, if any.
+
+    If 'render_cache' (a termtosvg.cache.RenderCache) holds an animation rendered from the same
+    recording with the same template and options, the animation is copied from the cache instead.
+
+    :param templates: SVG templates (bytes)
+    :param svg_filenames: Names of the animations, in the order of the templates
+    """
+    logger.info('Rendering started')
+    outputs = list(zip(svg_filenames, templates))
+    keys = {}
+    if render_cache is not None:
+        for svg_filename, template in outputs:
+            keys[svg_filename] = termtosvg.cache.render_key(
+                cast_filename,
+                template,
+                min_frame_duration=min_frame_duration,
+                max_frame_duration=max_frame_duration,
+                jobs=jobs,
+                start=start,
+                end=end,
+                cell_width=termtosvg.config.DEFAULT_CELL_WIDTH,
+                cell_height=termtosvg.config.DEFAULT_CELL_HEIGHT,
+                compression_level=compression_level if svg_filename.endswith('.svgz') else None
+            )
+        cached_filenames = [svg_filename for svg_filename, _ in outputs
+                            if render_cache.fetch(keys[svg_filename], svg_filename)]
+        for svg_filename in cached_filenames:
+            logger.info('SVG animation {} copied from the render cache'.format(svg_filename))
+        outputs = [output for output in outputs if output[0] not in cached_filenames]
+        if not outputs:
+            logger.info('Rendering ended')
+            return
+
+    _render_outputs(outputs, cast_filename, min_frame_duration, max_frame_duration, jobs, start,
+                    end, compression_level, cache_dir)
+    for svg_filename, _ in outputs:
+        if render_cache is not None:
+            render_cache.store(keys[svg_filename], svg_filename)
+        logger.info('SVG animation is {}'.format(svg_filename))
+    logger.info('Rendering ended')
+
+
+def _render_outputs(outputs, cast_filename, min_frame_duration, max_frame_duration, jobs, start,
+                    end, compression_level, cache_dir):
+    """Render the animations of a recording (see render_subcommand)
+
+    :param outputs: List of (svg_filename, template) tuples
+    """
+    # Only import lxml and pyte once it is certain the recording has to be rendered
+    import termtosvg.anim
     import termtosvg.asciicast
     import termtosvg.term
 
-    logger.info('Rendering started')
     asciicast_records = termtosvg.asciicast.read_records(cast_filename)
-    replayed_records = termtosvg.term.replay(records=asciicast_records,
-                                             from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
-                                             min_frame_duration=min_frame_duration,
-                                             max_frame_duration=max_frame_duration)
-    termtosvg.anim.render_animation(records=replayed_records,
-                                    filename=svg_filename,
-                                    template=template)
-    logger.info('Rendering ended, SVG animation is {}'.format(svg_filename))
+    if jobs > 1:
+        # Use more segments than processes so that the work is evenly spread between processes
+        config, segments = termtosvg.term.split_replay(records=asciicast_records,
+                                                       min_frame_duration=min_frame_duration,
+                                                       max_frame_duration=max_frame_duration,
+                                                       segment_count=4 * jobs)
+        for svg_filename, template in outputs:
+            termtosvg.anim.render_animation_parallel(config=config,
+                                                     segments=segments,
+                                                     filename=svg_filename,
+                                                     template=template,
+                                                     jobs=jobs,
+                                                     compression_level=compression_level,
+                                                     cache_dir=cache_dir)
+    else:
+        if start is None and end is None:
+            replayed_records = termtosvg.term.replay(
+                records=asciicast_records,
+                from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
+                from_pyte_line=termtosvg.anim.CharacterCellLine.converter(),
+                min_frame_duration=min_frame_duration,
+                max_frame_duration=max_frame_duration
+            )
+        else:
+            start = start or 0
+            records, snapshot = asciicast_records, None
+            indexed_snapshot = _find_snapshot(cast_filename, start)
+            if indexed_snapshot is not None:
+                offset, snapshot = indexed_snapshot
+                records = termtosvg.asciicast.read_records_from(cast_filename, offset)
+            replayed_records = termtosvg.term.replay_range(
+                records=records,
+                snapshot=snapshot,
+                start=start,
+                end=end,
+                from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
+                from_pyte_line=termtosvg.anim.CharacterCellLine.converter(),
+                min_frame_duration=min_frame_duration,
+                max_frame_duration=max_frame_duration
+            )
+        termtosvg.anim.render_animations(records=replayed_records,
+                                         outputs=outputs,
+                                         compression_level=compression_level,
+                                         cache_dir=cache_dir)
+
+
+def _find_snapshot(cast_filename, time):
+    """Return the last snapshot taken before 'time' from the index of the recording, or None if
+    there is no such snapshot or no usable index"""
+    import termtosvg.index
+
+    index_filename = termtosvg.index.index_filename(cast_filename)
+    if not os.path.exists(index_filename):
+        return None
+
+    try:
+        return termtosvg.index.find_snapshot(cast_filename, index_filename, time)
+    except termtosvg.index.CastIndexError as exc:
+        logger.warning('Ignoring index: {}'.format(exc))
+        return None
+
+
+def index_subcommand(cast_filename):
+    """Build the index of an asciicast recording"""
+    import termtosvg.index
+
+    index_filename = termtosvg.index.index_filename(cast_filename)
+    logger.info('Indexing started')
+    count = termtosvg.index.build_index(cast_filename, index_filename)
+    logger.info('Indexing ended, index of {} snapshots is {}'.format(count, index_filename))
+
+
+def render_batch_subcommand(template, path, output_directory, min_frame_duration,
+                            max_frame_duration, jobs, force=False,
+                            compression_level=termtosvg.config.DEFAULT_COMPRESSION_LEVEL,
+                            cache_dir=None):
+    """Render the animations of all the recordings of a directory or a manifest and log the
+    time spent on each recording
+
+    :return: Number of recordings which could not be rendered
+    """
+    import termtosvg.batch
+
+    items = termtosvg.batch.batch_items(path, output_directory)
+    logger.info('Rendering {} recordings using {} processes'.format(len(items), jobs))
+    start = time.perf_counter()
+    results = termtosvg.batch.render_batch(items, template, min_frame_duration,
+                                           max_frame_duration, jobs, force, compression_level,
+                                           cache_dir)
+    total_duration = time.perf_counter() - start
+
+    rendered, up_to_date, failed = 0, 0, 0
+    for item, duration, error in results:
+        if error is not None:
+            failed += 1
+            logger.info('  failed      {}: {}'.format(item.cast_filename, error))
+        elif duration is None:
+            up_to_date += 1
+            logger.info('  up to date  {}'.format(item.svg_filename))
+        else:
+            rendered += 1
+            logger.info('  {:8.2f}s   {}'.format(duration, item.svg_filename))
+    logger.info('Rendering ended in {:.2f}s: {} rendered, {} up to date, {} failed'
+                .format(total_duration, rendered, up_to_date, failed))
+    return failed
 
 
 def record_render_subcommand(process_args, template, geometry, input_fileno, output_fileno,
-                             svg_filename, min_frame_duration, max_frame_duration):
-    """Record and render the animation on the fly"""
+                             svg_filename, min_frame_duration, max_frame_duration,
+                             compression_level=termtosvg.config.DEFAULT_COMPRESSION_LEVEL):
+    """Record and render the animation on the fly
+
+    Rendering happens in a background thread fed through a queue so that the terminal session
+    is relayed without waiting for the rendering of the animation to catch up. The thread only
+    prevents the relay from blocking on the rendering: feeding pyte and generating the markup
+    hold the GIL, so the relay of the session may still be delayed while they run.
+    """
+    import threading
+    import termtosvg.anim
+    import termtosvg.recorder
     import termtosvg.term
 
     logger.info('Recording started, enter "exit" command or Control-D to end')
     if geometry is None:
-        columns, lines = termtosvg.term.get_terminal_size(output_fileno)
+        columns, lines = termtosvg.recorder.get_terminal_size(output_fileno)
     else:
         columns, lines = geometry
-    with termtosvg.term.TerminalMode(input_fileno):
-        asciicast_records = termtosvg.term.record(process_args, columns, lines, input_fileno,
-                                                  output_fileno)
-        replayed_records = termtosvg.term.replay(records=asciicast_records,
-                                                 from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
-                                                 min_frame_duration=min_frame_duration,
-                                                 max_frame_duration=max_frame_duration)
-        termtosvg.anim.render_animation(records=replayed_records,
-                                        filename=svg_filename,
-                                        template=template)
+
+    queue = termtosvg.term.SpillQueue()
+    render_errors = []
+
+    def render():
+        try:
+            replayed_records = termtosvg.term.replay(
+                records=queue,
+                from_pyte_char=termtosvg.anim.CharacterCell.from_pyte,
+                from_pyte_line=termtosvg.anim.CharacterCellLine.converter(),
+                min_frame_duration=min_frame_duration,
+                max_frame_duration=max_frame_duration
+            )
+            termtosvg.anim.render_animation(records=replayed_records,
+                                            filename=svg_filename,
+                                            template=template,
+                                            compression_level=compression_level)
+        except BaseException as exc:
+            # Keep the session going, records added from now on are discarded by the queue
+            queue.close()
+            render_errors.append(exc)
+
+    render_thread = threading.Thread(target=render, name='termtosvg-render')
+    render_thread.start()
+    try:
+        with termtosvg.recorder.TerminalMode(input_fileno):
+            asciicast_records = termtosvg.recorder.record(process_args, columns, lines,
+                                                          input_fileno, output_fileno)
+            for record in asciicast_records:
+                queue.put(record)
+    finally:
+        queue.close()
+        render_thread.join()
+
+    if render_errors:
+        raise render_errors[0]
+    if queue.spilled_count:
+        logger.info('{} records were buffered on disk during rendering'
+                    .format(queue.spilled_count))
     logger.info('Recording ended, SVG animation is {}'.format(svg_filename))
 
 
@@ -239,6 +626,8 @@ def main(args=None, input_fileno=None, output_fileno=None):
     default_cmd = os.environ.get('SHELL', 'sh')
     command, args = parse(args[1:], templates, default_template, None, 1, None, default_cmd)
 
+    exit_status = 0
+
     if command == 'record':
         cast_filename = args.output_file
         if cast_filename is None:
@@ -247,12 +636,32 @@ def main(args=None, input_fileno=None, output_fileno=None):
         record_subcommand(process_args, args.screen_geometry, input_fileno, output_fileno,
                           cast_filename)
     elif command == 'render':
-        svg_filename = args.output_file
-        if svg_filename is None:
-            _, svg_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.svg')
-
-        render_subcommand(args.template, args.input_file, svg_filename, args.min_frame_duration,
-                          args.max_frame_duration)
+        svg_filenames = args.output_files
+        if not svg_filenames:
+            svg_filenames = [tempfile.mkstemp(prefix='termtosvg_', suffix='.svg')[1]
+                             for _ in args.templates]
+
+        render_cache = None
+        if args.render_cache is not None:
+            render_cache = termtosvg.cache.RenderCache(args.render_cache,
+                                                       args.render_cache_size * 1024 * 1024,
+                                                       args.render_cache_age * 24 * 3600)
+        render_subcommand(args.templates, args.input_file, svg_filenames, args.min_frame_duration,
+                          args.max_frame_duration, args.jobs, args.start, args.end,
+                          args.compression_level, args.cache_dir, render_cache)
+        if render_cache is not None:
+            render_cache.evict()
+            logger.info('Render cache: {} hits, {} misses, {} evictions'
+                        .format(*render_cache.stats))
+    elif command == 'index':
+        index_subcommand(args.input_file)
+    elif command == 'render-batch':
+        failed = render_batch_subcommand(args.template, args.input, args.output_directory,
+                                         args.min_frame_duration, args.max_frame_duration,
+                                         args.jobs, args.force, args.compression_level,
+                                         args.cache_dir)
+        if failed:
+            exit_status = 1
     else:
         svg_filename = args.output_file
         if svg_filename is None:
@@ -261,7 +670,10 @@ def main(args=None, input_fileno=None, output_fileno=None):
         process_args = shlex.split(args.command)
         record_render_subcommand(process_args, args.template, args.screen_geometry, input_fileno,
                                  output_fileno, svg_filename, args.min_frame_duration,
-                                 args.max_frame_duration)
+                                 args.max_frame_duration, args.compression_level)
 
     for handler in logger.handlers:
         handler.close()
+
+    if exit_status:
+        sys.exit(exit_status)
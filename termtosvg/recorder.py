@@ -0,0 +1,197 @@
+"""Recording of terminal sessions
+
+This module only depends on the standard library and on termtosvg.asciicast so that
+recording a terminal session does not require importing the terminal emulator (pyte) or the
+SVG renderer (lxml), which both take a significant part of the startup time of termtosvg.
+"""
+import fcntl
+import os
+import pty
+import selectors
+import struct
+import termios
+import time
+import tty
+
+from termtosvg.asciicast import AsciiCastV2Event, AsciiCastV2Header
+
+
+class TerminalMode:
+    """Save terminal mode and size on entry, restore them on exit"""
+    def __init__(self, fileno: int):
+        self.fileno = fileno
+        self.mode = None
+        self.ttysize = None
+
+    def __enter__(self):
+        try:
+            self.mode = tty.tcgetattr(self.fileno)
+        except tty.error:
+            pass
+
+        try:
+            columns, lines = os.get_terminal_size(self.fileno)
+        except OSError:
+            pass
+        else:
+            self.ttysize = struct.pack("HHHH", lines, columns, 0, 0)
+
+        return self.mode, self.ttysize
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.ttysize is not None:
+            fcntl.ioctl(self.fileno, termios.TIOCSWINSZ, self.ttysize)
+
+        if self.mode is not None:
+            tty.tcsetattr(self.fileno, tty.TCSAFLUSH, self.mode)
+
+
+def record(process_args, columns, lines, input_fileno, output_fileno):
+    """Record a process in asciicast v2 format
+
+    The records returned are of two types:
+        - a single header with configuration information
+        - multiple event records with data captured from the terminal and timing information
+    """
+    yield AsciiCastV2Header(version=2, width=columns, height=lines, theme=None)
+
+    start = None
+    for data, timestamp in _record(process_args, columns, lines, input_fileno, output_fileno):
+        if start is None:
+            start = timestamp
+
+        yield AsciiCastV2Event(time=timestamp - start,
+                               event_type='o',
+                               event_data=data,
+                               duration=None)
+
+
+def _record(process_args, columns, lines, input_fileno, output_fileno):
+    """Record raw input and output of a process
+
+    This function forks the current process. The child process runs the command specified by
+    'process_args' which is a session leader and has a controlling terminal and is run in the
+    background. The parent process, which runs in the foreground, transmits data between the
+    standard input, output and the child process and logs it. From the user point of view, it
+    appears they are communicating with the process they intend to record (through their terminal
+    emulator) when in fact they communicate with our parent process which logs all data exchanges
+    with the user
+
+    The implementation of this method is mostly copied from the pty.spawn function of the
+    CPython standard library. It has been modified in order to make the record function a
+    generator.
+    See https://github.com/python/cpython/blob/master/Lib/pty.py
+
+    :param process_args: List of arguments to run the process to be recorded
+    :param columns: Initial number of columns of the terminal
+    :param lines: Initial number of lines of the terminal
+    :param input_fileno: File descriptor of the input data stream
+    :param output_fileno: File descriptor of the output data stream
+    """
+    pid, master_fd = pty.fork()
+    if pid == 0:
+        # Child process - this call never returns
+        os.execlp(process_args[0], *process_args)
+
+    # Parent process
+    # Set the terminal size for master_fd
+    ttysize = struct.pack("HHHH", lines, columns, 0, 0)
+    fcntl.ioctl(master_fd, termios.TIOCSWINSZ, ttysize)
+
+    try:
+        tty.setraw(input_fileno)
+    except tty.error:
+        pass
+
+    for data, timestamp in _capture_data(input_fileno, output_fileno, master_fd):
+        yield data, timestamp
+
+    os.close(master_fd)
+
+    _, child_exit_status = os.waitpid(pid, 0)
+    return child_exit_status
+
+
+def _capture_data(input_fileno, output_fileno, master_fd, buffer_size=1024,
+                  max_buffer_size=65536):
+    """Send data from input_fileno to master_fd and send data from master_fd to output_fileno and
+    also return it to the caller
+
+    The size of the reads starts at buffer_size bytes and doubles, up to max_buffer_size bytes,
+    each time a read fills the whole buffer so that programs with a lot of output are relayed
+    with as few system calls as possible. Data is returned with a timestamp taken from a
+    monotonic clock.
+
+    The implementation of this method is mostly copied from the pty.spawn function of the
+    CPython standard library. It has been modified in order to make the record function a
+    generator.
+    See https://github.com/python/cpython/blob/master/Lib/pty.py
+    """
+    read_sizes = {
+        input_fileno: buffer_size,
+        master_fd: buffer_size,
+    }
+
+    with _make_selector(read_sizes) as selector:
+        closed = False
+        while not closed:
+            for key, _ in selector.select():
+                fd = key.fd
+                try:
+                    data = os.read(fd, read_sizes[fd])
+                except OSError:
+                    closed = True
+                    continue
+
+                if not data:
+                    closed = True
+                    continue
+
+                if len(data) == read_sizes[fd]:
+                    read_sizes[fd] = min(2 * read_sizes[fd], max_buffer_size)
+
+                if fd == input_fileno:
+                    write_fileno = master_fd
+                else:
+                    write_fileno = output_fileno
+                    yield data, time.monotonic()
+
+                _write_all(write_fileno, data)
+
+
+def _make_selector(fds):
+    """Return a selector watching fds for reading, suitable for terminal devices"""
+    # kqueue and poll do not support terminal devices on macOS so select is used on platforms
+    # without epoll
+    if hasattr(selectors, 'EpollSelector'):
+        selector = selectors.EpollSelector()
+        try:
+            for fd in fds:
+                selector.register(fd, selectors.EVENT_READ)
+            return selector
+        except PermissionError:
+            # epoll does not support regular files or /dev/null, which stdin may be
+            # redirected from
+            selector.close()
+
+    selector = selectors.SelectSelector()
+    for fd in fds:
+        selector.register(fd, selectors.EVENT_READ)
+    return selector
+
+
+def _write_all(fileno, data):
+    """Write data to fileno, retrying after partial writes without copying the data left"""
+    view = memoryview(data)
+    while view:
+        n = os.write(fileno, view)
+        view = view[n:]
+
+
+def get_terminal_size(fileno):
+    try:
+        columns, lines = os.get_terminal_size(fileno)
+    except OSError:
+        columns, lines = 80, 24
+
+    return columns, lines
@@ -1,153 +1,103 @@
-import datetime
-import fcntl
 import os
-import pty
-import select
-import struct
-import termios
-import tty
+import pickle
+import tempfile
+import threading
+from collections import deque, namedtuple
 from copy import copy
 from functools import partial
+from itertools import chain
 from typing import Iterator
 
 import pyte
 import pyte.screens
 
-from termtosvg.anim import CharacterCellConfig, CharacterCellLineEvent
-from termtosvg.asciicast import AsciiCastV2Event, AsciiCastV2Header
+from termtosvg.anim import CharacterCellConfig, CharacterCellLineEvent, CharacterCellScrollEvent
+from termtosvg.asciicast import AsciiCastV2Event, EventStore
 
 
-class TerminalMode:
-    """Save terminal mode and size on entry, restore them on exit"""
-    def __init__(self, fileno: int):
-        self.fileno = fileno
-        self.mode = None
-        self.ttysize = None
+class SpillQueue:
+    """FIFO queue between a producer that must never block and a slower consumer
 
-    def __enter__(self):
-        try:
-            self.mode = tty.tcgetattr(self.fileno)
-        except tty.error:
-            pass
-
-        try:
-            columns, lines = os.get_terminal_size(self.fileno)
-        except OSError:
-            pass
-        else:
-            self.ttysize = struct.pack("HHHH", lines, columns, 0, 0)
-
-        return self.mode, self.ttysize
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.ttysize is not None:
-            fcntl.ioctl(self.fileno, termios.TIOCSWINSZ, self.ttysize)
-
-        if self.mode is not None:
-            tty.tcsetattr(self.fileno, tty.TCSAFLUSH, self.mode)
-
-
-def record(process_args, columns, lines, input_fileno, output_fileno):
-    """Record a process in asciicast v2 format
-
-    The records returned are of two types:
-        - a single header with configuration information
-        - multiple event records with data captured from the terminal and timing information
+    Items are kept in memory as long as the event data they hold amounts to less than
+    'max_bytes' bytes (items other than AsciiCastV2Events count as empty). Past this limit,
+    items are pickled to a temporary file and read back in order by the consumer once it has
+    caught up with the items held in memory, so that put() never waits for the consumer.
     """
-    yield AsciiCastV2Header(version=2, width=columns, height=lines, theme=None)
-
-    start = None
-    for data, time in _record(process_args, columns, lines, input_fileno, output_fileno):
-        if start is None:
-            start = time
-
-        yield AsciiCastV2Event(time=(time - start).total_seconds(),
-                               event_type='o',
-                               event_data=data,
-                               duration=None)
-
-
-def _record(process_args, columns, lines, input_fileno, output_fileno):
-    """Record raw input and output of a process
-
-    This function forks the current process. The child process runs the command specified by
-    'process_args' which is a session leader and has a controlling terminal and is run in the
-    background. The parent process, which runs in the foreground, transmits data between the
-    standard input, output and the child process and logs it. From the user point of view, it
-    appears they are communicating with the process they intend to record (through their terminal
-    emulator) when in fact they communicate with our parent process which logs all data exchanges
-    with the user
-
-    The implementation of this method is mostly copied from the pty.spawn function of the
-    CPython standard library. It has been modified in order to make the record function a
-    generator.
-    See https://github.com/python/cpython/blob/master/Lib/pty.py
-
-    :param process_args: List of arguments to run the process to be recorded
-    :param columns: Initial number of columns of the terminal
-    :param lines: Initial number of lines of the terminal
-    :param input_fileno: File descriptor of the input data stream
-    :param output_fileno: File descriptor of the output data stream
-    """
-    pid, master_fd = pty.fork()
-    if pid == 0:
-        # Child process - this call never returns
-        os.execlp(process_args[0], *process_args)
-
-    # Parent process
-    # Set the terminal size for master_fd
-    ttysize = struct.pack("HHHH", lines, columns, 0, 0)
-    fcntl.ioctl(master_fd, termios.TIOCSWINSZ, ttysize)
-
-    try:
-        tty.setraw(input_fileno)
-    except tty.error:
-        pass
-
-    for data, time in _capture_data(input_fileno, output_fileno, master_fd):
-        yield data, time
-
-    os.close(master_fd)
-
-    _, child_exit_status = os.waitpid(pid, 0)
-    return child_exit_status
-
-
-def _capture_data(input_fileno, output_fileno, master_fd, buffer_size=1024):
-    """Send data from input_fileno to master_fd and send data from master_fd to output_fileno and
-    also return it to the caller
-
-    The implementation of this method is mostly copied from the pty.spawn function of the
-    CPython standard library. It has been modified in order to make the record function a
-    generator.
-    See https://github.com/python/cpython/blob/master/Lib/pty.py
-    """
-    rlist = [input_fileno, master_fd]
-    xlist = [input_fileno, output_fileno, master_fd]
-
-    xfds = []
-    while not xfds:
-        rfds, _, xfds = select.select(rlist, [], xlist)
-        for fd in rfds:
-            try:
-                data = os.read(fd, buffer_size)
-            except OSError:
-                xfds.append(fd)
-                continue
-
-            if not data:
-                xfds.append(fd)
-                continue
-
-            if fd == input_fileno:
-                write_fileno = master_fd
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spilled_count = 0
+        self._memory = deque()
+        self._memory_bytes = 0
+        self._spill_file = None
+        self._spill_read_position = 0
+        self._spill_pending = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, item):
+        """Add an item to the queue; items added after close() are discarded"""
+        size = _item_size(item)
+        with self._condition:
+            if self._closed:
+                return
+            # Once items have been spilled, newer items must go to disk too to preserve ordering
+            if self._spill_pending or self._memory_bytes + size > self.max_bytes:
+                if self._spill_file is None:
+                    self._spill_file = tempfile.TemporaryFile()
+                self._spill_file.seek(0, os.SEEK_END)
+                pickle.dump(item, self._spill_file, pickle.HIGHEST_PROTOCOL)
+                self._spill_pending += 1
+                self.spilled_count += 1
             else:
-                write_fileno = output_fileno
-                yield data, datetime.datetime.now()
+                self._memory.append((item, size))
+                self._memory_bytes += size
+            self._condition.notify()
+
+    def close(self):
+        """Signal the consumer that no more items will be added"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def __iter__(self):
+        """Yield items in the order they were added until the queue is closed and empty"""
+        while True:
+            with self._condition:
+                while not (self._memory or self._spill_pending or self._closed):
+                    self._condition.wait()
+
+                if self._memory:
+                    item, size = self._memory.popleft()
+                    self._memory_bytes -= size
+                elif self._spill_pending:
+                    item = self._read_spilled()
+                else:
+                    break
+            yield item
+
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _read_spilled(self):
+        self._spill_file.seek(self._spill_read_position)
+        item = pickle.load(self._spill_file)
+        self._spill_pending -= 1
+        if self._spill_pending:
+            self._spill_read_position = self._spill_file.tell()
+        else:
+            # The backlog has been drained: reuse the file from the start
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read_position = 0
+        return item
+
 
-            while data:
-                n = os.write(write_fileno, data)
-                data = data[n:]
+def _item_size(item):
+    """Return the number of bytes of event data held by an item of a SpillQueue"""
+    if isinstance(item, AsciiCastV2Event):
+        return len(item.event_data)
+    return 0
 
 
 def _group_by_time(event_records, min_rec_duration, max_rec_duration, last_rec_duration):
@@ -194,7 +144,33 @@ def _group_by_time(event_records, min_rec_duration, max_rec_duration, last_rec_d
         yield accumulator_event
 
 
-def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last_frame_duration=1000):
+class ScrollTrackingScreen(pyte.Screen):
+    """pyte Screen keeping count of the number of lines the whole screen was scrolled by
+
+    'scroll_offset' is incremented each time the content of the screen moves up one line and
+    decremented each time it moves down one line. Scrolling limited to a region of the screen
+    (see DECSTBM) is not taken into account.
+    """
+    def __init__(self, columns, lines):
+        self.scroll_offset = 0
+        super().__init__(columns, lines)
+
+    def _scrolls_whole_screen(self):
+        return self.margins is None or tuple(self.margins) == (0, self.lines - 1)
+
+    def index(self):
+        if self.cursor.y == self.lines - 1 and self._scrolls_whole_screen():
+            self.scroll_offset += 1
+        super().index()
+
+    def reverse_index(self):
+        if self.cursor.y == 0 and self._scrolls_whole_screen():
+            self.scroll_offset -= 1
+        super().reverse_index()
+
+
+def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last_frame_duration=1000,
+           from_pyte_line=None):
     """Read the records of a terminal sessions, render the corresponding screens and return lines
     of the screen that need updating.
 
@@ -205,6 +181,11 @@ def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last
     The terminal screen is rendered using Pyte and then each character of the screen is converted
     to the caller's format of choice using from_pyte_char
 
+    When the whole screen scrolls, lines that are still displayed are not redrawn: a scroll event
+    is returned instead and rows of the lines returned are relative to the screen before any
+    scrolling. For example, after the screen has been scrolled up by 3 lines, a line displayed on
+    the first row of the screen is returned as a line of row 3.
+
     :param records: Records of the terminal session in asciicast v2 format. The first record must
     be a header, which must be followed by event records.
     :param from_pyte_char: Conversion function from pyte.screen.Char to any other format
@@ -213,32 +194,74 @@ def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last
     :param max_frame_duration: Maximum duration of a frame in milliseconds. This is meant to limit
     idle time during a recording.
     :param last_frame_duration: Last frame duration in milliseconds
+    :param from_pyte_line: Conversion function from a line of the screen, given as a dictionary
+    mapping column numbers to pyte.screen.Char, to any other format. Lines held by the function
+    until they are redrawn are stored in this format, so a compact format is preferable for
+    large screens. Defaults to a dictionary mapping column numbers to characters converted by
+    from_pyte_char.
     :return: Records in the CharacterCellRecord format:
         1/ a header with configuration information (CharacterCellConfig)
         2/ one event record for each line of the screen that need to be redrawn
         (CharacterCellLineEvent)
+        3/ one event record for each period of time the screen stays scrolled by a given number
+        of lines (CharacterCellScrollEvent)
     """
-    def sort_by_time(d, row):
-        _, row_line_time, row_line_duration = d[row]
-        return row_line_time + row_line_duration, row
-
     if not isinstance(records, Iterator):
         records = iter(records)
 
     header = next(records)
 
-    screen = pyte.Screen(header.width, header.height)
-    stream = pyte.ByteStream(screen)
     if not max_frame_duration and header.idle_time_limit:
         max_frame_duration = int(header.idle_time_limit * 1000)
 
     yield CharacterCellConfig(header.width, header.height)
 
-    pending_lines = {}
-    current_time = 0
-    last_cursor = None
+    screen = ScrollTrackingScreen(header.width, header.height)
+    stream = pyte.ByteStream(screen)
     event_records = _group_by_time(records, min_frame_duration, max_frame_duration,
                                    last_frame_duration)
+    yield from _replay_frames(screen, stream, event_records,
+                              _line_converter(from_pyte_char, from_pyte_line), 0)
+
+
+def _line_converter(from_pyte_char, from_pyte_line):
+    """Return the conversion function from lines of the screen to the format of the caller (see
+    replay)"""
+    if from_pyte_line is not None:
+        return from_pyte_line
+
+    def convert(chars):
+        return {column: from_pyte_char(char) for column, char in chars.items()}
+    return convert
+
+
+def _replay_frames(screen, stream, event_records, from_pyte_line, start_time):
+    """Feed grouped event records to the screen and return the lines of the screen that need
+    updating and the scroll events (see replay)
+
+    Lines of the screen marked as dirty before the first record is fed are drawn along with the
+    content of the first record. All lines and scroll events are complete once the last record
+    has been fed.
+
+    :param screen: ScrollTrackingScreen the records are fed to
+    :param stream: pyte.ByteStream attached to the screen
+    :param event_records: Event records grouped by _group_by_time
+    :param from_pyte_line: Conversion function from a line of the screen to any other format
+    (see _line_converter)
+    :param start_time: Time of the first record in milliseconds
+    """
+    def sort_by_time(d, row):
+        _, row_line_time, row_line_duration = d[row]
+        return row_line_time + row_line_duration, row
+
+    # Lines waiting to be returned and their fingerprints, indexed by their row relative to the
+    # screen before any scrolling
+    pending_lines = {}
+    fingerprints = {}
+    current_time = start_time
+    last_cursor = None
+    scroll_offset = screen.scroll_offset
+    scroll_time = start_time
     for event_record in event_records:
         stream.feed(event_record.event_data)
 
@@ -252,12 +275,15 @@ def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last
                 # Line where the cursor will be erased
                 dirty_lines.add(last_cursor.y)
 
-        redraw_buffer = {}
-        for row in dirty_lines:
-            redraw_buffer[row] = {}
-            for column in screen.buffer[row]:
-                redraw_buffer[row][column] = from_pyte_char(screen.buffer[row][column])
+        scrolled = screen.scroll_offset != scroll_offset
+        if scrolled:
+            dirty_lines.update(range(screen.lines))
+            if scroll_offset:
+                yield CharacterCellScrollEvent(scroll_offset, scroll_time,
+                                               current_time - scroll_time)
+            scroll_offset, scroll_time = screen.scroll_offset, current_time
 
+        cursor_char = None
         if screen.cursor != last_cursor and not screen.cursor.hidden:
             try:
                 data = screen.buffer[screen.cursor.y][screen.cursor.x].data
@@ -268,25 +294,53 @@ def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last
                                             fg=screen.cursor.attrs.fg,
                                             bg=screen.cursor.attrs.bg,
                                             reverse=True)
-            redraw_buffer[screen.cursor.y][screen.cursor.x] = from_pyte_char(cursor_char)
+
+        # Pyte often marks lines as dirty even though their content is unchanged. Lines are
+        # only redrawn if their fingerprint, which is made of the pyte characters of the line
+        # and of the cursor, differs from the fingerprint of the line currently displayed.
+        # Rows are relative to the screen before any scrolling.
+        redraw_buffer = {}
+        for row in dirty_lines:
+            if cursor_char is not None and row == screen.cursor.y:
+                cursor = screen.cursor.x, cursor_char
+            else:
+                cursor = None
+            chars = dict(screen.buffer[row])
+            fingerprint = chars, cursor
+
+            virtual_row = row + scroll_offset
+            if virtual_row in pending_lines and fingerprints[virtual_row] == fingerprint:
+                continue
+            fingerprints[virtual_row] = fingerprint
+
+            if cursor is not None:
+                chars = dict(chars)
+                chars[screen.cursor.x] = cursor_char
+            redraw_buffer[virtual_row] = from_pyte_line(chars)
 
         last_cursor = copy(screen.cursor)
         screen.dirty.clear()
 
+        visible_rows = range(scroll_offset, scroll_offset + screen.lines)
         completed_lines = {}
         duration = int(1000 * event_record.duration)
         for row in pending_lines:
             line, line_time, line_duration = pending_lines[row]
-            if row in redraw_buffer:
+            if row in redraw_buffer or row not in visible_rows:
                 completed_lines[row] = line, line_time, line_duration
             else:
                 pending_lines[row] = line, line_time, line_duration + duration
 
+        for row in completed_lines:
+            del pending_lines[row]
+            if row not in redraw_buffer:
+                del fingerprints[row]
+
         for row in redraw_buffer:
             if redraw_buffer[row]:
                 pending_lines[row] = redraw_buffer[row], current_time, duration
-            elif row in pending_lines:
-                del pending_lines[row]
+            else:
+                del fingerprints[row]
 
         for row in sorted(completed_lines, key=partial(sort_by_time, completed_lines)):
             args = (row, *completed_lines[row])
@@ -294,15 +348,274 @@ def replay(records, from_pyte_char, min_frame_duration, max_frame_duration, last
 
         current_time += duration
 
+    if scroll_offset:
+        yield CharacterCellScrollEvent(scroll_offset, scroll_time, current_time - scroll_time)
+
     for row in sorted(pending_lines, key=partial(sort_by_time, pending_lines)):
         args = (row, *pending_lines[row])
         yield CharacterCellLineEvent(*args)
 
 
-def get_terminal_size(fileno):
-    try:
-        columns, lines = os.get_terminal_size(fileno)
-    except OSError:
-        columns, lines = 80, 24
+class ReplaySegment(namedtuple('ReplaySegment', ['checkpoint', 'event_records', 'start_time'])):
+    """Consecutive event records of a terminal session along with a checkpoint of the screen
+    before the first of them, so that segments of a session can be replayed independently of
+    each other (see split_replay)
+
+    :param checkpoint: State of the screen before the first record (see save_screen)
+    :param event_records: Event records grouped by _group_by_time (EventStore)
+    :param start_time: Time of the first record in milliseconds
+    """
+    __slots__ = ()
+
+    def replay(self, from_pyte_char, from_pyte_line=None):
+        """Return the lines of the screen that need updating and the scroll events of the
+        segment (see replay for the conversion functions)
+
+        All lines of the screen are drawn at the beginning of the segment and all lines and scroll
+        events are complete at the end of the segment. Rows of the lines are relative to the
+        screen at the beginning of the segment.
+        """
+        screen, stream = restore_screen(self.checkpoint)
+        screen.dirty.update(range(screen.lines))
+        return _replay_frames(screen, stream, self.event_records,
+                              _line_converter(from_pyte_char, from_pyte_line), self.start_time)
+
+
+def split_replay(records, min_frame_duration, max_frame_duration, segment_count,
+                 last_frame_duration=1000):
+    """Split a terminal session into segments that can be replayed independently of each other
+
+    The records are fed to a terminal screen a first time without converting its content, and
+    the state of the screen is saved at the beginning of each segment. Segments are made of about
+    the same amount of data. A segment only ends once the terminal is done parsing its last
+    escape sequence and UTF-8 character, so that the state of the screen is all that is needed
+    to replay the next segment.
+
+    :param records: Records of the terminal session in asciicast v2 format (see replay)
+    :param min_frame_duration: Minimum frame duration in milliseconds
+    :param max_frame_duration: Maximum duration of a frame in milliseconds
+    :param segment_count: Number of segments the session should be split into
+    :param last_frame_duration: Last frame duration in milliseconds
+    :return: Tuple made of the configuration record (CharacterCellConfig) and the list of
+    segments (ReplaySegment)
+    """
+    if not isinstance(records, Iterator):
+        records = iter(records)
+
+    header = next(records)
+    if not max_frame_duration and header.idle_time_limit:
+        max_frame_duration = int(header.idle_time_limit * 1000)
+
+    # Grouped event records are kept in a compact store since they are walked through twice,
+    # once here and once by the replay of the segments, which are views of the store
+    event_records = EventStore()
+    event_records.extend(_group_by_time(records, min_frame_duration, max_frame_duration,
+                                        last_frame_duration))
+    segment_size = event_records.data_size() / max(segment_count, 1)
+
+    screen = pyte.Screen(header.width, header.height)
+    stream = pyte.ByteStream(screen)
+    segments = []
+    checkpoint = save_screen(screen, stream)
+    segment_start = 0
+    segment_data_size = 0
+    segment_time = current_time = 0
+    for index in range(len(event_records)):
+        if segment_data_size >= segment_size and _is_idle(stream):
+            segments.append(ReplaySegment(checkpoint, event_records[segment_start:index],
+                                          segment_time))
+            checkpoint = save_screen(screen, stream)
+            segment_start = index
+            segment_data_size = 0
+            segment_time = current_time
+
+        event_data = event_records.event_data(index)
+        stream.feed(event_data)
+        screen.dirty.clear()
+        segment_data_size += len(event_data)
+        current_time += int(1000 * event_records.duration(index))
+
+    if segment_start < len(event_records):
+        segments.append(ReplaySegment(checkpoint, event_records[segment_start:],
+                                      segment_time))
 
-    return columns, lines
+    return CharacterCellConfig(header.width, header.height), segments
+
+
+def replay_range(records, snapshot, start, end, from_pyte_char, min_frame_duration,
+                 max_frame_duration, last_frame_duration=1000, from_pyte_line=None):
+    """Replay the part of a terminal session between 'start' and 'end' and return lines of the
+    screen that need updating (see replay)
+
+    Event records preceding 'start' are fed to the terminal without being returned. The time of
+    the records returned is relative to 'start' and the whole screen is drawn at the beginning
+    of the animation.
+
+    :param records: Header of the terminal session in asciicast v2 format followed by event
+    records. If 'snapshot' is provided, the first event record must be the record following
+    the snapshot.
+    :param snapshot: State of the screen before the first event record (see save_screen) or None
+    if event records start at the beginning of the session
+    :param start: Beginning of the part replayed in seconds since the beginning of the session
+    :param end: End of the part replayed in seconds since the beginning of the session, or None
+    to replay the session until its end
+    :param from_pyte_char: Conversion function from pyte.screen.Char to any other format
+    :param min_frame_duration: Minimum frame duration in milliseconds
+    :param max_frame_duration: Maximum duration of a frame in milliseconds
+    :param last_frame_duration: Last frame duration in milliseconds
+    :param from_pyte_line: Conversion function from a line of the screen to any other format
+    (see replay)
+    """
+    if not isinstance(records, Iterator):
+        records = iter(records)
+
+    header = next(records)
+    if not max_frame_duration and header.idle_time_limit:
+        max_frame_duration = int(header.idle_time_limit * 1000)
+
+    yield CharacterCellConfig(header.width, header.height)
+
+    if snapshot is None:
+        screen = ScrollTrackingScreen(header.width, header.height)
+        stream = pyte.ByteStream(screen)
+    else:
+        screen, stream = restore_screen(snapshot)
+
+    # Bring the screen to its state at 'start'
+    first_record = None
+    for record in records:
+        if record.time >= start:
+            first_record = record
+            break
+        if record.event_type == 'o':
+            stream.feed(record.event_data)
+    screen.scroll_offset = 0
+    screen.dirty.update(range(screen.lines))
+
+    def window():
+        if first_record is None:
+            return
+        for record in chain([first_record], records):
+            if end is not None and record.time >= end:
+                break
+            yield record._replace(time=record.time - start)
+
+    event_records = _group_by_time(window(), min_frame_duration, max_frame_duration,
+                                   last_frame_duration)
+    yield from _replay_frames(screen, stream, event_records,
+                              _line_converter(from_pyte_char, from_pyte_line), 0)
+
+
+def snapshots(header, keyed_records, interval):
+    """Feed event records to a terminal screen and return a snapshot of the screen about every
+    'interval' seconds of the session
+
+    Snapshots are only taken when the terminal is not parsing an escape sequence or a character
+    so that the snapshot is all that is needed to replay the following records.
+
+    :param header: Header of the terminal session in asciicast v2 format
+    :param keyed_records: Iterable of tuples made of a key identifying an event record and
+    the event record itself
+    :param interval: Minimum time between two snapshots in seconds
+    :return: Tuples made of the key and the time of the record preceded by the snapshot,
+    and the snapshot itself (see save_screen)
+    """
+    screen = pyte.Screen(header.width, header.height)
+    stream = pyte.ByteStream(screen)
+    last_snapshot_time = None
+    for key, record in keyed_records:
+        if last_snapshot_time is None or record.time - last_snapshot_time >= interval:
+            if _is_idle(stream):
+                yield key, record.time, save_screen(screen, stream)
+                last_snapshot_time = record.time
+
+        if record.event_type == 'o':
+            stream.feed(record.event_data)
+            screen.dirty.clear()
+
+
+def _is_idle(stream):
+    """Return True if the stream is not in the middle of an escape sequence or of a multibyte
+    character"""
+    # The parser of pyte only accepts plain text in its ground state. pyte has no public API
+    # exposing the state of its parser so this relies on the private attribute
+    # Stream._taking_plain_text, which is why setup.py restricts the versions of pyte. Should
+    # the attribute disappear, the stream is never considered idle: recordings are then no
+    # longer split into segments or indexed, but they are still rendered correctly.
+    buffered_bytes, _ = stream.utf8_decoder.getstate()
+    taking_plain_text = getattr(stream, '_taking_plain_text', False)
+    return bool(taking_plain_text) and not buffered_bytes
+
+
+def save_screen(screen, stream):
+    """Return the state of the screen and of the character set of the stream
+
+    The state is made of dictionaries, lists, strings and numbers only so that it can be
+    serialized with JSON (pyte screens cannot even be pickled since their buffer uses a lambda
+    function as default factory). Characters of the screen are grouped by row and by style.
+    """
+    styles = {}
+    buffer = []
+    for row, line in screen.buffer.items():
+        for column, char in sorted(line.items()):
+            style = styles.setdefault(tuple(char[1:]), len(styles))
+            if buffer and buffer[-1][:2] == [row, style] and \
+                    buffer[-1][2] + len(buffer[-1][3]) == column:
+                buffer[-1][3].append(char.data)
+            else:
+                buffer.append([row, style, column, [char.data]])
+
+    def cursor_state(cursor):
+        return [cursor.x, cursor.y, list(cursor.attrs), cursor.hidden]
+
+    return {
+        'columns': screen.columns,
+        'lines': screen.lines,
+        'styles': [list(style) for style in sorted(styles, key=styles.get)],
+        'buffer': buffer,
+        'cursor': cursor_state(screen.cursor),
+        'savepoints': [[cursor_state(savepoint.cursor)] + list(savepoint[1:])
+                       for savepoint in screen.savepoints],
+        'margins': list(screen.margins) if screen.margins is not None else None,
+        'mode': sorted(screen.mode),
+        'tabstops': sorted(screen.tabstops),
+        'charset': screen.charset,
+        'g0_charset': screen.g0_charset,
+        'g1_charset': screen.g1_charset,
+        'title': screen.title,
+        'icon_name': screen.icon_name,
+        'saved_columns': screen.saved_columns,
+        'use_utf8': stream.use_utf8,
+    }
+
+
+def restore_screen(state):
+    """Return a ScrollTrackingScreen and a pyte.ByteStream in the state returned by
+    save_screen"""
+    def make_cursor(cursor_state):
+        x, y, attrs, hidden = cursor_state
+        cursor = pyte.screens.Cursor(x, y, pyte.screens.Char(*attrs))
+        cursor.hidden = hidden
+        return cursor
+
+    screen = ScrollTrackingScreen(state['columns'], state['lines'])
+    styles = [tuple(style) for style in state['styles']]
+    for row, style, column, chars in state['buffer']:
+        line = screen.buffer[row]
+        for offset, data in enumerate(chars):
+            line[column + offset] = pyte.screens.Char(data, *styles[style])
+
+    screen.cursor = make_cursor(state['cursor'])
+    screen.savepoints = [pyte.screens.Savepoint(make_cursor(cursor_state), *attributes)
+                         for cursor_state, *attributes in state['savepoints']]
+    if state['margins'] is not None:
+        screen.margins = pyte.screens.Margins(*state['margins'])
+    screen.mode = set(state['mode'])
+    screen.tabstops = set(state['tabstops'])
+    for name in ('charset', 'g0_charset', 'g1_charset', 'title', 'icon_name', 'saved_columns'):
+        setattr(screen, name, state[name])
+    screen.dirty.clear()
+
+    stream = pyte.ByteStream(screen)
+    stream.use_utf8 = state['use_utf8']
+    return screen, stream
@@ -2,6 +2,10 @@ import unittest
 
 from termtosvg.tests.test_anim import TestAnim
 from termtosvg.tests.test_asciicast import TestAsciicast
+from termtosvg.tests.test_batch import TestBatch
+from termtosvg.tests.test_cache import TestRenderCache
 from termtosvg.tests.test_config import TestConf
+from termtosvg.tests.test_index import TestIndex
 from termtosvg.tests.test_main import TestMain
+from termtosvg.tests.test_recorder import TestRecorder
 from termtosvg.tests.test_term import TestTerm
@@ -1,15 +1,26 @@
+import gzip
 import io
+import os
+import pickle
 import pkgutil
 import tempfile
 import unittest
 from collections import namedtuple
+from unittest import mock
 
+import pyte.graphics
 import pyte.screens
 from lxml import etree
 
 from termtosvg import anim
 
 
+class RecordsSegment(namedtuple('RecordsSegment', ['records'])):
+    """Segment of a terminal session made of records already replayed"""
+    def replay(self, from_pyte_char, from_pyte_line=None):
+        return iter(self.records)
+
+
 class TestAnim(unittest.TestCase):
     def test_from_pyte(self):
         pyte_chars = [
@@ -51,6 +62,26 @@ class TestAnim(unittest.TestCase):
         for pyte_char, cell_char in zip(pyte_chars, char_cells):
             with self.subTest(case=pyte_char):
                 self.assertEqual(anim.CharacterCell.from_pyte(pyte_char), cell_char)
+                # Second conversion goes through the style cache
+                self.assertEqual(anim.CharacterCell.from_pyte(pyte_char), cell_char)
+
+        with self.subTest(case='256 color palette'):
+            for color in pyte.graphics.FG_BG_256:
+                pyte_char = pyte.screens.Char('X', color, color)
+                cell_char = anim.CharacterCell.from_pyte(pyte_char)
+                self.assertEqual(cell_char.color, anim._foreground_color(color, False))
+                self.assertEqual(cell_char.background_color, anim._background_color(color))
+
+        invalid_pyte_chars = [
+            pyte.screens.Char('A', 'invalid', 'blue'),
+            pyte.screens.Char('B', 'red', 'invalid'),
+            pyte.screens.Char('C', 'XXXXXX', 'blue'),
+            pyte.screens.Char('D', 'red', 'XXXXXX'),
+        ]
+        for pyte_char in invalid_pyte_chars:
+            with self.subTest(case=pyte_char):
+                with self.assertRaises(ValueError):
+                    anim.CharacterCell.from_pyte(pyte_char)
 
     def test__render_line_bg_colors_xml(self):
         cell_width = 8
@@ -129,32 +160,97 @@ class TestAnim(unittest.TestCase):
             self.assertIn('underline', texts['L'].attrib['text-decoration'].split())
             self.assertIn('line-through', texts['L'].attrib['text-decoration'].split())
 
-    def test_ConsecutiveWithSameAttributes(self):
-        testClass = namedtuple('testClass', ['field1', 'field2'])
+    def test__line_runs(self):
         test_cases = [
-            (0, testClass('a', 'b')),
-            (2, testClass('a', 'b')),
-            (3, testClass('a', 'b')),
-            (4, testClass('b', 'b')),
-            (5, testClass('b', 'a')),
-            (10, testClass('c', 'd')),
-            (11, testClass('c', 'd')),
+            ('empty line', {}, ([], ())),
+            ('single cell', {3: anim.CharacterCell('A', 'red', 'blue')},
+             ([(3, 1, 'blue')], ((3, 'A', ('red', False, False, False, False)),))),
+            ('default background', {
+                0: anim.CharacterCell('A', 'red', 'background'),
+                1: anim.CharacterCell('B', 'red', 'background'),
+            }, ([], ((0, 'AB', ('red', False, False, False, False)),))),
+            ('gaps and styles', {
+                0: anim.CharacterCell('A', 'red', 'blue'),
+                1: anim.CharacterCell('B', 'red', 'blue', bold=True),
+                2: anim.CharacterCell('C', 'red', 'background', bold=True),
+                3: anim.CharacterCell('D', 'red', 'blue', bold=True),
+                5: anim.CharacterCell('E', 'red', 'blue', bold=True),
+                6: anim.CharacterCell('F', '#123456', 'blue', bold=True),
+                7: anim.CharacterCell('', '#123456', 'green', bold=True),
+            }, ([(0, 2, 'blue'), (3, 1, 'blue'), (5, 2, 'blue'), (7, 1, 'green')],
+                ((0, 'A', ('red', False, False, False, False)),
+                 (1, 'BCD', ('red', True, False, False, False)),
+                 (5, 'E', ('red', True, False, False, False)),
+                 (6, 'F', ('#123456', True, False, False, False))))),
         ]
+        for case, screen_line, expected_runs in test_cases:
+            with self.subTest(case=case):
+                self.assertEqual(anim._line_runs(screen_line), expected_runs)
+            with self.subTest(case=case, line='CharacterCellLine'):
+                compact_line = anim.CharacterCellLine.from_cells(screen_line)
+                self.assertEqual(anim._line_runs(compact_line), expected_runs)
 
-        expected_results = [
-            (0, {'field1': 'a', 'field2': 'b'}),
-            (2, {'field1': 'a', 'field2': 'b'}),
-            (2, {'field1': 'a', 'field2': 'b'}),
-            (4, {'field1': 'b', 'field2': 'b'}),
-            (5, {'field1': 'b', 'field2': 'a'}),
-            (10, {'field1': 'c', 'field2': 'd'}),
-            (10, {'field1': 'c', 'field2': 'd'}),
-        ]
+    def test_CharacterCellLine(self):
+        pyte_chars = {
+            0: pyte.screens.Char('A', 'red', 'blue'),
+            1: pyte.screens.Char('B', 'red', 'blue', bold=True),
+            3: pyte.screens.Char('C', 'red', 'blue', reverse=True),
+            4: pyte.screens.Char('D', 'red', 'blue'),
+        }
+        cells = {column: anim.CharacterCell.from_pyte(char)
+                 for column, char in pyte_chars.items()}
 
-        key = anim.ConsecutiveWithSameAttributes(['field1', 'field2'])
-        for case, result in zip(test_cases, expected_results):
-            with self.subTest(case=case):
-                self.assertEqual(key(case), result)
+        with self.subTest(case='mapping'):
+            line = anim.CharacterCellLine.from_pyte(pyte_chars)
+            self.assertEqual(line.text, 'AB CD')
+            self.assertEqual(line, cells)
+            self.assertEqual(dict(line), cells)
+            self.assertEqual(list(line), [0, 1, 3, 4])
+            self.assertEqual(len(line), 4)
+            self.assertEqual(line[3], anim.CharacterCell('C', 'color4', 'color1'))
+            for column in [-1, 2, 5, 'A']:
+                self.assertNotIn(column, line)
+                with self.assertRaises(KeyError):
+                    line[column]
+
+        with self.subTest(case='interned styles'):
+            line = anim.CharacterCellLine.from_pyte(pyte_chars)
+            self.assertEqual(line.styles[0], line.styles[4])
+            self.assertNotEqual(line.styles[0], line.styles[1])
+            self.assertEqual(line, anim.CharacterCellLine.from_cells(cells))
+            self.assertEqual(hash(line), hash(anim.CharacterCellLine.from_cells(cells)))
+            self.assertNotEqual(line, anim.CharacterCellLine.from_cells({0: cells[0]}))
+
+        with self.subTest(case='style tables'):
+            convert = anim.CharacterCellLine.converter()
+            line, other_line = convert(pyte_chars), convert({0: pyte_chars[1]})
+            self.assertIs(line.table, other_line.table)
+            self.assertEqual(line.styles[1], other_line.styles[0])
+            other_convert = anim.CharacterCellLine.converter()
+            self.assertIsNot(other_convert(pyte_chars).table, line.table)
+            self.assertEqual(other_convert({0: pyte_chars[1]}), other_line)
+            self.assertNotEqual(other_convert({0: pyte.screens.Char('B', 'red', 'blue')}),
+                                other_line)
+
+        with self.subTest(case='cells not one character long'):
+            wide_chars = {0: pyte.screens.Char('\u4e00', 'red', 'blue'),
+                          1: pyte.screens.Char('', 'red', 'blue'),
+                          2: pyte.screens.Char('e\u0301', 'red', 'blue')}
+            line = anim.CharacterCellLine.from_pyte(wide_chars)
+            self.assertEqual(line.text, ('\u4e00', '', 'e\u0301'))
+            self.assertEqual(line[2].text, 'e\u0301')
+            _, text_runs = anim._line_runs(line)
+            self.assertEqual(text_runs,
+                             ((0, '\u4e00e\u0301', ('color1', False, False, False, False)),))
+
+        with self.subTest(case='empty line'):
+            line = anim.CharacterCellLine.from_pyte({})
+            self.assertFalse(line)
+            self.assertEqual(line, {})
+
+        with self.subTest(case='pickle'):
+            line = anim.CharacterCellLine.from_pyte(pyte_chars)
+            self.assertEqual(pickle.loads(pickle.dumps(line)), line)
 
     def test_make_animated_group(self):
         def line(i):
@@ -179,6 +275,22 @@ class TestAnim(unittest.TestCase):
                                                    cell_width=8,
                                                    cell_height=17,
                                                    defs={})
+        self.assertEqual(len(new_defs), 4)
+        use_tags = group.findall('use')
+        href = '{{{}}}href'.format(anim.XLINK_NS)
+        self.assertEqual(use_tags[3].attrib[href], use_tags[4].attrib[href])
+
+        with self.subTest(case='Existing definitions'):
+            defs = {text_runs: definition.attrib['id']
+                    for text_runs, definition in new_defs.items()}
+            group, new_defs = anim.make_animated_group(records=records[3:],
+                                                       time=11,
+                                                       duration=1,
+                                                       cell_width=8,
+                                                       cell_height=17,
+                                                       defs=defs)
+            self.assertEqual(new_defs, {})
+            self.assertEqual([use.attrib[href] for use in group.findall('use')], ['#g4', '#g4'])
 
     def test__render_animation(self):
         def line(i):
@@ -206,6 +318,258 @@ class TestAnim(unittest.TestCase):
         with open(filename, 'wb') as f:
             f.write(etree.tostring(svg_root))
 
+    def test__write_animations(self):
+        def line(i):
+            chars = []
+            for c in 'line{}'.format(i):
+                chars.append(anim.CharacterCell(c, '#123456', '#789012',
+                                                False, False, False, False))
+            return dict(enumerate(chars))
+
+        records = [
+            anim.CharacterCellConfig(80, 24),
+            anim.CharacterCellLineEvent(1, line(1), 0, 60),
+            anim.CharacterCellLineEvent(2, line(2), 60, 60),
+            anim.CharacterCellLineEvent(3, line(3), 120, 60),
+            # Definition reuse
+            anim.CharacterCellLineEvent(4, line(3), 180, 60),
+            anim.CharacterCellLineEvent(4, line(5), 240, 60),
+        ]
+
+        scrolling_records = records[:3] + [
+            anim.CharacterCellScrollEvent(1, 120, 120),
+            anim.CharacterCellLineEvent(3, line(3), 120, 60),
+            anim.CharacterCellLineEvent(4, line(5), 180, 60),
+        ]
+
+        templates = [pkgutil.get_data('termtosvg', '/data/templates/' + template_name)
+                     for template_name in ['progress_bar.svg', 'window_frame_js.svg', 'gjm8.svg']]
+        for case, case_records in [('no scrolling', records), ('scrolling', scrolling_records)]:
+            with self.subTest(case=case):
+                outputs = [(io.BytesIO(), template) for template in templates]
+                anim._write_animations(case_records, outputs, 8, 17)
+                for output_file, template in outputs:
+                    svg_root = anim._render_animation(case_records, template, 8, 17)
+                    # Streaming the animation must produce the same document as serializing the
+                    # whole tree at once
+                    self.assertEqual(output_file.getvalue(), etree.tostring(svg_root))
+
+    def test__render_markup(self):
+        def line(text, **attributes):
+            cell_attributes = dict(color='color1', background_color='background')
+            cell_attributes.update(attributes)
+            return {column: anim.CharacterCell(char, **cell_attributes)
+                    for column, char in enumerate(text)}
+
+        mixed_line = line('plain')
+        mixed_line.update({column + 10: cell for column, cell in
+                           line('<b&"\'>\r', color='#abcdef', background_color='#123456',
+                                bold=True, underscore=True).items()})
+        mixed_line.update({column + 20: cell for column, cell in
+                           line('é€😀 ', background_color='color2', italics=True,
+                                strikethrough=True).items()})
+        records = [
+            anim.CharacterCellLineEvent(0, mixed_line, 0, 60),
+            anim.CharacterCellLineEvent(1, {}, 0, 60),
+            anim.CharacterCellLineEvent(2, mixed_line, 60, 60),
+            anim.CharacterCellScrollEvent(1, 120, 60),
+            anim.CharacterCellLineEvent(1, line('   ', background_color='color3'), 120, 60),
+        ]
+
+        with self.subTest(case='same markup as lxml'):
+            nsmap = {None: anim.SVG_NS, 'xl': anim.XLINK_NS}
+            serialize = anim.ChildSerializer(etree.Element('{%s}svg' % anim.SVG_NS, nsmap=nsmap))
+            expected_frames = list(anim._serialize_frames(
+                anim._render_frames(iter(records), 8, 17), serialize))
+            frames = list(anim._render_markup(iter(records), 8, 17, 'xl:href'))
+            self.assertEqual(frames, expected_frames)
+
+        with self.subTest(case='incompatible characters'):
+            for char in ['\x00', '\x1b', '\ud800', '\uffff']:
+                with self.assertRaises(ValueError):
+                    list(anim._render_markup(iter([anim.CharacterCellLineEvent(
+                        0, line('a' + char), 0, 60)]), 8, 17, 'xlink:href'))
+
+        with self.subTest(case='href attribute'):
+            self.assertEqual(anim._href_attribute({None: anim.SVG_NS, 'xl': anim.XLINK_NS}),
+                             'xl:href')
+            self.assertIsNone(anim._href_attribute({None: anim.SVG_NS}))
+            self.assertIsNone(anim._href_attribute({None: anim.XLINK_NS}))
+            self.assertIsNone(anim._href_attribute({'xlink': anim.XLINK_NS,
+                                                    'xl': anim.XLINK_NS}))
+
+        with self.subTest(case='xlink namespace declared twice by the template'):
+            template = pkgutil.get_data('termtosvg', '/data/templates/gjm8.svg').replace(
+                b' xmlns:xlink="http://www.w3.org/1999/xlink"',
+                b' xmlns:xlink="http://www.w3.org/1999/xlink" '
+                b'xmlns:xl="http://www.w3.org/1999/xlink"')
+            all_records = [anim.CharacterCellConfig(80, 24)] + records
+            output_file = io.BytesIO()
+            anim._write_animations(all_records, [(output_file, template)], 8, 17)
+            svg_root = anim._render_animation(all_records, template, 8, 17)
+            self.assertEqual(output_file.getvalue(), etree.tostring(svg_root))
+
+    def test_load_template(self):
+        template = pkgutil.get_data('termtosvg', '/data/templates/window_frame_js.svg')
+        compiled_template = anim.compile_template(template, 80, 24, 8, 17)
+
+        with self.subTest(case='document'):
+            start, end = compiled_template.split_document(1234, False)
+            root = etree.fromstring(start + b'<!--content-->' + end)
+            expected_root = anim.generate_css(anim.resize_template(template, 80, 24, 8, 17), 1234)
+            self.assertEqual(root.find('.//{*}style[@id="generated-style"]').text,
+                             expected_root.find('.//{*}style[@id="generated-style"]').text)
+            self.assertEqual(root.attrib['viewBox'], expected_root.attrib['viewBox'])
+            screen = root.find('.//{*}svg[@id="screen"]')
+            background, content = screen
+            self.assertTrue(background.tag.endswith('rect'))
+            self.assertIs(content.tag, etree.Comment)
+
+            start, end = compiled_template.split_document(1234, True)
+            self.assertTrue(start.endswith(b'<g>'))
+            self.assertTrue(end.startswith(b'</g>'))
+
+        with tempfile.TemporaryDirectory(prefix='termtosvg_') as cache_dir:
+            with self.subTest(case='cache miss'):
+                self.assertEqual(anim.load_template(template, 80, 24, 8, 17, cache_dir),
+                                 compiled_template)
+                cache_filenames = os.listdir(cache_dir)
+                self.assertEqual(len(cache_filenames), 1)
+
+            with self.subTest(case='cache hit'):
+                with mock.patch('termtosvg.anim.compile_template') as compile_template:
+                    self.assertEqual(anim.load_template(template, 80, 24, 8, 17, cache_dir),
+                                     compiled_template)
+                    compile_template.assert_not_called()
+
+            with self.subTest(case='other geometry'):
+                anim.load_template(template, 82, 19, 8, 17, cache_dir)
+                self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            with self.subTest(case='invalid cache file'):
+                cache_filename = os.path.join(cache_dir, cache_filenames[0])
+                with open(cache_filename, 'w') as cache_file:
+                    cache_file.write('{"version": 0}')
+                self.assertEqual(anim.load_template(template, 80, 24, 8, 17, cache_dir),
+                                 compiled_template)
+                with open(cache_filename, 'r') as cache_file:
+                    self.assertEqual(anim.CompiledTemplate.from_json(cache_file.read()),
+                                     compiled_template)
+
+            with self.subTest(case='unwritable cache directory'):
+                # A regular file stands for a directory that cannot be created
+                unwritable_cache_dir = os.path.join(cache_filename, 'cache')
+                self.assertEqual(
+                    anim.load_template(template, 80, 24, 8, 17, unwritable_cache_dir),
+                    compiled_template
+                )
+
+            with self.subTest(case='cache write failure'):
+                with mock.patch('termtosvg.anim.os.replace', side_effect=PermissionError):
+                    self.assertEqual(anim.load_template(template, 83, 19, 8, 17, cache_dir),
+                                     anim.compile_template(template, 83, 19, 8, 17))
+                self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+        with self.subTest(case='invalid template'):
+            with self.assertRaises(anim.TemplateError):
+                anim.load_template(b'<svg/>', 80, 24, 8, 17)
+
+    def test_render_animation_svgz(self):
+        records = [
+            anim.CharacterCellConfig(80, 24),
+            anim.CharacterCellLineEvent(1, {0: anim.CharacterCell('a', 'red', 'blue')}, 0, 60),
+            anim.CharacterCellLineEvent(2, {0: anim.CharacterCell('b', 'red', 'blue')}, 60, 60),
+        ]
+        template = pkgutil.get_data('termtosvg', '/data/templates/gjm8.svg')
+        _, svg_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.svg')
+        anim.render_animation(records, svg_filename, template)
+        with open(svg_filename, 'rb') as svg_file:
+            svg_data = svg_file.read()
+        os.remove(svg_filename)
+
+        for compression_level in [0, 1, 9]:
+            with self.subTest(case='compression level {}'.format(compression_level)):
+                svgz_filename = svg_filename + 'z'
+                anim.render_animation(records, svgz_filename, template,
+                                      compression_level=compression_level)
+                with open(svgz_filename, 'rb') as svgz_file:
+                    svgz_data = svgz_file.read()
+                os.remove(svgz_filename)
+                self.assertEqual(gzip.decompress(svgz_data), svg_data)
+
+    def test_render_animation_parallel(self):
+        def line(i):
+            return {column: anim.CharacterCell(c, 'color1', 'background')
+                    for column, c in enumerate('line{}'.format(i))}
+
+        segments = [
+            RecordsSegment([
+                anim.CharacterCellLineEvent(1, line(1), 0, 60),
+                anim.CharacterCellLineEvent(2, line(2), 0, 120),
+                anim.CharacterCellLineEvent(1, line(3), 60, 60),
+            ]),
+            RecordsSegment([
+                anim.CharacterCellLineEvent(1, line(3), 120, 60),
+                anim.CharacterCellScrollEvent(1, 180, 60),
+                anim.CharacterCellLineEvent(3, line(4), 180, 60),
+            ]),
+            # Segments without any line must not hold the id of the last animation
+            RecordsSegment([]),
+        ]
+        template = pkgutil.get_data('termtosvg', '/data/templates/gjm8.svg')
+        _, svg_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.svg')
+        anim.render_animation_parallel(anim.CharacterCellConfig(80, 24), segments, svg_filename,
+                                       template, jobs=2)
+
+        root = etree.parse(svg_filename).getroot()
+        screen = root.find('.//{{{}}}svg[@id="screen"]'.format(anim.SVG_NS))
+        _, screen_content = screen.getchildren()
+
+        # Lines shared by segments are only defined once
+        definitions = {g.attrib['id']: ''.join(g.itertext())
+                       for g in screen_content.iterfind('{*}defs/{*}g')}
+        self.assertEqual(sorted(definitions.values()), ['line1', 'line2', 'line3', 'line4'])
+
+        href = '{{{}}}href'.format(anim.XLINK_NS)
+        groups = screen_content.findall('{*}g')
+        displayed = [[definitions[use.attrib[href][1:]] for use in g.iter('{*}use')]
+                     for g in groups]
+        self.assertEqual(displayed, [['line1'], ['line2'], ['line3'], ['line3'], ['line4']])
+
+        last_animations = root.findall('.//*[@id="{}"]'.format(anim.LAST_ANIMATION_ID))
+        self.assertEqual(len(last_animations), 1)
+        self.assertIs(last_animations[0].getparent(), groups[-1])
+        self.assertEqual(len(screen_content.findall('{*}animateTransform')), 1)
+
+    def test__render_animation_scrolling(self):
+        records = [
+            anim.CharacterCellConfig(80, 24),
+            anim.CharacterCellLineEvent(1, {0: anim.CharacterCell('a', 'red', 'blue')}, 0, 60),
+            anim.CharacterCellScrollEvent(2, 60, 60),
+            anim.CharacterCellLineEvent(25, {0: anim.CharacterCell('b', 'red', 'blue')}, 60, 60),
+        ]
+        template = pkgutil.get_data('termtosvg', '/data/templates/progress_bar.svg')
+        svg_root = anim._render_animation(records, template, 8, 17)
+        screen = svg_root.find('.//{{{}}}svg[@id="screen"]'.format(anim.SVG_NS))
+
+        # Animated groups are gathered in a group moved by the scroll animation
+        _, screen_content = screen.getchildren()
+        scroll_animation, = screen_content.findall('animateTransform')
+        self.assertEqual(scroll_animation.attrib['from'], '0,-34')
+        self.assertEqual(scroll_animation.attrib['begin'], '60ms; anim_last.end+60ms')
+        self.assertEqual(scroll_animation.attrib['dur'], '60ms')
+        self.assertEqual([use.attrib['y'] for use in screen_content.iter('use')], ['17', '425'])
+
+    def test_ChildSerializer(self):
+        root = etree.fromstring('<svg xmlns="{}" xmlns:xlink="{}"><svg id="screen"/></svg>'
+                                .format(anim.SVG_NS, anim.XLINK_NS))
+        group = etree.Element('g')
+        etree.SubElement(group, 'use', {'{{{}}}href'.format(anim.XLINK_NS): '#g1'})
+
+        serialize = anim.ChildSerializer(root[0])
+        self.assertEqual(serialize(group), b'<g><use xlink:href="#g1"/></g>')
+        self.assertIsNone(group.getparent())
+
     def test_add_css_variables(self):
         data = pkgutil.get_data('termtosvg', '/data/templates/progress_bar.svg')
 
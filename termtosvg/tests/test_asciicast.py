@@ -1,7 +1,13 @@
+import io
+import os
+import pickle
+import tempfile
 import unittest
 
 from termtosvg.asciicast import AsciiCastV2Header, AsciiCastV2Event, AsciiCastV2Record, \
-                                AsciiCastV2Theme, AsciiCastError, _read_v1_records
+                                AsciiCastV2Theme, AsciiCastError, AsciiCastWriter, EventStore, \
+                                MappedCast, _read_v1_records, read_records, read_records_from, \
+                                read_records_with_offsets, records_from_json_lines, open_cast
 
 
 class TestAsciicast(unittest.TestCase):
@@ -78,6 +84,71 @@ class TestAsciicast(unittest.TestCase):
                 with self.assertRaises(AsciiCastError):
                     AsciiCastV2Record.from_json_line(line)
 
+    def test_records_from_json_lines(self):
+        records = list(records_from_json_lines(TestAsciicast.cast_v2_lines))
+        self.assertEqual(records, TestAsciicast.cast_v2_events)
+        for record, expected_record in zip(records, TestAsciicast.cast_v2_events):
+            self.assertIs(type(record), type(expected_record))
+
+        with self.subTest(case='types checked by AsciiCastV2Event'):
+            self.assertEqual(list(records_from_json_lines(['[true, "o", "a"]'])),
+                             [AsciiCastV2Event(True, 'o', b'a', None)])
+
+        failure_test_cases = [
+            ('invalid JSON', '[2.0, "o", "ls"'),
+            ('event v2: invalid time', '["x", "o", "ls"]'),
+            ('event v2: invalid event_type', '[2.0, 123, "ls"]'),
+            ('event v2: invalid event_data', '[2.0, "o", 42]'),
+            ('event v2: invalid number of attributes', '[2.0, "o", "ls", "ls"]'),
+            ('invalid record', '42'),
+        ]
+        for case, line in failure_test_cases:
+            with self.subTest(case=case):
+                with self.assertRaises(AsciiCastError):
+                    list(records_from_json_lines([line]))
+
+    def test_AsciiCastWriter(self):
+        heart = '❤'.encode('utf-8')
+        records = [
+            AsciiCastV2Header(2, 80, 24, None),
+            AsciiCastV2Event(0, 'o', b'a\r\n"\\\x1b[0m\t', None),
+            AsciiCastV2Event(0.1, 'o', heart[:1], None),
+            AsciiCastV2Event(0.25, 'o', heart[1:] + b'b', None),
+            AsciiCastV2Event(1e-07, 'o', b'\xff', None),
+            AsciiCastV2Event(12345678.5, 'i', '€ →'.encode('utf-8'), 0.5),
+            AsciiCastV2Event(float('inf'), 'o', b'', None),
+        ]
+        expected_output = ''.join(record.to_json_line() + '\n' for record in records)
+
+        output = io.StringIO()
+        with AsciiCastWriter(output) as writer:
+            for record in records:
+                writer.write(record)
+        self.assertEqual(output.getvalue(), expected_output)
+
+        with self.subTest(case='buffer size'):
+            output = io.StringIO()
+            writer = AsciiCastWriter(output, buffer_size=50, flush_interval=3600)
+            writer.write(records[0])
+            self.assertEqual(output.getvalue(), '')
+            writer.write(records[1])
+            self.assertEqual(output.getvalue(),
+                             ''.join(record.to_json_line() + '\n' for record in records[:2]))
+
+        with self.subTest(case='flush interval'):
+            output = io.StringIO()
+            writer = AsciiCastWriter(output, buffer_size=10**6, flush_interval=0)
+            writer.write(records[0])
+            self.assertEqual(output.getvalue(), records[0].to_json_line() + '\n')
+
+        with self.subTest(case='final flush on error'):
+            output = io.StringIO()
+            with self.assertRaises(KeyboardInterrupt):
+                with AsciiCastWriter(output, flush_interval=3600) as writer:
+                    writer.write(records[0])
+                    raise KeyboardInterrupt
+            self.assertEqual(output.getvalue(), records[0].to_json_line() + '\n')
+
     def test_to_json(self):
         test_cases = zip(TestAsciicast.cast_v2_lines, TestAsciicast.cast_v2_events)
         for index, (line, event) in enumerate(test_cases):
@@ -87,6 +158,190 @@ class TestAsciicast(unittest.TestCase):
             with self.subTest(case='record #{}'.format(index)):
                 self.assertEqual(event.to_json_line(), line)
 
+    def test_read_records_with_offsets(self):
+        lines = [TestAsciicast.cast_v2_lines[0]] + TestAsciicast.cast_v2_lines[5:]
+        fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+        with os.fdopen(fd, 'w', encoding='utf-8') as cast_file:
+            cast_file.write('\n'.join(lines) + '\n')
+
+        with open(cast_filename, 'rb') as cast_file:
+            data = cast_file.read()
+
+        records = [TestAsciicast.cast_v2_events[0]] + TestAsciicast.cast_v2_events[5:]
+        offsets = []
+        for (offset, record), expected_record in zip(read_records_with_offsets(cast_filename),
+                                                     records):
+            self.assertEqual(record, expected_record)
+            self.assertEqual(AsciiCastV2Record.from_json_line(
+                data[offset:].split(b'\n', 1)[0].decode('utf-8')), expected_record)
+            offsets.append(offset)
+
+        with self.subTest(case='read_records_from'):
+            self.assertEqual(list(read_records_from(cast_filename, offsets[2])),
+                             [records[0]] + records[2:])
+
+        with self.subTest(case='mapped in memory'):
+            self.assertEqual(list(read_records_with_offsets(cast_filename, use_mmap=True)),
+                             list(zip(offsets, records)))
+
+        with self.subTest(case='asciicast v1'):
+            with open(cast_filename, 'w') as cast_file:
+                cast_file.write(TestAsciicast.cast_v1_lines)
+            with self.assertRaises(AsciiCastError):
+                list(read_records_with_offsets(cast_filename))
+
+        os.remove(cast_filename)
+
+    def test_EventStore(self):
+        header = AsciiCastV2Header(2, 80, 24, None)
+        events = [
+            AsciiCastV2Event(0, 'o', b'abc', None),
+            AsciiCastV2Event(0.5, 'i', b'', None),
+            AsciiCastV2Event(1, 'o', '❤'.encode('utf-8'), 0.25),
+            AsciiCastV2Event(1, 'o', b'\r\n', None),
+            AsciiCastV2Event(3, 'o', b'd', None),
+        ]
+        store = EventStore.from_records([header] + events)
+        self.assertEqual(len(store), len(events))
+        self.assertEqual(list(store), events)
+        self.assertEqual(list(store.records()), [header] + events)
+        self.assertEqual(store[-1], events[-1])
+        self.assertEqual([bytes(store.event_data(i)) for i in range(len(store))],
+                         [event.event_data for event in events])
+        with self.assertRaises(IndexError):
+            store[len(events)]
+
+        with self.subTest(case='slices'):
+            view = store[1:4]
+            self.assertEqual(list(view), events[1:4])
+            self.assertEqual(list(view[1:]), events[2:4])
+            self.assertEqual(list(store[4:1]), [])
+            self.assertEqual(view.time(0), 0.5)
+            self.assertEqual(bytes(view.event_data(-1)), b'\r\n')
+            with self.assertRaises(ValueError):
+                store[::2]
+            with self.assertRaises(ValueError):
+                view.append(events[0])
+
+        with self.subTest(case='durations and data size'):
+            self.assertEqual([store.duration(i) for i in range(len(store))],
+                             [None, None, 0.25, None, None])
+            self.assertEqual(store.data_size(), 9)
+            self.assertEqual(store[2:4].data_size(), 5)
+
+        with self.subTest(case='pickled view'):
+            view = store[2:4]
+            pickled_view = pickle.loads(pickle.dumps(view))
+            self.assertEqual(list(pickled_view), events[2:4])
+            self.assertEqual(pickled_view.data_size(), 5)
+            self.assertLess(len(pickle.dumps(view)), len(pickle.dumps(store)))
+
+        with self.subTest(case='search by time'):
+            self.assertEqual([store.index_at(time) for time in [-1, 0, 0.7, 1, 2, 3, 4]],
+                             [0, 0, 2, 2, 4, 4, 5])
+            self.assertEqual(list(store.between(0.5, 3)), events[1:4])
+            self.assertEqual(store[1:].index_at(1), 1)
+
+        with self.subTest(case='missing header'):
+            with self.assertRaises(AsciiCastError):
+                EventStore.from_records(events)
+
+    def test_MappedCast(self):
+        header = AsciiCastV2Header(2, 80, 24, None)
+        events = [AsciiCastV2Event(index * 0.5, 'o', '❤{}'.format(index).encode('utf-8'), None)
+                  for index in range(7)]
+        lines = [record.to_json_line() for record in [header] + events]
+        cases = [
+            ('trailing newline', '\n'.join(lines) + '\n'),
+            ('no trailing newline', '\n'.join(lines)),
+        ]
+        for case, data in cases:
+            with self.subTest(case=case):
+                fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+                with os.fdopen(fd, 'w', encoding='utf-8') as cast_file:
+                    cast_file.write(data)
+                with open(cast_filename, 'rb') as cast_file:
+                    binary_data = cast_file.read()
+
+                with MappedCast(cast_filename) as cast:
+                    self.assertEqual(cast.header, header)
+                    self.assertEqual(len(cast), len(events))
+                    self.assertEqual(list(cast), events)
+                    self.assertEqual(list(cast.records()), [header] + events)
+                    self.assertEqual(cast[3], events[3])
+                    self.assertEqual(cast[-1], events[-1])
+                    self.assertEqual(cast[1:6:2], events[1:6:2])
+                    with self.assertRaises(IndexError):
+                        cast[len(events)]
+                    self.assertEqual([cast.index_at(time) for time in [-1, 0, 1, 1.2, 3, 4]],
+                                     [0, 0, 2, 3, 6, 7])
+                    offset = cast.offset(4)
+                    self.assertEqual(list(read_records_from(cast_filename, offset)),
+                                     [header] + events[4:])
+                    self.assertTrue(binary_data[offset:].startswith(
+                        lines[5].encode('utf-8')))
+                os.remove(cast_filename)
+
+        failure_test_cases = [
+            ('empty file', ''),
+            ('asciicast v1', TestAsciicast.cast_v1_lines),
+        ]
+        for case, data in failure_test_cases:
+            with self.subTest(case=case):
+                fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+                with os.fdopen(fd, 'w') as cast_file:
+                    cast_file.write(data)
+                with self.assertRaises(AsciiCastError):
+                    MappedCast(cast_filename)
+                os.remove(cast_filename)
+
+    def test_open_cast(self):
+        v2_data = '\n'.join([TestAsciicast.cast_v2_lines[0]] + TestAsciicast.cast_v2_lines[5:])
+        v2_records = [TestAsciicast.cast_v2_events[0]] + TestAsciicast.cast_v2_events[5:]
+        cases = [
+            ('uncompressed', '.cast'),
+            ('gzip', '.cast.gz'),
+            ('xz', '.cast.xz'),
+        ]
+        for case, suffix in cases:
+            with self.subTest(case=case):
+                fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix=suffix)
+                os.close(fd)
+                with open_cast(cast_filename, 'w') as cast_file:
+                    cast_file.write(v2_data)
+                with open(cast_filename, 'rb') as cast_file:
+                    is_compressed = cast_file.read() != v2_data.encode('utf-8')
+                self.assertEqual(is_compressed, suffix != '.cast')
+
+                self.assertEqual(list(read_records(cast_filename)), v2_records)
+                # Compressed recordings are read line by line even if mapping is requested
+                self.assertEqual(list(read_records(cast_filename, use_mmap=True)), v2_records)
+                offsets = [offset for offset, _ in read_records_with_offsets(cast_filename)]
+                self.assertEqual(list(read_records_with_offsets(cast_filename, use_mmap=True)),
+                                 list(zip(offsets, v2_records)))
+                self.assertEqual(list(read_records_from(cast_filename, offsets[2])),
+                                 [v2_records[0]] + v2_records[2:])
+
+                # Compressed recordings are detected from their content, not their name
+                renamed_filename = cast_filename + '.renamed'
+                os.rename(cast_filename, renamed_filename)
+                self.assertEqual(list(read_records(renamed_filename)), v2_records)
+
+                with open_cast(renamed_filename, 'w') as cast_file:
+                    cast_file.write(TestAsciicast.cast_v1_lines)
+                header, *events = read_records(renamed_filename)
+                self.assertEqual(len(events), 3)
+                os.remove(renamed_filename)
+
+        with self.subTest(case='compressed recordings cannot be mapped'):
+            fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast.gz')
+            os.close(fd)
+            with open_cast(cast_filename, 'w') as cast_file:
+                cast_file.write(v2_data)
+            with self.assertRaises(AsciiCastError):
+                MappedCast(cast_filename)
+            os.remove(cast_filename)
+
     cast_v1_lines = '\r\n'.join(['{',
                                  '  "version": 1,',
                                  '  "width": 212,',
@@ -110,10 +365,30 @@ class TestAsciicast(unittest.TestCase):
         AsciiCastV2Event(2, 'o', b'\r\n', None),
     ]
 
+    def test_read_records(self):
+        cases = [
+            ('asciicast v1', TestAsciicast.cast_v1_lines),
+            ('asciicast v1 on a single line', TestAsciicast.cast_v1_lines.replace('\r\n', '')),
+            ('asciicast v2', '\n'.join([TestAsciicast.cast_v2_lines[0]] +
+                                       TestAsciicast.cast_v2_lines[5:])),
+        ]
+        for case, data in cases:
+            with self.subTest(case=case):
+                fd, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+                with os.fdopen(fd, 'w') as cast_file:
+                    cast_file.write(data)
+                header, *events = read_records(cast_filename)
+                self.assertEqual(list(read_records(cast_filename, use_mmap=True)),
+                                 [header] + events)
+                os.remove(cast_filename)
+                self.assertEqual(header, AsciiCastV2Header(2, 212, 53, None))
+                self.assertEqual([event.event_data for event in events],
+                                 [event.event_data for event in TestAsciicast.cast_v1_events[1:]])
+
     def test__read_v1_records(self):
         test_cases = zip(TestAsciicast.cast_v1_lines,
                          TestAsciicast.cast_v1_events,
-                         _read_v1_records(TestAsciicast.cast_v1_lines))
+                         _read_v1_records(io.StringIO(TestAsciicast.cast_v1_lines)))
         for index, (line, expected_event, event) in enumerate(test_cases):
             with self.subTest(case='record #{}'.format(index)):
                 if isinstance(event, AsciiCastV2Header):
@@ -124,6 +399,42 @@ class TestAsciicast(unittest.TestCase):
                     self.assertEqual(event.event_type, expected_event.event_type)
                     self.assertEqual(event.duration, expected_event.duration)
 
+        with self.subTest(case='small chunks'):
+            expected_events = list(_read_v1_records(io.StringIO(TestAsciicast.cast_v1_lines)))
+            for chunk_size in range(1, 8):
+                events = _read_v1_records(io.StringIO(TestAsciicast.cast_v1_lines), chunk_size)
+                self.assertEqual(list(events), expected_events)
+
+        with self.subTest(case='numbers split by chunks'):
+            data = ('{"version": 1, "width": 80, "height": 24, "stdout": [[0.5, "aaaa"], '
+                    '[1.25e-1, "b"]], "duration": 12.5, "x": -3E+2}')
+            expected_events = [
+                AsciiCastV2Header(2, 80, 24, None),
+                AsciiCastV2Event(0.5, 'o', b'aaaa', None),
+                AsciiCastV2Event(0.625, 'o', b'b', None),
+            ]
+            for chunk_size in range(1, len(data) + 1):
+                events = _read_v1_records(io.StringIO(data), chunk_size)
+                self.assertEqual(list(events), expected_events)
+
+            data = ('{"version": 1, "width": 80, "height": 24, "stdout": [[0.5, "' +
+                    65456 * 'x' + '"]], "duration": 12.5}')
+            self.assertEqual(len(list(_read_v1_records(io.StringIO(data)))), 2)
+
+        with self.subTest(case='stdout before header attributes'):
+            data = ('{"stdout": [[1, "a"], [0.5, "b"]], "env": {}, "version": 1, "width": 2, '
+                    '"height": 3}')
+            self.assertEqual(list(_read_v1_records(io.StringIO(data))), [
+                AsciiCastV2Header(2, 2, 3, None),
+                AsciiCastV2Event(1, 'o', b'a', None),
+                AsciiCastV2Event(1.5, 'o', b'b', None),
+            ])
+
+        with self.subTest(case='no events'):
+            data = '{"version": 1, "width": 2, "height": 3, "stdout": []}'
+            self.assertEqual(list(_read_v1_records(io.StringIO(data))),
+                             [AsciiCastV2Header(2, 2, 3, None)])
+
         failure_test_cases = [
             ('invalid version', '{"version": null, "width": 212, "height": 53, "duration": 2, "stdout": []}'),
             ('invalid width', '{"version": 1, "width": null, "height": 53, "duration": 2, "stdout": []}'),
@@ -136,11 +447,13 @@ class TestAsciicast(unittest.TestCase):
             ('invalid event', '{"version": 1, "width": 212, "height": 53, "duration": 2, "stdout": [[0, "a", 2]]}'),
             ('invalid event duration', '{"version": 1, "width": 212, "height": 53, "duration": 2, "stdout": [["aaa", "a"]]}'),
             ('invalid JSON (header)','#####'),
+            ('missing stdout', '{"version": 1, "width": 212, "height": 53, "duration": 2}'),
+            ('truncated file', '{"version": 1, "width": 212, "height": 53, "stdout": [[0, "a"], '),
             ('invalid JSON (event)', '{"version": 1, "width": 212, "height": 53, "duration": 2, "stdout": [[###]}'),
         ]
 
         for case, data in failure_test_cases:
             with self.subTest(case=case):
                 with self.assertRaises(AsciiCastError):
-                    for _ in _read_v1_records(data):
+                    for _ in _read_v1_records(io.StringIO(data)):
                         pass
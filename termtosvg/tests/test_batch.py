@@ -0,0 +1,123 @@
+import os
+import pkgutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+from termtosvg import batch
+from termtosvg.asciicast import AsciiCastV2Event, AsciiCastV2Header
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory(prefix='termtosvg_')
+        header = AsciiCastV2Header(version=2, width=20, height=5, theme=None)
+        events = [AsciiCastV2Event(i * 0.1, 'o', 'line{}\r\n'.format(i).encode('utf-8'), None)
+                  for i in range(3)]
+        for name in ['a.cast', 'b.cast']:
+            with open(self.path(name), 'w') as cast_file:
+                for record in [header] + events:
+                    print(record.to_json_line(), file=cast_file)
+        with open(self.path('invalid.cast'), 'w') as cast_file:
+            cast_file.write('{"version": 2, "width": 20, "height": 5}\n[0, "o"]\n')
+        with open(self.path('notes.txt'), 'w') as text_file:
+            text_file.write('Not a recording\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def test_batch_items(self):
+        with self.subTest(case='directory'):
+            self.assertEqual(batch.batch_items(self.directory.name), [
+                batch.BatchItem(self.path('a.cast'), self.path('a.svg')),
+                batch.BatchItem(self.path('b.cast'), self.path('b.svg')),
+                batch.BatchItem(self.path('invalid.cast'), self.path('invalid.svg')),
+            ])
+
+        with self.subTest(case='directory with output directory'):
+            items = batch.batch_items(self.directory.name, self.path('output'))
+            self.assertEqual(items[0], batch.BatchItem(self.path('a.cast'),
+                                                       self.path('output', 'a.svg')))
+
+        with self.subTest(case='manifest'):
+            with open(self.path('manifest'), 'w') as manifest_file:
+                manifest_file.write('# Comment\n\na.cast\nb.cast\tanimations/b.svgz\n'
+                                    '/tmp/c.cast.gz\n')
+            self.assertEqual(batch.batch_items(self.path('manifest')), [
+                batch.BatchItem(self.path('a.cast'), self.path('a.svg')),
+                batch.BatchItem(self.path('b.cast'), self.path('animations', 'b.svgz')),
+                batch.BatchItem('/tmp/c.cast.gz', '/tmp/c.svg'),
+            ])
+
+        with self.subTest(case='invalid manifest'):
+            with open(self.path('manifest'), 'w') as manifest_file:
+                manifest_file.write('a.cast\ta.svg\textra\n')
+            with self.assertRaises(batch.BatchError):
+                batch.batch_items(self.path('manifest'))
+
+    def test_render_batch(self):
+        template = pkgutil.get_data('termtosvg', '/data/templates/gjm8.svg')
+        items = batch.batch_items(self.directory.name)
+
+        with self.subTest(case='first batch'):
+            results = batch.render_batch(items, template, 1, None, jobs=2)
+            self.assertEqual([result.item for result in results], items)
+            (_, a_duration, a_error), (_, b_duration, b_error), (_, _, invalid_error) = results
+            self.assertIsNone(a_error)
+            self.assertIsNone(b_error)
+            self.assertGreater(a_duration, 0)
+            self.assertGreater(b_duration, 0)
+            self.assertIsNotNone(invalid_error)
+            self.assertFalse(os.path.exists(self.path('invalid.svg')))
+            root = etree.parse(self.path('a.svg')).getroot()
+            self.assertIn('line2', ''.join(root.itertext()))
+
+        with self.subTest(case='animations up to date'):
+            results = batch.render_batch(items, template, 1, None, jobs=2)
+            self.assertEqual([result.duration for result in results[:2]], [None, None])
+            self.assertIsNotNone(results[2].error)
+
+        with self.subTest(case='modified recording'):
+            svg_mtime = os.stat(self.path('b.svg')).st_mtime
+            os.utime(self.path('b.cast'), (svg_mtime + 1, svg_mtime + 1))
+            results = batch.render_batch(items, template, 1, None, jobs=2)
+            self.assertIsNone(results[0].duration)
+            self.assertIsNotNone(results[1].duration)
+
+        with self.subTest(case='modified template'):
+            # Recording modified in the future by the previous case
+            os.utime(self.path('b.cast'), (svg_mtime - 1, svg_mtime - 1))
+            cache_dir = self.path('cache')
+            # Without stamps, animations are rendered again once the cache directory is used
+            results = batch.render_batch(items[:2], template, 1, None, jobs=2,
+                                         cache_dir=cache_dir)
+            self.assertTrue(all(result.duration is not None for result in results))
+            results = batch.render_batch(items[:2], template, 1, None, jobs=2,
+                                         cache_dir=cache_dir)
+            self.assertEqual([result.duration for result in results], [None, None])
+
+            other_template = pkgutil.get_data('termtosvg', '/data/templates/solarized_dark.svg')
+            results = batch.render_batch(items[:2], other_template, 1, None, jobs=2,
+                                         cache_dir=cache_dir)
+            self.assertTrue(all(result.duration is not None for result in results))
+            results = batch.render_batch(items[:2], other_template, 1, None, jobs=2,
+                                         cache_dir=cache_dir)
+            self.assertEqual([result.duration for result in results], [None, None])
+
+        with self.subTest(case='modified settings'):
+            results = batch.render_batch(items[:2], other_template, 2, None, jobs=2,
+                                         cache_dir=cache_dir)
+            self.assertTrue(all(result.duration is not None for result in results))
+
+        with self.subTest(case='no file next to the animations'):
+            self.assertEqual(sorted(name for name in os.listdir(self.directory.name)
+                                    if not name.endswith('.cast')),
+                             ['a.svg', 'b.svg', 'cache', 'notes.txt'])
+
+        with self.subTest(case='forced rendering'):
+            results = batch.render_batch(items[:2], template, 1, None, jobs=1, force=True)
+            self.assertTrue(all(result.duration is not None for result in results))
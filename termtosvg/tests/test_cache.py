@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+from termtosvg import cache
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory(prefix='termtosvg_')
+        self.cast_filename = self.path('recording.cast')
+        with open(self.cast_filename, 'w') as cast_file:
+            cast_file.write('{"version": 2, "width": 80, "height": 24}\n[0.5, "o", "hello"]\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def write_animation(self, filename, size):
+        with open(filename, 'wb') as animation_file:
+            animation_file.write(b'<svg/>'.ljust(size))
+
+    def test_render_key(self):
+        key = cache.render_key(self.cast_filename, b'<svg/>', min_frame_duration=1)
+        self.assertEqual(key, cache.render_key(self.cast_filename, b'<svg/>',
+                                               min_frame_duration=1))
+
+        with self.subTest(case='template'):
+            self.assertNotEqual(key, cache.render_key(self.cast_filename, b'<svg></svg>',
+                                                      min_frame_duration=1))
+
+        with self.subTest(case='settings'):
+            self.assertNotEqual(key, cache.render_key(self.cast_filename, b'<svg/>',
+                                                      min_frame_duration=2))
+            self.assertNotEqual(key, cache.render_key(self.cast_filename, b'<svg/>',
+                                                      min_frame_duration=1, jobs=2))
+
+        with self.subTest(case='recording'):
+            with open(self.cast_filename, 'a') as cast_file:
+                cast_file.write('[1.0, "o", "world"]\n')
+            self.assertNotEqual(key, cache.render_key(self.cast_filename, b'<svg/>',
+                                                      min_frame_duration=1))
+
+    def test_fetch_store(self):
+        render_cache = cache.RenderCache(self.path('cache'))
+        animation_filename = self.path('animation.svg')
+        copy_filename = self.path('copy.svg')
+        self.write_animation(animation_filename, 100)
+
+        self.assertFalse(render_cache.fetch('key', copy_filename))
+        self.assertFalse(os.path.exists(copy_filename))
+        render_cache.store('key', animation_filename)
+        self.assertTrue(render_cache.fetch('key', copy_filename))
+        with open(animation_filename, 'rb') as animation_file, \
+                open(copy_filename, 'rb') as copy_file:
+            self.assertEqual(animation_file.read(), copy_file.read())
+
+        # Overwriting the animation must not alter the cache
+        self.write_animation(copy_filename, 10)
+        self.assertTrue(render_cache.fetch('key', self.path('other.svg')))
+        self.assertEqual(os.path.getsize(self.path('other.svg')), 100)
+        self.assertEqual(render_cache.stats, cache.RenderCacheStats(2, 1, 0))
+
+    def test_evict(self):
+        now = 1000000.0
+        render_cache = cache.RenderCache(self.path('cache'), max_size=250, max_age=3600)
+        self.assertEqual(render_cache.evict(now), 0)
+
+        animation_filename = self.path('animation.svg')
+        self.write_animation(animation_filename, 100)
+        for key, last_use in [('a', now - 7200), ('b', now - 600), ('c', now - 300),
+                              ('d', now - 60)]:
+            render_cache.store(key, animation_filename)
+            os.utime(self.path('cache', '{}.svg'.format(key)), (last_use, last_use))
+
+        # 'a' is too old and 'b' is the least recently used entry
+        self.assertEqual(render_cache.evict(now), 2)
+        self.assertEqual(sorted(os.listdir(self.path('cache'))), ['c.svg', 'd.svg'])
+        self.assertEqual(render_cache.stats.evictions, 2)
+
+        with self.subTest(case='no limit'):
+            render_cache = cache.RenderCache(self.path('cache'))
+            self.assertEqual(render_cache.evict(now + 10 ** 9), 0)
@@ -1,8 +1,53 @@
 import unittest
+from unittest import mock
 
 import termtosvg.config as config
+import termtosvg.main
 
 
 class TestConf(unittest.TestCase):
     def test_default_templates(self):
         templates = config.default_templates()
+        self.assertEqual(len(templates), len(config.DEFAULT_TEMPLATES_NAMES))
+        self.assertIn('gjm8', templates)
+        self.assertNotIn('gjm8.svg', templates)
+        for name, template in templates.items():
+            with self.subTest(case=name):
+                self.assertTrue(template.lstrip().startswith(b'<'))
+        with self.assertRaises(KeyError):
+            templates['missing']
+
+    def test_default_templates_lazy_loading(self):
+        with mock.patch('pkgutil.get_data', return_value=b'<svg/>') as get_data:
+            templates = config.default_templates()
+            self.assertEqual(sorted(templates), sorted(name[:-len('.svg')] for name in
+                                                       config.DEFAULT_TEMPLATES_NAMES))
+            self.assertEqual(get_data.call_count, 0)
+
+            self.assertEqual(templates['dracula'], b'<svg/>')
+            self.assertEqual(templates['dracula'], b'<svg/>')
+            get_data.assert_called_once_with('termtosvg.config',
+                                             'data/templates/dracula.svg')
+
+    def test_startup_template_loading(self):
+        # Only the template used for rendering, if any, must be read when parsing the command
+        # line since reading all templates slows down every invocation of termtosvg
+        test_cases = [
+            (['record'], 0),
+            (['index', 'input_filename'], 0),
+            (['render', 'input_filename'], 1),
+            (['render', 'input_filename', '-t', 'dracula'], 1),
+            ([], 1),
+        ]
+        for args, load_count in test_cases:
+            with self.subTest(case=args):
+                with mock.patch('pkgutil.get_data', return_value=b'<svg/>') as get_data:
+                    templates = config.default_templates()
+                    termtosvg.main.parse(args=args,
+                                         templates=templates,
+                                         default_template='gjm8',
+                                         default_geometry=None,
+                                         default_min_dur=1,
+                                         default_max_dur=None,
+                                         default_cmd='sh')
+                    self.assertEqual(get_data.call_count, load_count)
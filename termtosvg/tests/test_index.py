@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from termtosvg import index
+from termtosvg.asciicast import AsciiCastError, AsciiCastV2Event, AsciiCastV2Header, \
+                                read_records_from
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        header = AsciiCastV2Header(version=2, width=20, height=5, theme=None)
+        events = [AsciiCastV2Event(i, 'o', 'line{}\r\n'.format(i).encode('utf-8'), None)
+                  for i in range(10)]
+        fd, self.cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+        with os.fdopen(fd, 'w') as cast_file:
+            for record in [header] + events:
+                print(record.to_json_line(), file=cast_file)
+        self.index_filename = index.index_filename(self.cast_filename)
+
+    def tearDown(self):
+        for filename in self.cast_filename, self.index_filename:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_build_index(self):
+        count = index.build_index(self.cast_filename, self.index_filename, interval=3)
+        self.assertEqual(count, 4)
+
+        with self.subTest(case='No snapshot before the beginning of the recording'):
+            self.assertIsNone(index.find_snapshot(self.cast_filename, self.index_filename, -1))
+
+        with self.subTest(case='Closest snapshot'):
+            offset, screen = index.find_snapshot(self.cast_filename, self.index_filename, 5.5)
+            # The snapshot was taken before the event record of time 3
+            _, first_record, *_ = read_records_from(self.cast_filename, offset)
+            self.assertEqual(first_record.time, 3)
+            self.assertEqual(screen['cursor'][:2], [0, 3])
+
+        with self.subTest(case='Invalid recording'):
+            with open(self.cast_filename, 'w') as cast_file:
+                cast_file.write('{"version": 1}')
+            with self.assertRaises(AsciiCastError):
+                index.build_index(self.cast_filename, self.index_filename)
+
+    def test_find_snapshot(self):
+        index.build_index(self.cast_filename, self.index_filename)
+
+        with self.subTest(case='Recording modified after indexing'):
+            with open(self.cast_filename, 'a') as cast_file:
+                print(AsciiCastV2Event(11, 'o', b'\r\n', None).to_json_line(), file=cast_file)
+            with self.assertRaises(index.CastIndexError):
+                index.find_snapshot(self.cast_filename, self.index_filename, 0)
+
+        with self.subTest(case='Invalid index'):
+            with open(self.index_filename, 'w') as index_file:
+                index_file.write('not an index')
+            with self.assertRaises(index.CastIndexError):
+                index.find_snapshot(self.cast_filename, self.index_filename, 0)
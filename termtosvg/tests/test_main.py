@@ -1,4 +1,8 @@
+import contextlib
+import io
 import os
+import subprocess
+import sys
 import tempfile
 import time
 import unittest
@@ -24,6 +28,10 @@ SHELL_INPUT = [
     'exit;\r\n'
 ]
 
+# Maximum time spent importing the modules of termtosvg when recording a terminal session, in
+# microseconds. Actual import time is a fraction of this on a typical computer.
+RECORD_IMPORT_BUDGET = 200000
+
 
 class TestMain(unittest.TestCase):
     test_cases = [
@@ -52,6 +60,21 @@ class TestMain(unittest.TestCase):
         ['render', 'input_filename', 'output_filename'],
         ['render', 'input_filename', 'output_filename', '--template', 'plain'],
         ['render', 'input_filename', 'output_filename', '--template', 'plain', '-m', '42', '-M', '100'],
+        ['render', 'input_filename', '-j', '4'],
+        ['render', 'input_filename', 'output_filename', '--jobs', '2'],
+        ['render', 'input_filename', '--from', '42'],
+        ['render', 'input_filename', '--to', '42.5'],
+        ['render', 'input_filename', 'output_filename', '--from', '1.5', '--to', '42'],
+        ['render', 'input_filename', 'output_filename.svgz', '-z', '1'],
+        ['render', 'input_filename', '--cache-dir', 'cache_directory'],
+        ['render', 'input_filename', '-t', 'plain', '-t', 'plain'],
+        ['render', 'input_filename', 'output_1', 'output_2', '-t', 'plain', '-t', 'plain'],
+        ['render', 'input_filename', '--render-cache', 'cache_directory',
+         '--render-cache-size', '10', '--render-cache-age', '7'],
+        ['output_filename.svgz', '--compression-level', '0'],
+        ['index', 'input_filename'],
+        ['render-batch', 'input_directory'],
+        ['render-batch', 'manifest', 'output_directory', '-j', '2', '--force', '-t', 'plain'],
     ]
 
     def test_parse(self):
@@ -121,6 +144,75 @@ class TestMain(unittest.TestCase):
             args = ['termtosvg', 'render', cast_filename, '--template', 'window_frame']
             TestMain.run_main(args, [])
 
+        with self.subTest(case='render (with jobs)'):
+            args = ['termtosvg', 'render', cast_filename, svg_filename, '--jobs', '2']
+            TestMain.run_main(args, [])
+
+        with self.subTest(case='render (time range)'):
+            args = ['termtosvg', 'render', cast_filename, svg_filename, '--from', '0.1']
+            TestMain.run_main(args, [])
+
+        with self.subTest(case='render (template cache)'):
+            with tempfile.TemporaryDirectory(prefix='termtosvg_') as cache_dir:
+                args = ['termtosvg', 'render', cast_filename, svg_filename, '--cache-dir',
+                        cache_dir]
+                TestMain.run_main(args, [])
+                TestMain.run_main(args, [])
+
+        with self.subTest(case='render (render cache)'):
+            with tempfile.TemporaryDirectory(prefix='termtosvg_') as cache_dir:
+                args = ['termtosvg', 'render', cast_filename, svg_filename, '--render-cache',
+                        cache_dir]
+                TestMain.run_main(args, [])
+                with open(svg_filename, 'rb') as svg_file:
+                    animation = svg_file.read()
+                os.remove(svg_filename)
+                TestMain.run_main(args, [])
+                with open(svg_filename, 'rb') as svg_file:
+                    self.assertEqual(svg_file.read(), animation)
+
+        with self.subTest(case='render (several templates)'):
+            with tempfile.TemporaryDirectory(prefix='termtosvg_') as output_directory:
+                svg_filenames = [os.path.join(output_directory, '{}.svg'.format(template))
+                                 for template in ['gjm8', 'dracula']]
+                args = ['termtosvg', 'render', cast_filename] + svg_filenames + \
+                       ['-t', 'gjm8', '-t', 'dracula']
+                TestMain.run_main(args, [])
+                self.assertTrue(all(os.path.getsize(filename) for filename in svg_filenames))
+
+        with self.subTest(case='render (svgz)'):
+            args = ['termtosvg', 'render', cast_filename, svg_filename + 'z', '-z', '1']
+            TestMain.run_main(args, [])
+            os.remove(svg_filename + 'z')
+
+        with self.subTest(case='render-batch'):
+            with tempfile.TemporaryDirectory(prefix='termtosvg_') as output_directory:
+                manifest_filename = os.path.join(output_directory, 'manifest')
+                with open(manifest_filename, 'w') as manifest_file:
+                    print(cast_filename, file=manifest_file)
+                args = ['termtosvg', 'render-batch', manifest_filename, output_directory,
+                        '-j', '2']
+                TestMain.run_main(args, [])
+                TestMain.run_main(args, [])
+
+        with self.subTest(case='index'):
+            args = ['termtosvg', 'index', cast_filename]
+            TestMain.run_main(args, [])
+
+        with self.subTest(case='render (time range with index)'):
+            args = ['termtosvg', 'render', cast_filename, svg_filename, '--from', '0.1', '--to',
+                    '0.5']
+            TestMain.run_main(args, [])
+            os.remove(cast_filename + '.idx')
+
+        with self.subTest(case='record and render (compressed recording)'):
+            compressed_cast_filename = cast_filename + '.gz'
+            args = ['termtosvg', 'record', compressed_cast_filename]
+            TestMain.run_main(args, SHELL_INPUT)
+            args = ['termtosvg', 'render', compressed_cast_filename, svg_filename]
+            TestMain.run_main(args, [])
+            os.remove(compressed_cast_filename)
+
         with self.subTest(case='record and render custom command'):
             args = ['termtosvg', '--command', 'ls']
             TestMain.run_main(args, [])
@@ -156,6 +248,60 @@ class TestMain(unittest.TestCase):
             args = ['termtosvg', 'render', cast_filename_v1, svg_filename]
             TestMain.run_main(args, [])
 
+    @unittest.skipIf(sys.version_info < (3, 7), '-X importtime requires Python 3.7')
+    def test_record_imports(self):
+        # Recording must neither import the terminal emulator nor the SVG renderer
+        _, cast_filename = tempfile.mkstemp(prefix='termtosvg_', suffix='.cast')
+        code = ('from termtosvg.main import main; '
+                'main(["termtosvg", "record", "-c", "true", {!r}])'.format(cast_filename))
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                 input=b'', stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 check=True)
+        os.remove(cast_filename)
+
+        imported = {}
+        for line in process.stderr.decode('utf-8').splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, package = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                imported[package.strip()] = (package, int(cumulative))
+
+        top_level_packages = {name.split('.')[0] for name in imported}
+        self.assertIn('termtosvg', top_level_packages)
+        self.assertNotIn('lxml', top_level_packages)
+        self.assertNotIn('pyte', top_level_packages)
+
+        # Only count modules imported directly by the interpreter or by the CLI: their
+        # cumulative time includes the time spent importing their own dependencies
+        import_time = sum(cumulative for name, (package, cumulative) in imported.items()
+                          if name.startswith('termtosvg') and
+                          package.startswith(' termtosvg'))
+        self.assertLess(import_time, RECORD_IMPORT_BUDGET)
+
+    def test_parse_errors(self):
+        test_cases = [
+            ['render', 'input_filename', '--from', '-1'],
+            ['render', 'input_filename', '--from', '42', '--to', '1'],
+            ['render', 'input_filename', '--from', '42', '--jobs', '2'],
+            ['render', 'input_filename', '-z', '10'],
+            ['render', 'input_filename', 'output_1', 'output_2'],
+            ['render', 'input_filename', 'output_1', '-t', 'plain', '-t', 'plain'],
+            ['render', 'input_filename', 'output_1', 'output_1', '-t', 'plain', '-t', 'plain'],
+            ['index'],
+            ['render-batch'],
+        ]
+        for args in test_cases:
+            with self.subTest(case=args):
+                with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                    termtosvg.main.parse(args=args,
+                                         templates={'plain': b''},
+                                         default_template='plain',
+                                         default_geometry='48x95',
+                                         default_min_dur=2,
+                                         default_max_dur=None,
+                                         default_cmd='sh')
+
     def test_integral_duration(self):
         test_cases = [
             '100',
@@ -0,0 +1,134 @@
+import os
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from termtosvg import recorder
+
+commands = [
+    'echo $SHELL && sleep 0.1;\r\n',
+    'date && sleep 0.1;\r\n',
+    'uname && sleep 0.1;\r\n',
+    'w',
+    'h',
+    'o',
+    'a',
+    'm',
+    'i\r\n',
+    'exit;\r\n'
+]
+
+
+class TestRecorder(unittest.TestCase):
+    def test__record(self):
+        # Use pipes in lieu of stdin and stdout
+        fd_in_read, fd_in_write = os.pipe()
+        fd_out_read, fd_out_write = os.pipe()
+
+        lines = 24
+        columns = 80
+
+        pid = os.fork()
+        if pid == 0:
+            # Child process
+            for line in commands:
+                os.write(fd_in_write, line.encode('utf-8'))
+                time.sleep(0.060)
+            os._exit(0)
+
+        # Parent process
+        with recorder.TerminalMode(fd_in_read):
+            for _ in recorder._record(['sh'], columns, lines, fd_in_read, fd_out_write):
+                pass
+
+        os.waitpid(pid, 0)
+        for fd in fd_in_read, fd_in_write, fd_out_read, fd_out_write:
+            os.close(fd)
+
+    def test_record(self):
+        # Use pipes in lieu of stdin and stdout
+        fd_in_read, fd_in_write = os.pipe()
+        fd_out_read, fd_out_write = os.pipe()
+
+        lines = 24
+        columns = 80
+
+        pid = os.fork()
+        if pid == 0:
+            # Child process
+            for line in commands:
+                os.write(fd_in_write, line.encode('utf-8'))
+                time.sleep(0.060)
+            os._exit(0)
+
+        # Parent process
+        with recorder.TerminalMode(fd_in_read):
+            for _ in recorder.record(['sh'], columns, lines, fd_in_read, fd_out_write):
+                pass
+
+        os.waitpid(pid, 0)
+        for fd in fd_in_read, fd_in_write, fd_out_read, fd_out_write:
+            os.close(fd)
+
+    def test__capture_data(self):
+        # Use pipes in lieu of stdin and the master end of the pseudo-terminal
+        fd_in_read, fd_in_write = os.pipe()
+        fd_master_read, fd_master_write = os.pipe()
+        fd_out = os.open(os.devnull, os.O_WRONLY)
+
+        data = bytes(range(256)) * 256
+        pid = os.fork()
+        if pid == 0:
+            # Child process
+            os.write(fd_master_write, data)
+            os._exit(0)
+        os.close(fd_master_write)
+
+        chunks = []
+        timestamps = []
+        for chunk, timestamp in recorder._capture_data(fd_in_read, fd_out, fd_master_read):
+            chunks.append(chunk)
+            timestamps.append(timestamp)
+        os.waitpid(pid, 0)
+
+        for fd in fd_in_read, fd_in_write, fd_master_read, fd_out:
+            os.close(fd)
+
+        self.assertEqual(b''.join(chunks), data)
+        # Size of reads grows as long as they fill the buffer
+        self.assertLessEqual(len(chunks[0]), 1024)
+        self.assertGreater(max(len(chunk) for chunk in chunks), 1024)
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test__capture_data_devnull_input(self):
+        # epoll cannot watch /dev/null, which stdin is often redirected from
+        fd_in = os.open(os.devnull, os.O_RDONLY)
+        fd_master_read, fd_master_write = os.pipe()
+        fd_out = os.open(os.devnull, os.O_WRONLY)
+        os.write(fd_master_write, b'hi')
+        os.close(fd_master_write)
+
+        for _ in recorder._capture_data(fd_in, fd_out, fd_master_read):
+            pass
+
+        for fd in fd_in, fd_master_read, fd_out:
+            os.close(fd)
+
+    def test__write_all(self):
+        written = []
+
+        def partial_write(fileno, data):
+            written.append(bytes(data[:3]))
+            return len(written[-1])
+
+        with patch('os.write', partial_write):
+            recorder._write_all(42, b'abcdefgh')
+        self.assertEqual(written, [b'abc', b'def', b'gh'])
+
+    def test_get_terminal_size(self):
+        with self.subTest(case='Successful get_terminal_size call'):
+            term_size_mock = MagicMock(return_value=(42, 84))
+            with patch('os.get_terminal_size', term_size_mock):
+                cols, lines, = recorder.get_terminal_size(-1)
+                self.assertEqual(cols, 42)
+                self.assertEqual(lines, 84)
@@ -1,7 +1,8 @@
-import os
-import time
+import json
+import threading
 import unittest
-from unittest.mock import MagicMock, patch
+
+import pyte
 
 import termtosvg.anim as anim
 from termtosvg import term
@@ -22,56 +23,6 @@ commands = [
 
 
 class TestTerm(unittest.TestCase):
-    def test__record(self):
-        # Use pipes in lieu of stdin and stdout
-        fd_in_read, fd_in_write = os.pipe()
-        fd_out_read, fd_out_write = os.pipe()
-
-        lines = 24
-        columns = 80
-
-        pid = os.fork()
-        if pid == 0:
-            # Child process
-            for line in commands:
-                os.write(fd_in_write, line.encode('utf-8'))
-                time.sleep(0.060)
-            os._exit(0)
-
-        # Parent process
-        with term.TerminalMode(fd_in_read):
-            for _ in term._record(['sh'], columns, lines, fd_in_read, fd_out_write):
-                pass
-
-        os.waitpid(pid, 0)
-        for fd in fd_in_read, fd_in_write, fd_out_read, fd_out_write:
-            os.close(fd)
-
-    def test_record(self):
-        # Use pipes in lieu of stdin and stdout
-        fd_in_read, fd_in_write = os.pipe()
-        fd_out_read, fd_out_write = os.pipe()
-
-        lines = 24
-        columns = 80
-
-        pid = os.fork()
-        if pid == 0:
-            # Child process
-            for line in commands:
-                os.write(fd_in_write, line.encode('utf-8'))
-                time.sleep(0.060)
-            os._exit(0)
-
-        # Parent process
-        with term.TerminalMode(fd_in_read):
-            for _ in term.record(['sh'], columns, lines, fd_in_read, fd_out_write):
-                pass
-
-        os.waitpid(pid, 0)
-        for fd in fd_in_read, fd_in_write, fd_out_read, fd_out_write:
-            os.close(fd)
-
     def test_replay(self):
         theme = AsciiCastV2Theme('#000000', '#FFFFFF', ':'.join(['#123456'] * 16))
 
@@ -111,6 +62,21 @@ class TestTerm(unittest.TestCase):
             expected_screen = dict(enumerate(cmds + cursor))
             self.assertEqual(expected_screen, screen)
 
+        with self.subTest(case='Compact lines'):
+            records = [AsciiCastV2Header(version=2, width=80, height=24, theme=theme)] + \
+                      [AsciiCastV2Event(time=i * 60,
+                                        event_type='o',
+                                        event_data=data.encode('utf-8'),
+                                        duration=None)
+                       for i, data in enumerate(commands)]
+
+            expected_events = list(term.replay(records, anim.CharacterCell.from_pyte,
+                                               50, None, 1000))
+            events = list(term.replay(records, anim.CharacterCell.from_pyte, 50, None, 1000,
+                                      from_pyte_line=anim.CharacterCellLine.from_pyte))
+            self.assertEqual(events, expected_events)
+            self.assertIsInstance(events[1].line, anim.CharacterCellLine)
+
         with self.subTest(case='Hidden cursor'):
             # '\u001b[?25h' : display cursor
             # '\u001b[?25l' : hide cursor
@@ -142,13 +108,212 @@ class TestTerm(unittest.TestCase):
             self.assertEqual(events[3].line[4].color, 'background')
             self.assertEqual(events[3].line[4].background_color, 'foreground')
 
-    def test_get_terminal_size(self):
-        with self.subTest(case='Successful get_terminal_size call'):
-            term_size_mock = MagicMock(return_value=(42, 84))
-            with patch('os.get_terminal_size', term_size_mock):
-                cols, lines, = term.get_terminal_size(-1)
-                self.assertEqual(cols, 42)
-                self.assertEqual(lines, 84)
+        with self.subTest(case='Scrolling'):
+            records = [AsciiCastV2Header(version=2, width=10, height=3, theme=theme)] + \
+                      [AsciiCastV2Event(time=i,
+                                        event_type='o',
+                                        event_data='\r\nline{}'.format(i).encode('utf-8'),
+                                        duration=None)
+                       for i in range(1, 6)]
+
+            header, *events = term.replay(records, lambda x: x.data, 50, None, 1000)
+            scroll_events = [e for e in events if isinstance(e, anim.CharacterCellScrollEvent)]
+            line_events = [e for e in events if isinstance(e, anim.CharacterCellLineEvent)]
+
+            self.assertEqual([(e.offset, e.time, e.duration) for e in scroll_events],
+                             [(1, 3000, 1000), (2, 4000, 1000), (3, 5000, 1000)])
+
+            # Each line is drawn once at its row relative to the screen before scrolling,
+            # even though it is moved up by the scrolling of the screen
+            texts = [(e.row, ''.join(e.line[i] for i in sorted(e.line)))
+                     for e in line_events]
+            for i in range(1, 5):
+                self.assertEqual(texts.count((i, 'line{}'.format(i))), 1)
+            # Last line is followed by the cursor
+            self.assertEqual(texts.count((5, 'line5 ')), 1)
+
+            # Lines scrolled out of the screen are removed
+            line_1_index = texts.index((1, 'line1'))
+            line_1 = line_events[line_1_index]
+            self.assertEqual(line_1.time + line_1.duration, 4000)
+
+        with self.subTest(case='Unchanged lines'):
+            records = [AsciiCastV2Header(version=2, width=80, height=24, theme=theme)] + \
+                      [
+                          AsciiCastV2Event(0, 'o', b'aaaa', None),
+                          # Move the cursor to the beginning of the line and redraw it
+                          AsciiCastV2Event(1, 'o', b'\x1b[1;1Haaaa', None),
+                          # Redundant SGR reset
+                          AsciiCastV2Event(2, 'o', b'\x1b[0m', None),
+                          AsciiCastV2Event(3, 'o', b'b', None),
+                      ]
+
+            header, *events = term.replay(records, lambda x: x.data, 50, None, 1000)
+            self.assertEqual([(e.row, e.time, e.duration) for e in events],
+                             [(0, 0, 3000), (0, 3000, 1000)])
+
+    def test_split_replay(self):
+        event_data = [
+            b'line1\r\n',
+            # Escape sequence split over two records
+            b'\x1b[1',
+            b';31mred\r\n',
+            # UTF-8 character split over two records
+            b'\xe2\x82',
+            b'\xac\r\n',
+            b'line4',
+        ]
+        records = [AsciiCastV2Header(version=2, width=10, height=5, theme=None)] + \
+                  [AsciiCastV2Event(i, 'o', data, None) for i, data in enumerate(event_data)]
+
+        config, segments = term.split_replay(records, 50, None, len(event_data), 1000)
+        self.assertEqual(config, anim.CharacterCellConfig(10, 5))
+
+        # Segments only start when the terminal is not parsing an escape sequence or a character
+        self.assertEqual([[record.event_data for record in segment.event_records]
+                          for segment in segments],
+                         [event_data[:1], event_data[1:3], event_data[3:5], event_data[5:]])
+        self.assertEqual([segment.start_time for segment in segments], [0, 1000, 3000, 5000])
+
+        # Each segment starts with the whole screen drawn from its checkpoint
+        def text(event):
+            return ''.join(event.line[column] for column in sorted(event.line))
+
+        events = list(segments[2].replay(lambda char: char.data))
+        self.assertEqual(sorted((e.row, text(e), e.time) for e in events if e.time == 3000),
+                         [(0, 'line1', 3000), (1, 'red', 3000), (2, ' ', 3000)])
+
+        # The screen at the end of the last segment is the screen at the end of the session
+        def final_screen(events):
+            return {e.row: text(e) for e in events if e.time + e.duration == 6000}
+
+        _, *replay_events = term.replay(records, lambda char: char.data, 50, None, 1000)
+        self.assertEqual(final_screen(segments[-1].replay(lambda char: char.data)),
+                         final_screen(replay_events))
+
+    def test_save_screen(self):
+        screen = pyte.Screen(20, 5)
+        stream = pyte.ByteStream(screen)
+        stream.feed(
+            # Colors, bold text and wide characters
+            '\x1b[1;31mred\x1b[0m \x1b[38;2;1;2;3m24 bits\x1b[0m 日本\r\n'
+            # Saved cursor, scrolling region and hidden cursor
+            '\x1b[2;3H\x1b7\x1b[2;4r\x1b[?25l'
+            # Custom tab stop and title
+            '\x1b[1;10H\x1bH\x1b]2;title\x07'.encode('utf-8')
+        )
+        # Snapshots must survive serialization
+        state = json.loads(json.dumps(term.save_screen(screen, stream)))
+        restored_screen, restored_stream = term.restore_screen(state)
+
+        self.assertEqual(restored_screen.display, screen.display)
+        self.assertEqual(dict(restored_screen.buffer), dict(screen.buffer))
+        for name in ['margins', 'mode', 'tabstops', 'title', 'charset', 'g0_charset']:
+            self.assertEqual(getattr(restored_screen, name), getattr(screen, name))
+        for attribute in ['x', 'y', 'attrs', 'hidden']:
+            self.assertEqual(getattr(restored_screen.cursor, attribute),
+                             getattr(screen.cursor, attribute))
+        self.assertEqual(restored_screen.scroll_offset, 0)
+        self.assertEqual(restored_screen.dirty, set())
+
+        # Screens behave the same afterwards
+        data = '\x1b8\x1b[?25hrestored\x1b[4;1H\r\n\r\n\tX'.encode('utf-8')
+        stream.feed(data)
+        restored_stream.feed(data)
+        self.assertEqual(restored_screen.display, screen.display)
+
+    def test_replay_range(self):
+        records = [AsciiCastV2Header(version=2, width=10, height=3, theme=None)] + \
+                  [AsciiCastV2Event(i, 'o', 'line{}\r\n'.format(i).encode('utf-8'), None)
+                   for i in range(10)]
+
+        def screens(replayed_records):
+            header, *events = replayed_records
+            return sorted((e.time, e.duration, e.row, ''.join(e.line[c] for c in sorted(e.line)))
+                          for e in events if isinstance(e, anim.CharacterCellLineEvent))
+
+        events = screens(term.replay_range(records, None, 5, 8, lambda char: char.data, 50, None))
+        # The screen at the beginning of the range is drawn from time 0, with rows relative to
+        # the screen at the beginning of the range
+        self.assertEqual(events[:3], [(0, 1000, 1, 'line4'), (0, 1000, 3, ' '),
+                                      (0, 2000, 2, 'line5')])
+        self.assertEqual(max(time + duration for time, duration, *_ in events), 3000)
+
+        with self.subTest(case='Snapshots'):
+            keyed_records = enumerate(records[1:], start=1)
+            snapshots = list(term.snapshots(records[0], keyed_records, 4))
+            self.assertEqual([(index, time) for index, time, _ in snapshots],
+                             [(1, 0), (5, 4), (9, 8)])
+
+            # Replaying from the snapshot or from the beginning of the session is the same
+            index, _, snapshot = snapshots[1]
+            records_from_snapshot = records[:1] + records[index:]
+            self.assertEqual(screens(term.replay_range(records_from_snapshot, snapshot, 5, 8,
+                                                       lambda char: char.data, 50, None)),
+                             events)
+
+    def test_ScrollTrackingScreen(self):
+        screen = term.ScrollTrackingScreen(80, 5)
+        stream = pyte.ByteStream(screen)
+        stream.feed(b'1\r\n2\r\n3\r\n4\r\n5')
+        self.assertEqual(screen.scroll_offset, 0)
+        stream.feed(b'\r\n6\r\n7')
+        self.assertEqual(screen.scroll_offset, 2)
+
+        with self.subTest(case='Reverse index'):
+            # Move cursor to the first line and scroll down
+            stream.feed(b'\x1b[H\x1bM')
+            self.assertEqual(screen.scroll_offset, 1)
+
+        with self.subTest(case='Scrolling region'):
+            # Restrict scrolling to lines 2 to 4
+            stream.feed(b'\x1b[2;4r\x1b[4;1H\r\n\r\n')
+            self.assertEqual(screen.scroll_offset, 1)
+
+    def test_SpillQueue(self):
+        events = [AsciiCastV2Event(i, 'o', str(i).encode('utf-8'), None) for i in range(10)]
+
+        with self.subTest(case='Items spilled to disk'):
+            # Event data of the first three events fits in memory
+            queue = term.SpillQueue(max_bytes=3)
+            for event in events[:6]:
+                queue.put(event)
+            items = iter(queue)
+            # Items are returned in order whether they were held in memory or on disk
+            self.assertEqual([next(items) for _ in range(5)], events[:5])
+            for event in events[6:]:
+                queue.put(event)
+            queue.close()
+            self.assertEqual(list(items), events[5:])
+            self.assertEqual(queue.spilled_count, 7)
+
+        with self.subTest(case='Consumer thread'):
+            queue = term.SpillQueue(max_bytes=2)
+            consumed = []
+            consumer = threading.Thread(target=lambda: consumed.extend(queue))
+            consumer.start()
+            for event in events:
+                queue.put(event)
+            queue.close()
+            consumer.join()
+            self.assertEqual(consumed, events)
+
+        with self.subTest(case='Byte limit'):
+            large_events = [AsciiCastV2Event(i, 'o', bytes(65536), None) for i in range(8)]
+            queue = term.SpillQueue(max_bytes=4 * 65536)
+            queue.put(AsciiCastV2Header(2, 80, 24, None))
+            for count, event in enumerate(large_events, start=1):
+                queue.put(event)
+                self.assertEqual(queue.spilled_count, max(0, count - 4))
+            queue.close()
+            self.assertEqual(list(queue)[1:], large_events)
+
+        with self.subTest(case='Items added after close'):
+            queue = term.SpillQueue()
+            queue.put(events[0])
+            queue.close()
+            queue.put(events[1])
+            self.assertEqual(list(queue), events[:1])
 
     def test__group_by_time(self):
         event_records = [